@@ -0,0 +1,104 @@
+# coding: utf-8
+"""
+Benchmark writing large arrays to a HDF5 file against writing them in
+parallel processes to a directory with the directory backend, and reading a
+small slice of each back.
+
+Run with ``python benchmarks/bench_directory_backend.py``.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+
+import numpy as np
+
+from h5preserve import open as h5open, RegistryContainer, GroupContainer
+from h5preserve.backends import DirectoryBackend
+
+
+def get_part(i, size):
+    """
+    Return the data of part `i`
+    """
+    return np.full(size, float(i))
+
+
+def write_part(path, i, size):
+    """
+    Write part `i` into the directory backend file at `path`
+    """
+    with h5open(
+        path, RegistryContainer(), mode="r+", backend=DirectoryBackend()
+    ) as f:
+        f["part{}".format(i)]["data"] = get_part(i, size)
+
+
+def read_slices(path, parts, **kwargs):
+    """
+    Read the first ten values of each part
+    """
+    total = 0.0
+    with h5open(path, RegistryContainer(), mode="r", **kwargs) as f:
+        for i in range(parts):
+            total += f.h5py_group["part{}/data".format(i)][:10].sum()
+    return total
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--parts", type=int, default=8)
+    parser.add_argument("--size", type=int, default=4_000_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    directory = mkdtemp()
+    try:
+        hdf5_path = os.path.join(directory, "bench.h5")
+        start = perf_counter()
+        with h5open(hdf5_path, RegistryContainer(), mode="w") as f:
+            for i in range(args.parts):
+                f["part{}".format(i)] = GroupContainer(
+                    data=get_part(i, args.size)
+                )
+        hdf5_write = perf_counter() - start
+        start = perf_counter()
+        read_slices(hdf5_path, args.parts)
+        hdf5_read = perf_counter() - start
+
+        directory_path = os.path.join(directory, "bench")
+        start = perf_counter()
+        with h5open(
+            directory_path, RegistryContainer(), mode="w",
+            backend=DirectoryBackend(),
+        ) as f:
+            for i in range(args.parts):
+                f["part{}".format(i)] = GroupContainer()
+        with ProcessPoolExecutor(args.workers) as executor:
+            list(executor.map(
+                write_part, [directory_path] * args.parts, range(args.parts),
+                [args.size] * args.parts,
+            ))
+        directory_write = perf_counter() - start
+        start = perf_counter()
+        read_slices(directory_path, args.parts, backend=DirectoryBackend())
+        directory_read = perf_counter() - start
+    finally:
+        rmtree(directory)
+
+    for name, write, read in [
+        ("HDF5 (serial)", hdf5_write, hdf5_read),
+        ("directory backend", directory_write, directory_read),
+    ]:
+        print("{:<18} write {:8.1f} ms  read {:8.1f} ms".format(
+            name, write * 1000, read * 1000,
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# coding: utf-8
+"""
+Benchmark creating a file fully in memory and converting it to bytes (and
+opening it again from those bytes) against writing it to, and reading it
+from, a temporary file on tmpfs.
+
+Run with ``python benchmarks/bench_file_image.py``.
+"""
+import argparse
+import os
+from tempfile import mkstemp
+from time import perf_counter
+
+import numpy as np
+
+from h5preserve import open as h5open, open_bytes, RegistryContainer
+
+TMPFS = "/dev/shm"
+
+
+def write_in_memory(experiments, registries):
+    """
+    Create the file in memory and return its bytes
+    """
+    with h5open(
+        "bench_file_image.h5", registries, mode="w", driver="core",
+        backing_store=False,
+    ) as f:
+        for key, data in experiments.items():
+            f[key] = data
+        return f.to_bytes()
+
+
+def write_tmpfs(experiments, registries, directory):
+    """
+    Write the file to a temporary file and return its bytes
+    """
+    handle, path = mkstemp(suffix=".h5", dir=directory)
+    os.close(handle)
+    try:
+        with h5open(path, registries, mode="w") as f:
+            for key, data in experiments.items():
+                f[key] = data
+        with open(path, "rb") as tmp_file:
+            return tmp_file.read()
+    finally:
+        os.remove(path)
+
+
+def read_in_memory(data, registries):
+    """
+    Read every dataset of the file from its bytes
+    """
+    with open_bytes(data, registries) as f:
+        for key in f:
+            f.h5py_group[key][()]  # pylint: disable=pointless-statement
+
+
+def read_tmpfs(data, registries, directory):
+    """
+    Write the bytes to a temporary file and read every dataset from it
+    """
+    handle, path = mkstemp(suffix=".h5", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as tmp_file:
+            tmp_file.write(data)
+        with h5open(path, registries, mode="r") as f:
+            for key in f:
+                f.h5py_group[key][()]  # pylint: disable=pointless-statement
+    finally:
+        os.remove(path)
+
+
+def best_of(repeat, func, *args):
+    """
+    Return the shortest time taken by `func`, in milliseconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func(*args)
+        times.append(perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--objects", type=int, default=500)
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--directory", default=TMPFS)
+    args = parser.parse_args()
+
+    registries = RegistryContainer()
+    experiments = {
+        "exp{}".format(i): np.arange(args.size) + i
+        for i in range(args.objects)
+    }
+    data = write_in_memory(experiments, registries)
+    print("{:<18} write {:8.1f} ms  read {:8.1f} ms".format(
+        "core driver image",
+        best_of(args.repeat, write_in_memory, experiments, registries),
+        best_of(args.repeat, read_in_memory, data, registries),
+    ))
+    print("{:<18} write {:8.1f} ms  read {:8.1f} ms".format(
+        args.directory,
+        best_of(
+            args.repeat, write_tmpfs, experiments, registries, args.directory
+        ),
+        best_of(args.repeat, read_tmpfs, data, registries, args.directory),
+    ))
+
+
+if __name__ == "__main__":
+    main()
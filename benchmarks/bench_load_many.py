@@ -0,0 +1,78 @@
+# coding: utf-8
+"""
+Benchmark loading all the members of a group via ``load_many`` against
+loading each member via ``__getitem__``.
+
+Run with ``python benchmarks/bench_load_many.py``.
+"""
+import argparse
+from tempfile import TemporaryDirectory
+from timeit import repeat
+import os
+
+import numpy as np
+
+from h5preserve import open as h5open, Registry, RegistryContainer, \
+    DatasetContainer
+
+
+class Experiment:
+    # pylint: disable=too-few-public-methods,missing-docstring
+    def __init__(self, data, time_started):
+        self.data = data
+        self.time_started = time_started
+
+
+def get_registries():
+    """
+    Return the registries used for the benchmark
+    """
+    registry = Registry("experiment")
+
+    @registry.dumper(Experiment, "Experiment", version=1)
+    def _exp_dump(experiment):
+        return DatasetContainer(
+            data=experiment.data,
+            attrs={"time started": experiment.time_started},
+        )
+
+    @registry.loader("Experiment", version=1)
+    def _exp_load(dataset):
+        return Experiment(
+            data=dataset["data"],
+            time_started=dataset["attrs"]["time started"],
+        )
+
+    return RegistryContainer(registry)
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--objects", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    registries = get_registries()
+    with TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "bench_load_many.hdf5")
+        with h5open(filename, registries, mode="w") as f:
+            for i in range(args.objects):
+                f["exp{}".format(i)] = Experiment(np.arange(args.size), i)
+
+        with h5open(filename, registries, mode="r") as f:
+            benchmarks = {
+                "__getitem__": lambda: {key: f[key] for key in f},
+                "load_many": f.load_many,
+                "load_many(workers=4)": lambda: f.load_many(workers=4),
+            }
+            for name, func in benchmarks.items():
+                best = min(repeat(func, number=1, repeat=args.repeat))
+                print("{:<22} {:8.1f} ms".format(name, best * 1000))
+
+
+if __name__ == "__main__":
+    main()
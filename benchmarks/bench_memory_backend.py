@@ -0,0 +1,91 @@
+# coding: utf-8
+"""
+Benchmark writing and reading objects with the in-memory backend against an
+in-memory HDF5 file (the h5py core driver without a backing store).
+
+Run with ``python benchmarks/bench_memory_backend.py``.
+"""
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from h5preserve import open as h5open, Registry, RegistryContainer, \
+    DatasetContainer
+from h5preserve.backends import MemoryBackend
+
+
+class Experiment:
+    # pylint: disable=too-few-public-methods,missing-docstring
+    def __init__(self, data, time_started):
+        self.data = data
+        self.time_started = time_started
+
+
+def get_registries():
+    """
+    Return the registries used for the benchmark
+    """
+    registry = Registry("experiment")
+
+    @registry.dumper(Experiment, "Experiment", version=1)
+    def _exp_dump(experiment):
+        return DatasetContainer(
+            data=experiment.data,
+            attrs={"time started": experiment.time_started},
+        )
+
+    @registry.loader("Experiment", version=1)
+    def _exp_load(dataset):
+        return Experiment(
+            data=dataset["data"],
+            time_started=dataset["attrs"]["time started"],
+        )
+
+    return RegistryContainer(registry)
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--objects", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    registries = get_registries()
+    experiments = {
+        "exp{}".format(i): Experiment(np.arange(args.size), i)
+        for i in range(args.objects)
+    }
+    backends = {
+        "HDF5 core driver": lambda mode: h5open(
+            "bench_memory_backend.hdf5", registries, mode=mode,
+            driver="core", backing_store=False,
+        ),
+        "memory backend": lambda mode, backend=MemoryBackend(): h5open(
+            "bench_memory_backend", registries, mode=mode, backend=backend,
+        ),
+    }
+    for name, open_file in backends.items():
+        write_times = []
+        read_times = []
+        for _ in range(args.repeat):
+            start = perf_counter()
+            with open_file("w") as f:
+                for key, experiment in experiments.items():
+                    f[key] = experiment
+                write_times.append(perf_counter() - start)
+                start = perf_counter()
+                for key in experiments:
+                    f[key]  # pylint: disable=pointless-statement
+                read_times.append(perf_counter() - start)
+        print("{:<18} write {:8.1f} ms  read {:8.1f} ms".format(
+            name, min(write_times) * 1000, min(read_times) * 1000,
+        ))
+
+
+if __name__ == "__main__":
+    main()
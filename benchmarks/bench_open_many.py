@@ -0,0 +1,86 @@
+# coding: utf-8
+"""
+Benchmark loading members from many small files one at a time against
+loading them with ``h5preserve.open_many``.
+
+Run with ``python benchmarks/bench_open_many.py``.
+"""
+import argparse
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+
+import numpy as np
+
+from h5preserve import (
+    open as h5open, open_many, RegistryContainer, GroupContainer,
+)
+
+
+def write_files(directory, count, size):
+    """
+    Write `count` small run files, returning their paths
+    """
+    registries = RegistryContainer()
+    paths = []
+    for i in range(count):
+        paths.append(os.path.join(directory, "run{}.h5".format(i)))
+        with h5open(paths[-1], registries, mode="w") as f:
+            f["results"] = GroupContainer(
+                values=np.arange(size) + i, errors=np.ones(size),
+            )
+            f["log"] = np.arange(size * 10)
+    return paths
+
+
+def load_serial(paths, registries):
+    """
+    Load the results from each file in turn
+    """
+    for path in paths:
+        with h5open(path, registries, mode="r") as f:
+            values = f.h5py_group["results/values"]
+            values[()]  # pylint: disable=pointless-statement
+
+
+def load_parallel(paths, registries, workers):
+    """
+    Load the results from the files with ``open_many``
+    """
+    for _ in open_many(
+        paths, registries, keys=["results/values"], workers=workers
+    ):
+        pass
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    registries = RegistryContainer()
+    directory = mkdtemp()
+    try:
+        paths = write_files(directory, args.files, args.size)
+        start = perf_counter()
+        load_serial(paths, registries)
+        serial = perf_counter() - start
+        start = perf_counter()
+        load_parallel(paths, registries, args.workers)
+        parallel = perf_counter() - start
+    finally:
+        rmtree(directory)
+    print("serial     {:8.1f} ms".format(serial * 1000))
+    print("open_many  {:8.1f} ms ({} workers)".format(
+        parallel * 1000, args.workers
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# coding: utf-8
+"""
+Benchmark writing many objects to a group via ``update`` against writing each
+object via ``__setitem__``.
+
+Run with ``python benchmarks/bench_update.py``.
+"""
+import argparse
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import os
+
+import numpy as np
+
+from h5preserve import open as h5open, Registry, RegistryContainer, \
+    DatasetContainer
+
+
+class Experiment:
+    # pylint: disable=too-few-public-methods,missing-docstring
+    def __init__(self, data, time_started):
+        self.data = data
+        self.time_started = time_started
+
+
+def get_registries():
+    """
+    Return the registries used for the benchmark
+    """
+    registry = Registry("experiment")
+
+    @registry.dumper(Experiment, "Experiment", version=1)
+    def _exp_dump(experiment):
+        return DatasetContainer(
+            data=experiment.data,
+            attrs={"time started": experiment.time_started},
+        )
+
+    @registry.loader("Experiment", version=1)
+    def _exp_load(dataset):
+        return Experiment(
+            data=dataset["data"],
+            time_started=dataset["attrs"]["time started"],
+        )
+
+    return RegistryContainer(registry)
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--objects", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    registries = get_registries()
+    experiments = {
+        "exp{}".format(i): Experiment(np.arange(args.size), i)
+        for i in range(args.objects)
+    }
+
+    def set_each(f):
+        for key, experiment in experiments.items():
+            f[key] = experiment
+
+    benchmarks = {
+        "__setitem__": set_each,
+        "update": lambda f: f.update(experiments),
+    }
+    with TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "bench_update.hdf5")
+        for name, func in benchmarks.items():
+            times = []
+            for _ in range(args.repeat):
+                with h5open(filename, registries, mode="w") as f:
+                    start = perf_counter()
+                    func(f)
+                    times.append(perf_counter() - start)
+            print("{:<22} {:8.1f} ms".format(name, min(times) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,16 @@ native python types.
 :license: 3-clause BSD
 """
 from collections import defaultdict
-from collections.abc import MutableMapping, MutableSequence
+from collections.abc import MutableSequence
+from contextlib import contextmanager
 from logging import getLogger
+import posixpath
+import threading
 from warnings import warn
 import weakref
 
 import h5py
+from numpy import ndarray
 
 from ._utils import (
     get_group_items as _get_group_items,
@@ -24,16 +28,54 @@ from ._utils import (
     H5PRESERVE_ATTR_LABEL,
     H5PRESERVE_ATTR_VERSION,
     H5PRESERVE_ATTR_ON_DEMAND,
+    H5PRESERVE_ATTR_APPENDABLE,
+    DatasetStatistics,
+    create_group as _create_group,
+    get_appendable_options as _get_appendable_options,
+    DeduplicationStats,
+    IncrementalStats,
+    UnchangedObject as _UnchangedObject,
     is_externally_dumped as _is_externally_dumped,
     is_attr_writeable as _is_attr_writeable,
     is_h5py_writable as _is_h5py_writable,
+    is_shareable as _is_shareable,
+    WriteSession as _WriteSession,
     H5PreserveWarning,
 )
+from ._containers import (
+    ContainerBase as _ContainerBase,
+    OnDemandBase as _OnDemandBase,
+    GroupContainer,
+    OnDemandGroupContainer,
+    DatasetContainer,
+    OnDemandDatasetContainer,
+    AppendableDatasetContainer,
+    AppendableDataset,
+    DelayedContainer,
+    HardLink,
+)
+from ._groups import H5PreserveGroup, H5PreserveFile
+from ._open import open, open_bytes, open_many, SERIALIZED_FILENAME
+from ._dedup import DeduplicationMixin as _DeduplicationMixin
+from ._incremental import IncrementalMixin as _IncrementalMixin
+from ._catalog import (
+    CatalogMixin as _CatalogMixin,
+    CatalogEntry,
+    ObjectSummary,
+)
+from .backends import (
+    BackendGroup as _BackendGroup,
+    BackendDataset as _BackendDataset,
+    MemoryBackend as _MemoryBackend,
+)
 __all__ = [
     "OnDemandWrapper", "RegistryContainer", "GroupContainer",
     "OnDemandGroupContainer", "DatasetContainer", "OnDemandDatasetContainer",
     "DelayedContainer", "Registry", "H5PreserveGroup", "H5PreserveFile",
-    "HardLink", "open", "new_registry_list", "wrap_on_demand",
+    "HardLink", "open", "open_bytes", "open_many", "new_registry_list",
+    "wrap_on_demand",
+    "DeduplicationStats", "IncrementalStats", "AppendableDatasetContainer",
+    "AppendableDataset", "CatalogEntry", "ObjectSummary", "DatasetStatistics",
 ]
 
 # versioneer stuff
@@ -43,12 +85,6 @@ del get_versions
 
 log = getLogger(__name__)
 
-ALLOWED_DATASET_KEYS = {
-    "attrs", "shape", "dtype", "data", "chunks", "maxshape", "fillvalue",
-    "compression", "compression_opts", "scaleoffset", "shuffle",
-    "fletcher32", "track_times",
-}
-
 UNKNOWN_NAMESPACE = "Unknown namespace {}."
 UNSUPPORTED_H5PY_TYPE = "Unsupported h5py type {}."
 UNKNOWN_H5PRESERVE_TYPE = "Unknown h5preserve type {}."
@@ -58,16 +94,19 @@ INVALID_DUMPER = "Dumper for {} with version {} returned incorrect type."
 NOT_LOADABLE = "{} is not something that can be loaded."
 LABEL_NOT_IN_NAMESPACE = "Label {} not in namespace {}."
 NO_SUITABLE_LOADER = "Cannot find suitable loader for label {} with version {}"
-INVALID_DATASET_OPTION = "{} is not a valid dataset option."
-NO_PATH = "No path defined for hard link."
 ATTR_NOT_DUMPED = "Attribute {}={} has not been dumped."
 DELAYED_OBJ_NOT_WRITTEN = "{name} has not been written to {group}"
 NUM_DELAYED_REFS = "Number of delayed containers is %s."
 NUM_DELAYED_REFS_ON_CLOSE = "Number of delayed containers on close is %s."
+SERIALIZED_KEY = "obj"
 
 
-class RegistryContainer(MutableSequence):
+class RegistryContainer(
+    _IncrementalMixin, _DeduplicationMixin, _CatalogMixin, MutableSequence
+):
     # pylint: disable=too-many-ancestors
+    # the options, and the per-thread and per-file state, shared by the mixins
+    # pylint: disable=too-many-instance-attributes
     """
     Ordered container of registries which manages interaction with the hdf5
     file.
@@ -76,8 +115,27 @@ class RegistryContainer(MutableSequence):
     ----------
     *registries : list of Registry
         the list of registries to be associated with this container
+    link_shared : bool
+        if True (the default), objects which appear multiple times within a
+        single write are only written once, with later occurrences written as
+        hard links to the first
+    deduplicate : bool
+        if True, datasets whose contents are identical to a dataset already in
+        the file are written as hard links to the existing dataset, see
+        ``to_file``
+    statistics : bool or "chunks"
+        if True, summary statistics are stored on each numeric dataset
+        written, see ``to_file``
+
+    Attributes
+    ----------
+    dedup_stats : DeduplicationStats
+        statistics about content-hash deduplication
     """
-    def __init__(self, *registries):
+    def __init__(
+        self, *registries, link_shared=True, deduplicate=False,
+        statistics=False
+    ):
         # pylint: disable=super-init-not-called
         self._version_lock = {}
         self._registries = {}
@@ -85,6 +143,16 @@ class RegistryContainer(MutableSequence):
         if registries:
             self.extend(registries)
         self._delayed_refs = set()
+        self._appendables = {}
+        self._link_shared = link_shared
+        self._deduplicate = deduplicate
+        self._statistics = statistics
+        self._local = threading.local()
+        self._content_indices = {}
+        self._catalogs = {}
+        self._clean_objects = {}
+        self._batches = {}
+        self.dedup_stats = DeduplicationStats()
 
     def __getitem__(self, index):
         return self._indexed_registries[index]
@@ -111,7 +179,10 @@ class RegistryContainer(MutableSequence):
 
     def __add__(self, other):
         if hasattr(other, "registries"):
-            new_registry_container = RegistryContainer(*self.registries)
+            new_registry_container = RegistryContainer(
+                *self.registries, link_shared=self._link_shared,
+                deduplicate=self._deduplicate, statistics=self._statistics,
+            )
             new_registry_container.extend(other.registries)
             return new_registry_container
         return NotImplemented
@@ -123,6 +194,34 @@ class RegistryContainer(MutableSequence):
         """
         return (self._registries[name] for name in self)
 
+    @property
+    def _write_session(self):
+        """
+        The write session in progress in the current thread, if any, so that
+        threads writing through the same registries do not share the objects
+        written (and so the hard links created) by each other.
+        """
+        return getattr(self._local, "session", None)
+
+    @_write_session.setter
+    def _write_session(self, session):
+        self._local.session = session
+
+    @contextmanager
+    def _session(self):
+        """
+        Context manager providing the current write session, starting a new
+        session if one is not already in progress.
+        """
+        if self._write_session is not None:
+            yield self._write_session
+            return
+        self._write_session = _WriteSession()
+        try:
+            yield self._write_session
+        finally:
+            self._write_session = None
+
     def from_file(self, h5py_obj):
         """
         Return an representation of a hdf5 object from a hdf5 file
@@ -131,31 +230,46 @@ class RegistryContainer(MutableSequence):
         ----------
         h5py_obj : a ``h5py`` object, e.g. group, dataset
         """
-        namespace = h5py_obj.attrs.get(H5PRESERVE_ATTR_NAMESPACE)
+        attrs = dict(h5py_obj.attrs)
+        namespace = attrs.get(H5PRESERVE_ATTR_NAMESPACE)
         if namespace is None:
-            if isinstance(h5py_obj, h5py.Group):
+            if isinstance(h5py_obj, _BackendGroup):
                 return H5PreserveGroup(h5py_group=h5py_obj, registries=self)
+            if attrs.get(H5PRESERVE_ATTR_APPENDABLE, False):
+                return self._h5py_to_h5preserve(h5py_obj, attrs=attrs)
             warn(
                 "No type information about object, returning native h5py"
                 "object.", H5PreserveWarning
             )
             return h5py_obj
         if namespace in self._registries:
-            return self._h5py_to_h5preserve(h5py_obj)
+            return self._h5py_to_h5preserve(h5py_obj, attrs=attrs)
         raise RuntimeError(UNKNOWN_NAMESPACE.format(namespace))
 
-    def _h5py_to_h5preserve(self, h5py_obj, load_on_demand=False):
+    def _h5py_to_h5preserve(self, h5py_obj, load_on_demand=False, attrs=None):
         """
-        convert h5py object to h5preserve representation
+        convert h5py object to h5preserve representation, using `attrs` as
+        the attributes of `h5py_obj` if they have already been read
         """
-        attrs = dict(h5py_obj.attrs)
-        if isinstance(h5py_obj, h5py.Group):
+        if attrs is None:
+            attrs = dict(h5py_obj.attrs)
+        if isinstance(h5py_obj, _BackendGroup):
+            members, lazy = self._get_loader_members(attrs)
             return GroupContainer(
                 attrs, **_get_group_items(
-                    h5py_obj, attrs, self, load_on_demand=load_on_demand
+                    h5py_obj, attrs, self, load_on_demand=load_on_demand,
+                    members=members, lazy=lazy,
                 )
             )
-        if isinstance(h5py_obj, h5py.Dataset):
+        if isinstance(h5py_obj, _BackendDataset):
+            if attrs.get(H5PRESERVE_ATTR_APPENDABLE, False):
+                return AppendableDatasetContainer(
+                    attrs,
+                    data=self._get_appendable_dataset(h5py_obj),
+                    shape=h5py_obj.shape,
+                    fillvalue=h5py_obj.fillvalue,
+                    dtype=h5py_obj.dtype,
+                )
             return DatasetContainer(
                 attrs,
                 data=_get_dataset_data(
@@ -167,7 +281,10 @@ class RegistryContainer(MutableSequence):
             )
         raise TypeError(UNSUPPORTED_H5PY_TYPE.format(type(h5py_obj)))
 
-    def to_file(self, h5py_group, key, val):
+    def to_file(
+        self, h5py_group, key, val, *, deduplicate=None, statistics=None,
+        track_times=None, external_base=None
+    ):
         """
         Dump h5preserve object to hdf5 file
 
@@ -179,28 +296,141 @@ class RegistryContainer(MutableSequence):
             the name for the object
         val
             the object to add
-        """
-        if isinstance(val, (ContainerBase, DelayedContainer)):
+        deduplicate : bool, optional
+            if True, the contents of each dataset written are hashed, and
+            datasets identical to one already in the file (including their
+            attributes) are written as hard links to the existing dataset.
+            The bytes saved are recorded in ``dedup_stats``. Defaults to the
+            value given when creating the ``RegistryContainer``.
+        statistics : bool or "chunks", optional
+            if True, the minimum, maximum, number of values and number of nan
+            values of each numeric dataset written are stored as attributes
+            of the dataset (see ``H5PreserveGroup.get_statistics``). If
+            "chunks", the minimum and maximum of each chunk of chunked
+            datasets are also stored. Defaults to the value given when
+            creating the ``RegistryContainer``.
+        track_times : bool, optional
+            if False, the creation and modification times of the groups and
+            datasets written are not recorded (unless ``track_times`` is given
+            for a dataset), reducing the metadata written for each object.
+            By default, the times are recorded as usual.
+        external_base : ``h5py.File``, optional
+            if given, content hashes are stored on the datasets written, and
+            any group or dataset which is identical to the object at the same
+            path in `external_base` (as determined by the content hashes
+            stored there) is written as an ``h5py.ExternalLink`` to it instead.
+            Links in `external_base` are followed, so that the new link points
+            to the file the object is actually stored in.
+        """
+        new_session = self._write_session is None
+        with self._session() as session:
+            if new_session:
+                self._configure_session(
+                    session, [val], deduplicate=deduplicate,
+                    statistics=statistics, track_times=track_times,
+                    external_base=external_base,
+                )
+            if isinstance(val, _UnchangedObject):
+                val = self._dump_unchanged(val)
+            self._forget_clean(h5py_group, key)
+            val, digest = self._link_existing(h5py_group, key, val)
+            self._write_to_file(h5py_group, key, val)
+            if digest is not None:
+                self._add_content(h5py_group[key], digest)
+            if session.statistics and isinstance(
+                val, (DatasetContainer, ndarray)
+            ) and not isinstance(val, AppendableDatasetContainer):
+                self._add_statistics(h5py_group[key], val)
+        if new_session:
+            self._update_catalog(h5py_group, key)
+        if new_session and h5py_group.file.swmr_mode:
+            h5py_group.file.flush()
+
+    def _write_to_file(self, h5py_group, key, val):
+        """
+        Write h5preserve object (or link) `val` to hdf5 file
+        """
+        if isinstance(val, (_ContainerBase, DelayedContainer)):
             self._write_containers_to_file(h5py_group, key, val)
         elif isinstance(val, HardLink):
             if val.h5py_obj is None:
                 # pylint: disable=protected-access
                 val._set_file(h5py_group.file)
             h5py_group[key] = val.h5py_obj
-        elif _is_h5py_writable(val):
+        elif isinstance(val, h5py.ExternalLink):
             h5py_group[key] = val
+        elif _is_h5py_writable(val):
+            if isinstance(val, ndarray) and (
+                self._write_session.track_times is False
+            ):
+                h5py_group.create_dataset(key, data=val, track_times=False)
+            else:
+                h5py_group[key] = val
+            if isinstance(val, ndarray):
+                self._write_session.add_written(val, h5py_group[key])
         else:
-            raise TypeError(
-                UNKNOWN_H5PRESERVE_TYPE.format(type(val))
-            )
+            raise TypeError(UNKNOWN_H5PRESERVE_TYPE.format(type(val)))
+
+    def to_file_many(
+        self, h5py_group, items, *, deduplicate=None, statistics=None,
+        track_times=None, external_base=None
+    ):
+        """
+        Dump many h5preserve objects to hdf5 file in one batch.
+
+        This is equivalent to calling ``to_file`` for each item, but the
+        objects are written as a single write (so objects shared between
+        items are only written once), in order of their path, with each
+        group containing them looked up or created only once, and the
+        catalog updated and the file flushed (in SWMR mode) only once.
+
+        Parameters
+        ----------
+        h5py_group : ``h5py.Group``
+            the group to add the objects to
+        items : Mapping
+            mapping of the names (which can be paths relative to
+            `h5py_group`) to the objects to add
+        deduplicate, statistics, track_times, external_base : optional
+            see ``to_file``
+        """
+        new_session = self._write_session is None
+        with self._session() as session:
+            if new_session:
+                self._configure_session(
+                    session, items.values(), deduplicate=deduplicate,
+                    statistics=statistics, track_times=track_times,
+                    external_base=external_base,
+                )
+            groups = {"": h5py_group}
+            for key in sorted(items):
+                parent, name = posixpath.split(key.strip("/"))
+                if parent not in groups:
+                    groups[parent] = h5py_group.require_group(parent)
+                self.to_file(groups[parent], name, items[key])
+        if new_session:
+            self._update_catalog(h5py_group, *items)
+        if new_session and h5py_group.file.swmr_mode:
+            h5py_group.file.flush()
+
+    def _forget_file(self, h5py_file):
+        """
+        Remove any cached information about `h5py_file`
+        """
+        self._content_indices.pop(h5py_file.id, None)
+        self._catalogs.pop(h5py_file.id, None)
+        self._clean_objects.pop(h5py_file.id, None)
 
     def _write_group_to_file(self, h5py_group, key, val):
         """
         Write group to an hdf5 file
         """
-        new_obj = h5py_group.create_group(key)
+        new_obj = _create_group(
+            h5py_group, key,
+            track_times=self._write_session.track_times is not False,
+        )
         new_obj.attrs.update(val.attrs)
-        if isinstance(val, OnDemandBase):
+        if isinstance(val, _OnDemandBase):
             # pylint: disable=protected-access
             py_obj = val._ref()
             py_obj._h5preserve_dump = _on_demand_group_dumper_generator(
@@ -213,30 +443,54 @@ class RegistryContainer(MutableSequence):
                 self.to_file(new_obj, obj_name, obj_val)
         return new_obj
 
-    @staticmethod
-    def _write_dataset_to_file(h5py_group, key, val):
+    def _write_dataset_to_file(self, h5py_group, key, val):
         """
         Write datasets to an hdf5 file
         """
-        new_obj = h5py_group.create_dataset(key, **val)
+        if isinstance(val, AppendableDatasetContainer):
+            options = _get_appendable_options(val)
+        else:
+            options = dict(val)
+        if self._write_session.track_times is False:
+            options.setdefault("track_times", False)
+        new_obj = h5py_group.create_dataset(key, **options)
         new_obj.attrs.update(val.attrs)
         return new_obj
 
     @staticmethod
-    def _write_h5preserve_metadata_to_file(h5py_obj, val):
+    def _get_h5preserve_metadata(val):
         """
-        Write the required metadata for h5preserve to file
+        Return the required metadata for h5preserve as attributes
         """
+        metadata = {}
         # pylint: disable=protected-access
         if val._label is not None:
-            h5py_obj.attrs[H5PRESERVE_ATTR_LABEL] = val._label
+            metadata[H5PRESERVE_ATTR_LABEL] = val._label
         if val._namespace is not None:
-            h5py_obj.attrs[H5PRESERVE_ATTR_NAMESPACE] = val._namespace
+            metadata[H5PRESERVE_ATTR_NAMESPACE] = val._namespace
         if val._version is not None:
-            h5py_obj.attrs[H5PRESERVE_ATTR_VERSION] = val._version
+            metadata[H5PRESERVE_ATTR_VERSION] = val._version
         if val._on_demand:
-            h5py_obj.attrs[H5PRESERVE_ATTR_ON_DEMAND] = val._on_demand
+            metadata[H5PRESERVE_ATTR_ON_DEMAND] = val._on_demand
+        if val._appendable:
+            metadata[H5PRESERVE_ATTR_APPENDABLE] = val._appendable
         # pylint: enable=protected-access
+        return metadata
+
+    @staticmethod
+    def _check_attrs(val):
+        """
+        Check that the attributes of `val` can be written to an hdf5 file
+        """
+        for item_name, item in val.attrs.items():
+            if not _is_attr_writeable(item):
+                raise TypeError(ATTR_NOT_DUMPED.format(item_name, item))
+
+    def _write_h5preserve_metadata_to_file(self, h5py_obj, val):
+        """
+        Write the required metadata for h5preserve to file
+        """
+        h5py_obj.attrs.update(self._get_h5preserve_metadata(val))
 
     def _write_containers_to_file(self, h5py_group, key, val):
         """
@@ -247,16 +501,14 @@ class RegistryContainer(MutableSequence):
             val._set_info(h5group=h5py_group, name=key, registries=self)
             # pylint: enable=protected-access
         else:
-            for item_name, item in val.attrs.items():
-                if not _is_attr_writeable(item):
-                    raise TypeError(ATTR_NOT_DUMPED.format(item_name, item))
-
+            self._check_attrs(val)
             if isinstance(val, GroupContainer):
                 new_obj = self._write_group_to_file(h5py_group, key, val)
             elif isinstance(val, DatasetContainer):
                 new_obj = self._write_dataset_to_file(h5py_group, key, val)
 
             self._write_h5preserve_metadata_to_file(new_obj, val)
+            self._write_session.add_written(val, new_obj)
 
     def dump(self, obj):
         """
@@ -273,14 +525,31 @@ class RegistryContainer(MutableSequence):
         if _is_externally_dumped(obj):
             return obj
         # pylint: enable=unidiomatic-typecheck
-        converted_obj = self._obj_to_h5preserve(obj)
-        if (
-            not isinstance(converted_obj, OnDemandBase)
-        ) and (
-            isinstance(converted_obj, tuple(RECURSIVE_DUMPING_TYPES))
-        ):
-            for key, val in converted_obj.items():
-                converted_obj[key] = self.dump(val)
+        with self._session() as session:
+            tracked = hasattr(obj, "_h5preserve_dirty")
+            # pylint: disable=protected-access
+            if tracked and session.skip_clean and not obj._h5preserve_dirty:
+                converted_obj = _UnchangedObject(obj)
+                session.add_dirty_tracked(obj, converted_obj)
+                return converted_obj
+            # pylint: enable=protected-access
+            share = self._link_shared and _is_shareable(obj)
+            if share:
+                converted_obj = session.get_dumped(obj)
+                if converted_obj is not None:
+                    return converted_obj
+            converted_obj = self._obj_to_h5preserve(obj)
+            if share:
+                session.add_dumped(obj, converted_obj)
+            if tracked:
+                session.add_dirty_tracked(obj, converted_obj)
+            if (
+                not isinstance(converted_obj, _OnDemandBase)
+            ) and (
+                isinstance(converted_obj, tuple(RECURSIVE_DUMPING_TYPES))
+            ):
+                for key, val in converted_obj.items():
+                    converted_obj[key] = self.dump(val)
         return converted_obj
 
     def _add_delayed(self, obj):
@@ -290,6 +559,45 @@ class RegistryContainer(MutableSequence):
         self._delayed_refs.add(weakref.ref(obj))
         log.debug(NUM_DELAYED_REFS, len(self._delayed_refs))
 
+    def _add_appendable(self, obj):
+        """
+        Track appendable dataset so it can be flushed on close, keeping it
+        alive until then so that buffered rows are not lost
+        """
+        h5py_dataset = obj.h5py_dataset
+        appendables = self._appendables.setdefault(h5py_dataset.file.id, {})
+        existing = appendables.get(h5py_dataset.name)
+        if existing is not None and existing is not obj:
+            existing.flush()
+        appendables[h5py_dataset.name] = obj
+
+    def _get_appendable_dataset(self, h5py_dataset):
+        """
+        Return the tracked appendable dataset for `h5py_dataset`, creating it
+        if needed, so that all appends to a dataset share one buffer
+        """
+        appendable = self._appendables.get(h5py_dataset.file.id, {}).get(
+            h5py_dataset.name
+        )
+        if appendable is None:
+            appendable = AppendableDataset(h5py_dataset, registries=self)
+        return appendable
+
+    def _get_appendable(self, h5py_file):
+        """
+        Return the tracked appendable datasets in `h5py_file`
+        """
+        return list(self._appendables.get(h5py_file.id, {}).values())
+
+    def _flush_appendable(self, h5py_file, forget=False):
+        """
+        Flush any appendable datasets in `h5py_file`
+        """
+        for appendable in self._get_appendable(h5py_file):
+            appendable.flush()
+        if forget:
+            self._appendables.pop(h5py_file.id, None)
+
     def _warn_delayed(self):
         """
         Warn if delayed container not written
@@ -309,7 +617,7 @@ class RegistryContainer(MutableSequence):
 
     def _obj_to_h5preserve(self, obj):
         """convert python object to h5preserve representation"""
-        if isinstance(obj, ContainerBase):
+        if isinstance(obj, _ContainerBase):
             return obj
         if isinstance(obj, DelayedContainer):
             self._add_delayed(obj)
@@ -340,12 +648,12 @@ class RegistryContainer(MutableSequence):
                 version = sorted(dumpers, reverse=True)[0]
             label, dumper = dumpers[version]
         dumped_obj = dumper(obj)
-        if isinstance(dumped_obj, ContainerBase):
+        if isinstance(dumped_obj, _ContainerBase):
             # pylint: disable=protected-access
             dumped_obj._namespace = namespace
             dumped_obj._label = label
             dumped_obj._version = version
-            if isinstance(dumped_obj, OnDemandBase):
+            if isinstance(dumped_obj, _OnDemandBase):
                 dumped_obj._ref = weakref.ref(obj)
             # pylint: enable=protected-access
             return dumped_obj
@@ -362,7 +670,7 @@ class RegistryContainer(MutableSequence):
         """
         if isinstance(obj, OnDemandWrapper):
             return obj
-        if not isinstance(obj, ContainerBase):
+        if not isinstance(obj, _ContainerBase):
             raise TypeError(NOT_LOADABLE.format(type(obj)))
 
         if isinstance(obj, GroupContainer):
@@ -386,30 +694,126 @@ class RegistryContainer(MutableSequence):
 
         return self._get_loader(obj)(obj)
 
+    def dumps(self, obj, *, buffer_callback=None):
+        """
+        Serialize a native python object to bytes, for example to send it to
+        another process, using the same representation (including the
+        namespaces, labels and versions of the registries used) as when it is
+        written to a file. Use ``loads`` to read it back.
+
+        The object is written to an in-memory file (see
+        ``h5preserve.backends.MemoryBackend``), which is serialized with
+        a small JSON header followed by the raw data of each dataset.
+
+        Parameters
+        ----------
+        obj
+            the object to serialize
+        buffer_callback : callable, optional
+            as with pickle protocol 5, called with a ``pickle.PickleBuffer``
+            of the data of each dataset. Buffers for which it returns a false
+            value are not included in the returned bytes, so they can be sent
+            without being copied, and must be passed to ``loads``.
+
+        Returns
+        -------
+        bytes
+        """
+        backend = _MemoryBackend()
+        with H5PreserveFile(
+            backend.open(SERIALIZED_FILENAME, mode="x"), self
+        ) as h5preserve_file:
+            h5preserve_file[SERIALIZED_KEY] = obj
+        return backend.to_bytes(
+            SERIALIZED_FILENAME, buffer_callback=buffer_callback
+        )
+
+    def loads(self, data, *, buffers=None):
+        """
+        Load a native python object serialized by ``dumps``. The data of
+        arrays is not copied, so arrays refer to (and are read-only if)
+        `data` or `buffers` are.
+
+        Parameters
+        ----------
+        data : bytes-like
+            the serialized object
+        buffers : iterable of bytes-like, optional
+            the buffers excluded from `data` by the `buffer_callback` passed
+            to ``dumps``, in the same order
+        """
+        backend = _MemoryBackend()
+        backend.from_bytes(SERIALIZED_FILENAME, data, buffers=buffers)
+        return self._load_serialized(
+            backend.open(SERIALIZED_FILENAME, mode="r")[SERIALIZED_KEY]
+        )
+
+    def _load_serialized(self, h5py_obj):
+        """
+        Load `h5py_obj` from a serialized in-memory file, where plain arrays
+        are returned as arrays rather than as datasets
+        """
+        if isinstance(h5py_obj, _BackendDataset) and (
+            H5PRESERVE_ATTR_NAMESPACE not in h5py_obj.attrs
+        ) and not h5py_obj.attrs.get(H5PRESERVE_ATTR_APPENDABLE, False):
+            # arrays dumped without a registry
+            return h5py_obj[()]
+        obj = self.from_file(h5py_obj)
+        if isinstance(obj, H5PreserveGroup):
+            return obj
+        return self.load(obj)
+
     def _get_loader(self, obj):
         """
         get the loader for obj
         """
         # pylint: disable=protected-access
-        loaders = self._registries[obj._namespace].loaders
-        if obj._label not in loaders:
+        version = self._get_loader_version(
+            obj._namespace, obj._label, obj._version
+        )
+        return self._registries[obj._namespace].loaders[obj._label][version]
+
+    def _get_loader_version(self, namespace, label, version):
+        """
+        get the version key of the loader to use for an object of version
+        `version` with label `label` in namespace `namespace`
+        """
+        loaders = self._registries[namespace].loaders
+        if label not in loaders:
             raise RuntimeError(
-                LABEL_NOT_IN_NAMESPACE.format(obj._label, obj._namespace)
+                LABEL_NOT_IN_NAMESPACE.format(label, namespace)
             )
-        loaders = loaders[obj._label]
-        if obj._version is None and None in loaders:
-            return loaders[None]
+        loaders = loaders[label]
+        if version is None and None in loaders:
+            return None
         if all in loaders:
-            return loaders[all]
-        if obj._version in loaders:
-            return loaders[obj._version]
+            return all
+        if version in loaders:
+            return version
+        if any in loaders:
+            return any
+        raise RuntimeError(NO_SUITABLE_LOADER.format(label, version))
+
+    def _get_loader_members(self, attrs):
+        """
+        get the members declared by the loader for the object with attributes
+        `attrs`, and whether they should be loaded lazily, see
+        ``Registry.loader``
+        """
+        namespace = attrs.get(H5PRESERVE_ATTR_NAMESPACE)
+        if namespace not in self._registries:
+            return None, False
+        label = attrs.get(H5PRESERVE_ATTR_LABEL)
         try:
-            return loaders[any]
-        except KeyError:
-            # pylint: disable=raise-missing-from
-            raise RuntimeError(
-                NO_SUITABLE_LOADER.format(obj._label, obj._version)
+            version = self._get_loader_version(
+                namespace, label, attrs.get(H5PRESERVE_ATTR_VERSION)
             )
+        except RuntimeError:
+            # raised properly when the object is loaded
+            return None, False
+        return self._registries[namespace].loader_members.get(
+            label, {}
+        ).get(version, (None, False))
 
     def lock_version(self, cls, version):
         """
@@ -425,168 +829,6 @@ class RegistryContainer(MutableSequence):
         self._version_lock[cls] = version
 
 
-class ContainerBase(MutableMapping):
-    # pylint: disable=abstract-method,missing-docstring
-    def __init__(self, attrs=None):
-        # pylint: disable=super-init-not-called
-        if attrs is None:
-            attrs = {}
-        self._namespace = attrs.pop(H5PRESERVE_ATTR_NAMESPACE, None)
-        self._label = attrs.pop(H5PRESERVE_ATTR_LABEL, None)
-        self._version = attrs.pop(H5PRESERVE_ATTR_VERSION, None)
-        self._on_demand = attrs.pop(H5PRESERVE_ATTR_ON_DEMAND, False)
-        self.attrs = attrs
-
-
-class OnDemandBase(ContainerBase):
-    # pylint: disable=too-many-ancestors
-    # pylint: disable=abstract-method,missing-docstring
-    def __init__(self, attrs=None):
-        self._ref = None
-        super().__init__(attrs)
-        self._on_demand = True
-
-
-class GroupContainer(ContainerBase):
-    # pylint: disable=too-many-ancestors
-    """
-    Representation of an hdf5 group for use in h5preserve.
-
-    Parameters
-    ----------
-    attrs : Mapping
-        mapping containing the attributes of the group
-    **kwargs
-        datasets or subgroups to add to the group
-    """
-    def __init__(self, attrs=None, **kwargs):
-        super().__init__(attrs)
-        self._group_members = {}
-        self.update(kwargs)
-
-    def __getitem__(self, key):
-        return self._group_members[key]
-
-    def __setitem__(self, key, val):
-        self._group_members[key] = val
-
-    def __delitem__(self, key):
-        self._group_members.__delitem__(key)
-
-    def __iter__(self):
-        return iter(self._group_members)
-
-    def __len__(self):
-        return len(self._group_members)
-
-    def __repr__(self):
-        return "GroupContainer(attrs={attrs!r}, {group_items})".format(
-            attrs=self.attrs,
-            group_items=", ".join(
-                "{key}={val!r}".format(key=key, val=val)
-                for key, val in self._group_members.items()
-                if val is not None
-            )
-        )
-
-
-class OnDemandGroupContainer(GroupContainer, OnDemandBase):
-    # pylint: disable=too-many-ancestors
-    """
-    Subclass of `GroupContainer` which supports accessing group members on
-    demand, rather that loading immediately.
-    """
-    pass
-
-
-class DatasetContainer(ContainerBase):
-    # pylint: disable=too-many-ancestors
-    """
-    Representation of an hdf5 dataset for use in h5preserve.
-
-    Parameters
-    ----------
-    attrs : Mapping
-        mapping containing the attributes of the group
-    **kwargs
-        properties of the group, which get passed to create group
-    """
-    def __init__(self, attrs=None, **kwargs):
-        super().__init__(attrs)
-        self._dataset_members = {}
-        self.update(kwargs)
-
-    def __getitem__(self, key):
-        if key == "attrs":
-            return self.attrs
-        return self._dataset_members[key]
-
-    def __setitem__(self, key, val):
-        if key in ALLOWED_DATASET_KEYS:
-            self._dataset_members[key] = val
-        else:
-            raise TypeError(INVALID_DATASET_OPTION.format(key))
-
-    def __delitem__(self, key):
-        self._dataset_members.__delitem__(key)
-
-    def __iter__(self):
-        return iter(self._dataset_members)
-
-    def __len__(self):
-        return len(self._dataset_members)
-
-    def __repr__(self):
-        return "DatasetContainer(attrs={attrs!r}, {dataset})".format(
-            attrs=self.attrs,
-            dataset=", ".join(
-                "{key}={val!r}".format(key=key, val=val)
-                for key, val in self._dataset_members.items()
-                if val is not None
-            )
-        )
-
-
-class OnDemandDatasetContainer(DatasetContainer, OnDemandBase):
-    # pylint: disable=too-many-ancestors
-    """
-    Subclass of `DatasetContainer` which supports accessing dataset data on
-    demand, rather that loading immediately.
-    """
-    pass
-
-
-class DelayedContainer:
-    # pylint: disable=too-few-public-methods
-    """
-    Helper class for allowing delayed writing of containers to hdf5 files.
-    """
-    def __init__(self):
-        self._h5group = None
-        self._name = None
-        self._registries = None
-        self._written = False
-
-    def write_container(self, data):
-        """
-        Write `data` to hdf5 file with the associated located of the
-        `DelayedContainer`.
-        """
-        if self._h5group is not None:
-            self._registries.to_file(
-                self._h5group, self._name, self._registries.dump(data)
-            )
-        self._written = True
-
-    def _set_info(self, h5group, name, registries):
-        """
-        Set the info required for writing to the hdf5 file
-        """
-        self._h5group = h5group
-        self._name = name
-        self._registries = registries
-
-
 class Registry:
     """
     Register of functions for converting between hdf5 and python.
@@ -605,6 +847,7 @@ class Registry:
         self._frozen = False
         self.dumpers = defaultdict(dict)
         self.loaders = defaultdict(dict)
+        self.loader_members = defaultdict(dict)
 
     @property
     def name(self):
@@ -637,7 +880,7 @@ class Registry:
             )
         return add_dumper
 
-    def loader(self, label, version):
+    def loader(self, label, version, *, members=None, lazy=False):
         """
         Decorator function to create a loader function.
 
@@ -647,209 +890,26 @@ class Registry:
             the label or tag associated with this class
         version : integer, any, all, None
             The version of the output that this function reads.
-        """
+        members : collection of strings, optional
+            the names of the members of the group which the loader uses. If
+            given, only these members are read from the file, and the others
+            are not passed to the loader.
+        lazy : bool
+            if True, the members of the group are passed to the loader as
+            ``OnDemandWrapper`` instances which read the member from the file
+            when called, rather than being read before the loader is called.
+        """
+        if members is not None:
+            members = tuple(members)
+
         def add_loader(new_loader):
             # pylint: disable=missing-docstring
             self.loaders[label][version] = new_loader
+            self.loader_members[label][version] = (members, lazy)
         return add_loader
 
 
-class H5PreserveGroup(MutableMapping):
-    """
-    Thin wrapper around :class:`h5py.Group` to automatically use h5preserve
-    when accessing the group contents.
-
-    Parameters
-    ----------
-    h5py_group : ``h5py.Group``
-    registries : RegistryContainer
-        the collection of registries that you want to use to read from the hdf5
-        file
-    """
-    def __init__(self, h5py_group, registries):
-        # pylint: disable=super-init-not-called
-        self._h5py_group = h5py_group
-        self.registries = registries
-
-    def __getitem__(self, key):
-        return self.registries.load(
-            self.registries.from_file(self._h5py_group[key])
-        )
-
-    def __setitem__(self, key, val):
-        self.registries.to_file(
-            self._h5py_group,
-            key,
-            self.registries.dump(val)
-        )
-
-    def __delitem__(self, key):
-        del self._h5py_group[key]
-
-    def __iter__(self):
-        for key in self._h5py_group:
-            yield key
-
-    def __len__(self):
-        return len(self._h5py_group)
-
-    @property
-    def h5py_group(self):
-        """
-        h5py.Group: the instance of ``h5py.Group`` which ``H5PreserveGroup``
-        wraps
-        """
-        return self._h5py_group
-
-    def create_group(self, name):
-        """
-        Creates a new group in the associated hdf5 file
-
-        Parameters
-        ----------
-        name : string, or other identifier accepted by h5py
-            name of the new group
-
-        Returns
-        -------
-        H5PreserveGroup
-            The new group wrapped by H5PreserveGroup
-        """
-        return H5PreserveGroup(
-            self._h5py_group.create_group(name), self.registries
-        )
-
-    def require_group(self, name):
-        """
-        Returns the group associated with ``name``, creating it if necessary.
-
-        Parameters
-        ----------
-        name : string, or other identifier accepted by h5py
-            name of the desired group
-
-        Returns
-        -------
-        H5PreserveGroup
-            The group wrapped by H5PreserveGroup
-        """
-        return H5PreserveGroup(
-            self._h5py_group.require_group(name), self.registries
-        )
-
-
-class H5PreserveFile(H5PreserveGroup):
-    # pylint: disable=too-many-ancestors
-    """
-    Thin wrapper around ``h5py.File`` to automatically use h5preserve when
-    accessing the file contents.
-
-    Acts like ``h5preserve.H5PreserveGroup``, but allows access to the
-    associated ``h5py.File`` instance via ``h5py_file``.
-
-    Parameters
-    ----------
-    h5py_file : a ``h5py.File``
-        the hdf5 file to wrap
-    registries : RegistryContainer
-        the collection of registries that you want to use to read from the hdf5
-        file
-    """
-    def __init__(self, h5py_file, registries):
-        self._h5py_file = h5py_file
-        super().__init__(
-            h5py_group=self._h5py_file["/"],
-            registries=registries
-        )
-
-    def close(self):
-        # pylint: disable=missing-docstring
-        # pylint: disable=protected-access
-        self.registries._warn_delayed()
-        # pylint: enable=protected-access
-        self._h5py_file.close()
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        self.close()
-        return False
-
-    @property
-    def h5py_file(self):
-        """
-        h5py.File: the instance of ``h5py.File`` which ``H5PreserveFile`` wraps
-        """
-        return self._h5py_file
-
-
-class HardLink:
-    # pylint: disable=too-few-public-methods
-    """
-    Represent a h5py hard link to be created via h5preserve.
-
-    Parameters
-    ----------
-    obj : string, h5py.Group or h5py.Dataset
-        the h5py object that the hard link points to, can either be an h5py
-        object, or a string with the absolute path of the object
-    """
-    def __init__(self, obj):
-        if isinstance(obj, str):
-            self._path = obj
-            self._h5py_obj = None
-        else:
-            self._h5py_obj = obj
-            self._path = None
-
-    @property
-    def h5py_obj(self):
-        """
-        h5py.Group or h5py.Dataset: the object which the hard link will point
-        to
-        """
-        return self._h5py_obj
-
-    @property
-    def path(self):
-        """
-        The path this object points to
-        """
-        return self._path
-
-    def _set_file(self, f):
-        """
-        set file associated with the hard link
-        """
-        if self._path is not None:
-            self._h5py_obj = f[self._path]
-        else:
-            raise RuntimeError(NO_PATH)
-
-    def __repr__(self):
-        if self._path is not None:
-            return "HardLink(path={path})".format(path=self.path)
-        return "HardLink(h5py_obj={obj})".format(obj=self.h5py_obj)
-
-
-def open(filename, registries, *, mode, **kwargs):
-    """
-    Open a hdf5 file wrapped with h5preserve.
-
-    Parameters
-    ----------
-    filename : string, or other identifier accepted by ``h5py.File``
-    registries : RegistryContainer
-        the collection of registries that you want to use to read from the hdf5
-        file
-    **kwargs
-        additional keyword arguments to pass to ``h5py.File``
-    """
-    return H5PreserveFile(h5py.File(filename, mode=mode, **kwargs), registries)
-
-
-def new_registry_list(*registries):
+def new_registry_list(*registries, **kwargs):
     """
     Create a new list of registries which includes builtin registries.
 
@@ -857,12 +917,14 @@ def new_registry_list(*registries):
     ----------
     *registries : list of Registry
         the list of registries to be associated with this container
+    **kwargs
+        additional keyword arguments to pass to ``RegistryContainer``
     """
     # pylint: disable=import-outside-toplevel
     from .additional_registries import BUILTIN_REGISTRIES
     r = BUILTIN_REGISTRIES + registries
     return RegistryContainer(
-        *r
+        *r, **kwargs
     )
 
 
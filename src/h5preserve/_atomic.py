@@ -0,0 +1,61 @@
+# coding: utf-8
+"""
+Helpers for replacing files atomically, kept free of other h5preserve imports
+so that they can be used by the storage backends as well as by checkpointing.
+"""
+from contextlib import contextmanager
+import os
+
+
+def fsync_path(path):
+    """
+    Flush the file or directory at `path` to disk
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # directories cannot be opened on some platforms (e.g. Windows)
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_replace(path, *, tag=None, sync=True):
+    """
+    Context manager providing the path of a temporary file in the same
+    directory as `path`, which replaces `path` when the context exits, so that
+    readers never see a partially written file. If an exception is raised,
+    the temporary file is removed instead.
+
+    Parameters
+    ----------
+    path : string
+        the file to replace
+    tag : string, optional
+        included in the name of the temporary file, which is
+        ``.<name>.<tag>.tmp`` (or ``.<name>.tmp``)
+    sync : bool
+        if True, the temporary file is flushed to disk before it replaces
+        `path`, and the directory is flushed afterwards, so that the
+        replacement survives a crash
+    """
+    directory, name = os.path.split(os.path.abspath(os.fspath(path)))
+    if tag is not None:
+        name = "{}.{}".format(name, tag)
+    tmp_path = os.path.join(directory, ".{}.tmp".format(name))
+    try:
+        yield tmp_path
+        if sync:
+            fsync_path(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if sync:
+        fsync_path(directory)
@@ -0,0 +1,611 @@
+# coding: utf-8
+"""
+The abstract base classes describing the storage backends, the HDF5 backend,
+and helpers shared by the other backends, see ``h5preserve.backends``.
+"""
+from abc import ABC, abstractmethod
+from base64 import b64decode, b64encode
+import posixpath
+from uuid import uuid4
+
+import h5py
+from numpy import (
+    asarray, zeros, array, full, ndarray, dtype as npdtype, generic,
+    frombuffer, lib,
+)
+
+format = lib.format  # pylint: disable=redefined-builtin
+
+NAME_EXISTS = "Unable to create {}, name already exists."
+READ_ONLY = "{} was opened read-only."
+NOT_FOUND = "Object {} does not exist."
+NO_SUCH_FILE = "No file named {}."
+FILE_EXISTS = "File {} already exists."
+INVALID_MODE = "Invalid mode {}."
+TOO_MANY_LINKS = "Too many links traversed resolving {}."
+CANNOT_RESIZE = "Cannot resize {} to shape {}."
+CANNOT_STORE_OBJECTS = "Arrays of python objects cannot be stored."
+MAX_LINK_DEPTH = 16
+
+
+class Backend(ABC):
+    """
+    A way of storing h5preserve files, used by ``h5preserve.open``.
+    """
+    # pylint: disable=too-few-public-methods
+    @abstractmethod
+    def open(self, filename, *, mode, **kwargs):
+        """
+        Open a file using this backend.
+
+        Parameters
+        ----------
+        filename : string
+            the name of the file
+        mode : string
+            the mode to open the file with, as for ``h5py.File``
+        **kwargs
+            backend specific options
+
+        Returns
+        -------
+        BackendFile
+        """
+
+
+class HDF5Backend(Backend):
+    """
+    Backend storing files as HDF5 files via h5py (the default).
+    """
+    # pylint: disable=too-few-public-methods
+    def open(self, filename, *, mode, **kwargs):
+        """
+        Open a HDF5 file, passing `kwargs` to ``h5py.File``
+        """
+        return h5py.File(filename, mode=mode, **kwargs)
+
+
+HDF5_BACKEND = HDF5Backend()
+
+
+def open_image(data, *, mode="r"):
+    """
+    Open a HDF5 file image (the bytes of a HDF5 file) fully in memory via the
+    HDF5 core driver, without touching the filesystem. Changes made to the
+    file only affect the in-memory copy, use ``get_image`` to get the bytes
+    of the modified file.
+
+    Parameters
+    ----------
+    data : bytes-like
+        the file image
+    mode : string
+        ``"r"`` to open the file read-only, or ``"r+"`` to allow changes
+
+    Returns
+    -------
+    h5py.File
+    """
+    if mode not in {"r", "r+"}:
+        raise ValueError(INVALID_MODE.format(mode))
+    fapl = h5py.h5p.create(h5py.h5p.FILE_ACCESS)
+    fapl.set_fapl_core(backing_store=False)
+    fapl.set_file_image(data)
+    fid = h5py.h5f.open(
+        "h5preserve-image-{}".format(uuid4().hex).encode("ascii"),
+        h5py.h5f.ACC_RDONLY if mode == "r" else h5py.h5f.ACC_RDWR,
+        fapl=fapl,
+    )
+    return h5py.File(fid)
+
+
+def get_image(h5py_file):
+    """
+    Return the file image (the bytes of the file) of an open HDF5 file,
+    including any changes not yet written to disk
+    """
+    h5py_file.flush()
+    return h5py_file.id.get_file_image()
+
+
+class BackendObject(ABC):
+    """
+    A group or dataset stored by a backend.
+
+    Objects referring to the same stored group or dataset (such as via
+    different hard links) must compare and hash equal.
+    """
+    @property
+    @abstractmethod
+    def name(self):
+        """
+        The absolute path of the object
+        """
+
+    @property
+    @abstractmethod
+    def file(self):
+        """
+        The ``BackendFile`` containing the object
+        """
+
+    @property
+    @abstractmethod
+    def attrs(self):
+        """
+        Mutable mapping of the attributes of the object
+        """
+
+    @property
+    def parent(self):
+        """
+        The group containing the object
+        """
+        return self.file[posixpath.dirname(self.name)]
+
+    def __bool__(self):
+        # objects are only valid while their file is open
+        return bool(self.file)
+
+
+class BackendGroup(BackendObject):
+    """
+    A group stored by a backend.
+
+    Names passed to the methods may be paths relative to the group, or
+    absolute paths within the file.
+    """
+    @abstractmethod
+    def __getitem__(self, name):
+        """
+        Return the group or dataset at `name`
+        """
+
+    @abstractmethod
+    def __setitem__(self, name, obj):
+        """
+        Create a hard link to `obj` (a group or dataset in the same file), a
+        link described by ``h5py.SoftLink`` or ``h5py.ExternalLink``, or a
+        dataset containing `obj` (an array) at `name`
+        """
+
+    @abstractmethod
+    def __delitem__(self, name):
+        """
+        Remove the link `name`
+        """
+
+    @abstractmethod
+    def __iter__(self):
+        """
+        Iterate over the names of the members of the group
+        """
+
+    @abstractmethod
+    def __len__(self):
+        """
+        The number of members of the group
+        """
+
+    @abstractmethod
+    def get(self, name, default=None, getlink=False):
+        """
+        Return the group or dataset at `name` (or `default` if it does not
+        exist), or if `getlink` is True, the link at `name` as an instance of
+        ``h5py.HardLink``, ``h5py.SoftLink`` or ``h5py.ExternalLink``
+        """
+
+    @abstractmethod
+    def create_group(self, name):
+        """
+        Create and return a new group, creating any intermediate groups
+        """
+
+    @abstractmethod
+    def create_dataset(
+        self, name, shape=None, dtype=None, data=None, **options
+    ):
+        """
+        Create and return a new dataset, creating any intermediate groups.
+        Options not supported by the backend (such as compression) may be
+        ignored.
+        """
+
+    def __contains__(self, name):
+        try:
+            return self.get(name, getlink=True) is not None
+        except KeyError:
+            return False
+
+    def require_group(self, name):
+        """
+        Return the group `name`, creating it if needed
+        """
+        if name in self:
+            return self[name]
+        return self.create_group(name)
+
+    def visititems(self, func):
+        """
+        Call ``func(name, obj)`` for every group and dataset within the group
+        (reached via hard links), where `name` is the path relative to this
+        group, stopping if `func` returns anything other than None
+        """
+        seen = set()
+        pending = [("", self)]
+        while pending:
+            prefix, group = pending.pop(0)
+            for name in group:
+                if not isinstance(
+                    group.get(name, getlink=True), h5py.HardLink
+                ):
+                    continue
+                obj = group[name]
+                path = posixpath.join(prefix, name)
+                if obj in seen:
+                    continue
+                seen.add(obj)
+                result = func(path, obj)
+                if result is not None:
+                    return result
+                if isinstance(obj, BackendGroup):
+                    pending.append((path, obj))
+        return None
+
+
+class BackendDataset(BackendObject):
+    """
+    A dataset stored by a backend.
+    """
+    @property
+    @abstractmethod
+    def shape(self):
+        """
+        The shape of the dataset
+        """
+
+    @property
+    @abstractmethod
+    def dtype(self):
+        """
+        The dtype of the dataset
+        """
+
+    @abstractmethod
+    def __getitem__(self, index):
+        """
+        Read the data at `index` (``()`` for all the data)
+        """
+
+    @abstractmethod
+    def __setitem__(self, index, value):
+        """
+        Write `value` to the data at `index`
+        """
+
+    @property
+    def ndim(self):
+        # pylint: disable=missing-docstring
+        return len(self.shape)
+
+    @property
+    def size(self):
+        # pylint: disable=missing-docstring
+        size = 1
+        for length in self.shape:
+            size *= length
+        return size
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        # pylint: disable=unused-argument
+        return asarray(self[()], dtype=dtype)
+
+    @property
+    def fillvalue(self):
+        # pylint: disable=missing-docstring
+        return zeros((), dtype=self.dtype)[()]
+
+    @property
+    def maxshape(self):
+        # pylint: disable=missing-docstring
+        return self.shape
+
+    @property
+    def chunks(self):
+        # pylint: disable=missing-docstring
+        return None
+
+    compression = compression_opts = scaleoffset = None
+    shuffle = fletcher32 = False
+
+    def write_direct(self, data):
+        """
+        Overwrite all the data of the dataset with `data`
+        """
+        self[...] = data
+
+    def resize(self, size, axis=None):
+        """
+        Change the shape of the dataset, which is not supported unless
+        implemented by the backend
+        """
+        raise TypeError("{} cannot be resized.".format(self.name))
+
+    def refresh(self):
+        """
+        Pick up changes made by other writers (no-op unless implemented by
+        the backend)
+        """
+
+    def flush(self):
+        """
+        Flush the dataset (no-op unless implemented by the backend)
+        """
+
+
+class BackendFile(BackendGroup):
+    """
+    The root group of a file stored by a backend.
+    """
+    @property
+    @abstractmethod
+    def filename(self):
+        """
+        The name of the file
+        """
+
+    @property
+    @abstractmethod
+    def mode(self):
+        """
+        The mode of the file, ``"r"`` or ``"r+"``
+        """
+
+    @abstractmethod
+    def close(self):
+        """
+        Close the file
+        """
+
+    @abstractmethod
+    def __bool__(self):
+        """
+        Whether the file is open
+        """
+
+    @property
+    def id(self):
+        """
+        Hashable identifier for the open file
+        """
+        return self
+
+    @property
+    def swmr_mode(self):
+        # pylint: disable=missing-docstring
+        return False
+
+    def flush(self):
+        """
+        Flush the file (no-op unless implemented by the backend)
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StoredGroup(BackendGroup):
+    """
+    Parts shared by the groups of the backends which store files themselves,
+    rather than via h5py
+    """
+    # pylint: disable=abstract-method
+    def _get_path(self, name):
+        """
+        Return the absolute path of `name`
+        """
+        return posixpath.normpath(posixpath.join(self.name, name))
+
+    @abstractmethod
+    def _get_parent(self, path, create=False):
+        """
+        Return the group containing the absolute `path`, and the name of
+        `path` within it, creating intermediate groups if `create`
+        """
+
+    @abstractmethod
+    def _get_link(self, parent, name):
+        """
+        Return the link class describing the member `name` of `parent` (as
+        returned by ``_get_parent``), or None if there is no such member
+        """
+
+    def get(self, name, default=None, getlink=False):
+        path = self._get_path(name)
+        if not getlink:
+            try:
+                return self[path]
+            except KeyError:
+                return default
+        if path == "/":
+            return h5py.HardLink()
+        try:
+            parent, base = self._get_parent(path)
+        except KeyError:
+            return default
+        link = self._get_link(parent, base)
+        if link is None:
+            return default
+        return link
+
+
+class StoredFile(BackendFile):
+    """
+    Parts shared by the files of the backends which store files themselves,
+    rather than via h5py, which set ``_filename``, ``_mode`` and ``_open``
+    """
+    # pylint: disable=abstract-method
+    _filename = None
+    _mode = None
+    _open = False
+
+    @property
+    def filename(self):
+        # pylint: disable=missing-docstring
+        return self._filename
+
+    @property
+    def mode(self):
+        # pylint: disable=missing-docstring
+        return self._mode
+
+    def close(self):
+        self._open = False
+
+    def __bool__(self):
+        return self._open
+
+
+def get_initial_data(shape, dtype, data, fillvalue):
+    """
+    Return the data of a new dataset created via
+    ``BackendGroup.create_dataset``, which is a new array (or
+    ``h5py.Empty``)
+    """
+    if data is not None and not isinstance(data, h5py.Empty):
+        data = array(data, dtype=dtype)
+        if shape is not None:
+            data = data.reshape(shape)
+    elif shape is None:
+        data = h5py.Empty(
+            data.dtype if data is not None else npdtype(dtype or "f4")
+        )
+    else:
+        data = full(
+            shape, 0 if fillvalue is None else fillvalue, dtype=dtype or "f4",
+        )
+    return data
+
+
+def get_new_shape(name, shape, maxshape, size, axis):
+    """
+    Return the shape of the dataset `name` with `shape` and `maxshape` after
+    resizing it to `size` (along `axis`), as for ``h5py.Dataset.resize``
+    """
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    if axis is None:
+        new_shape = tuple(size)
+    else:
+        new_shape = list(shape)
+        new_shape[axis] = size
+        new_shape = tuple(new_shape)
+    if len(new_shape) != len(shape) or any(
+        maximum is not None and length > maximum
+        for length, maximum in zip(new_shape, maxshape)
+    ):
+        raise ValueError(CANNOT_RESIZE.format(name, new_shape))
+    return new_shape
+
+
+def grows_in_place(shape, new_shape):
+    """
+    Return whether resizing from `shape` to `new_shape` only changes the
+    length of the first axis, and so can use spare rows at the end of the
+    data
+    """
+    return bool(shape) and shape[1:] == new_shape[1:]
+
+
+def get_capacity(length, new_length):
+    """
+    Return the number of rows to allocate when growing from `length` to
+    `new_length` rows, doubling the capacity so that repeatedly appending
+    rows only copies the data a logarithmic number of times
+    """
+    return max(new_length, 2 * length)
+
+
+def copy_resized(data, shape, fillvalue):
+    """
+    Return a copy of `data` with `shape`, truncating it or padding it with
+    `fillvalue`
+    """
+    new_data = full(shape, fillvalue, dtype=data.dtype)
+    overlap = tuple(
+        slice(0, min(old, new)) for old, new in zip(data.shape, shape)
+    )
+    new_data[overlap] = data[overlap]
+    return new_data
+
+
+def encode_value(value):
+    """
+    Encode an attribute value (or dataset option) as JSON
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, generic):
+        return value
+    if isinstance(value, bytes) and not isinstance(value, generic):
+        return {"bytes": b64encode(value).decode("ascii")}
+    if isinstance(value, h5py.Empty):
+        return {"empty": format.dtype_to_descr(value.dtype)}
+    if isinstance(value, (list, tuple)):
+        return {"tuple": [encode_value(item) for item in value]}
+    value = to_storable(asarray(value))
+    return {
+        "array": b64encode(value.tobytes()).decode("ascii"),
+        "dtype": format.dtype_to_descr(value.dtype),
+        "shape": list(value.shape),
+        "scalar": isinstance(value, generic) or not isinstance(
+            value, ndarray
+        ),
+    }
+
+
+def decode_value(value):
+    """
+    Decode an attribute value (or dataset option) encoded by
+    ``encode_value``
+    """
+    if not isinstance(value, dict):
+        return value
+    if "bytes" in value:
+        return b64decode(value["bytes"])
+    if "empty" in value:
+        return h5py.Empty(format.descr_to_dtype(value["empty"]))
+    if "tuple" in value:
+        return tuple(decode_value(item) for item in value["tuple"])
+    data = frombuffer(
+        b64decode(value["array"]),
+        dtype=format.descr_to_dtype(value["dtype"]),
+    ).reshape(value["shape"]).copy()
+    if not value["shape"]:
+        return data[()]
+    return data
+
+
+def to_storable(data):
+    """
+    Convert arrays of python strings or bytes (which h5py uses for variable
+    length strings) to fixed length arrays which can be stored without
+    pickling
+    """
+    if data.dtype.kind != "O":
+        return data
+    if all(isinstance(item, str) for item in data.flat):
+        return data.astype(str)
+    if all(isinstance(item, bytes) for item in data.flat):
+        return data.astype(bytes)
+    raise TypeError(CANNOT_STORE_OBJECTS)
+
+
+BackendGroup.register(h5py.Group)
+BackendDataset.register(h5py.Dataset)
+BackendFile.register(h5py.File)
@@ -0,0 +1,532 @@
+# coding: utf-8
+"""
+The catalog of the objects stored in a file, and the metadata-only summaries
+and attribute queries which read objects without loading them.
+"""
+from collections import namedtuple
+from collections.abc import Callable
+import posixpath
+
+from numpy import dtype as npdtype, array as nparray, empty
+import h5py
+
+from ._utils import (
+    H5PRESERVE_ATTR_NAMESPACE, H5PRESERVE_ATTR_LABEL, H5PRESERVE_ATTR_VERSION,
+    H5PRESERVE_CATALOG, is_attr_equal,
+)
+from ._backend import BackendGroup, BackendDataset
+
+CATALOG_CHUNK_ROWS = 256
+CATALOG_NO_VERSION = -1
+CATALOG_DTYPE = npdtype([
+    ("path", h5py.string_dtype()),
+    ("namespace", h5py.string_dtype()),
+    ("label", h5py.string_dtype()),
+    ("version", "<i8"),
+    ("kind", h5py.string_dtype()),
+    ("shape", h5py.string_dtype()),
+    ("dtype", h5py.string_dtype()),
+    ("nbytes", "<i8"),
+])
+CANNOT_DESCRIBE = (
+    "Only groups in HDF5 files can be described, not {} objects."
+)
+
+CatalogEntry = namedtuple(
+    "CatalogEntry", "path namespace label version kind shape dtype nbytes"
+)
+CatalogEntry.__doc__ = """
+Summary of an object stored in a hdf5 file.
+
+Attributes
+----------
+path : string
+    the absolute path of the object
+namespace, label : string or None
+    the h5preserve namespace and label of the object, None if the object does
+    not have h5preserve type information
+version : int or None
+    the h5preserve version of the object
+kind : string
+    either ``"group"`` or ``"dataset"``
+shape : tuple or None
+    the shape of the dataset, None for groups
+dtype : string or None
+    the dtype of the dataset, None for groups
+nbytes : int
+    the size of the data of the dataset when loaded, 0 for groups
+"""
+
+
+ObjectSummary = namedtuple(
+    "ObjectSummary", CatalogEntry._fields + (
+        "storage_size", "filters", "compression_ratio",
+    )
+)
+ObjectSummary.__doc__ = """
+Summary of an object stored in a hdf5 file, as returned by
+``H5PreserveGroup.describe``.
+
+Has the same attributes as `CatalogEntry`, along with:
+
+Attributes
+----------
+storage_size : int
+    the number of bytes used to store the data of the dataset in the file, 0
+    for groups
+filters : tuple of string
+    the names of the filters (e.g. compression) applied to the dataset
+compression_ratio : float or None
+    the ratio of ``nbytes`` to ``storage_size``, None if nothing has been
+    stored
+"""
+
+
+def _decode(value):
+    """
+    Return `value` as a string if it was read from a file as bytes
+    """
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
+
+
+def get_catalog_entry(path, h5py_obj):
+    """
+    Return the `CatalogEntry` describing `h5py_obj`, found at `path`
+    """
+    attrs = h5py_obj.attrs
+    namespace = _decode(attrs.get(H5PRESERVE_ATTR_NAMESPACE))
+    label = _decode(attrs.get(H5PRESERVE_ATTR_LABEL))
+    version = attrs.get(H5PRESERVE_ATTR_VERSION)
+    if version is not None:
+        version = int(version)
+    if isinstance(h5py_obj, BackendDataset):
+        return CatalogEntry(
+            path=path, namespace=namespace, label=label, version=version,
+            kind="dataset", shape=h5py_obj.shape, dtype=str(h5py_obj.dtype),
+            nbytes=int(h5py_obj.size * h5py_obj.dtype.itemsize),
+        )
+    return CatalogEntry(
+        path=path, namespace=namespace, label=label, version=version,
+        kind="group", shape=None, dtype=None, nbytes=0,
+    )
+
+
+def iter_catalog_entries(h5py_group, key, recursive=True, _parents=()):
+    """
+    Yield the `CatalogEntry` for the object `key` in `h5py_group`, followed
+    by those of its members if `recursive` is True.
+    """
+    path = posixpath.join(h5py_group.name, key)
+    h5py_obj = h5py_group.get(key)
+    if not isinstance(h5py_obj, (BackendGroup, BackendDataset)):
+        return
+    yield get_catalog_entry(path, h5py_obj)
+    if not recursive or not isinstance(h5py_obj, BackendGroup):
+        return
+    # hard links can create cycles, so skip groups we are already inside
+    if h5py_obj in _parents:
+        return
+    for name in h5py_obj:
+        if path == "/" and name == H5PRESERVE_CATALOG:
+            continue
+        yield from iter_catalog_entries(
+            h5py_obj, name, _parents=_parents + (h5py_obj,)
+        )
+
+
+def _read_attr(object_id, name):
+    """
+    Read the attribute `name` of the object with low-level id `object_id`,
+    returning None if the object does not have the attribute
+    """
+    if not h5py.h5a.exists(object_id, name):
+        return None
+    attr_id = h5py.h5a.open(object_id, name)
+    value = empty(attr_id.shape, dtype=attr_id.dtype)
+    attr_id.read(value)
+    return _decode(value[()])
+
+
+def match_attrs(h5py_group, key, predicates):
+    """
+    Return whether the attributes of the object `key` in `h5py_group` match
+    all of `predicates`, a mapping of attribute names to either the required
+    value of the attribute or a function which returns whether the value of
+    the attribute is acceptable. Objects missing any of the attributes do not
+    match.
+    """
+    if isinstance(h5py_group, h5py.Group):
+        object_id = h5py.h5o.open(h5py_group.id, key.encode("utf-8"))
+
+        def read_attr(name):
+            # pylint: disable=missing-docstring
+            return _read_attr(object_id, name.encode("utf-8"))
+    else:
+        attrs = h5py_group[key].attrs
+
+        def read_attr(name):
+            # pylint: disable=missing-docstring
+            return _decode(attrs.get(name))
+    for name, predicate in predicates.items():
+        value = read_attr(name)
+        if value is None:
+            return False
+        if isinstance(predicate, Callable):
+            if not predicate(value):
+                return False
+        elif not is_attr_equal(value, predicate):
+            return False
+    return True
+
+
+def _summarise(path, object_id, num_attrs):
+    """
+    Return the `ObjectSummary` of the object with low-level id `object_id`
+    """
+    namespace = label = version = None
+    if num_attrs:
+        namespace = _read_attr(object_id, H5PRESERVE_ATTR_NAMESPACE.encode())
+        label = _read_attr(object_id, H5PRESERVE_ATTR_LABEL.encode())
+        version = _read_attr(object_id, H5PRESERVE_ATTR_VERSION.encode())
+        if version is not None:
+            version = int(version)
+    if not isinstance(object_id, h5py.h5d.DatasetID):
+        return ObjectSummary(
+            path=path, namespace=namespace, label=label, version=version,
+            kind="group", shape=None, dtype=None, nbytes=0, storage_size=0,
+            filters=(), compression_ratio=None,
+        )
+    dcpl = object_id.get_create_plist()
+    nbytes = object_id.dtype.itemsize
+    for length in object_id.shape:
+        nbytes *= length
+    storage_size = object_id.get_storage_size()
+    return ObjectSummary(
+        path=path, namespace=namespace, label=label, version=version,
+        kind="dataset", shape=object_id.shape, dtype=str(object_id.dtype),
+        nbytes=nbytes, storage_size=storage_size,
+        filters=tuple(
+            _decode(dcpl.get_filter(i)[3])
+            for i in range(dcpl.get_nfilters())
+        ),
+        compression_ratio=nbytes / storage_size if storage_size else None,
+    )
+
+
+def describe_group(h5py_group):
+    """
+    Return an `ObjectSummary` of each object within `h5py_group`, using a
+    single traversal of the group with low-level h5py calls, and without
+    reading any data. Only groups in HDF5 files can be described.
+    """
+    if not isinstance(h5py_group, h5py.Group):
+        raise TypeError(CANNOT_DESCRIBE.format(type(h5py_group).__name__))
+    group_id = h5py_group.id
+    group_name = h5py_group.name
+    summaries = []
+
+    def visitor(name, info):
+        """
+        Summarise each group or dataset visited
+        """
+        path = posixpath.join(group_name, _decode(name))
+        if path == "/" + H5PRESERVE_CATALOG:
+            return
+        if info.type not in (h5py.h5o.TYPE_GROUP, h5py.h5o.TYPE_DATASET):
+            return
+        summaries.append(_summarise(
+            path, h5py.h5o.open(group_id, name), info.num_attrs
+        ))
+
+    h5py.h5o.visit(group_id, visitor, info=True)
+    return summaries
+
+
+def _entry_to_row(entry):
+    """
+    Convert a `CatalogEntry` to a row of the catalog dataset
+    """
+    return (
+        entry.path, entry.namespace or "", entry.label or "",
+        CATALOG_NO_VERSION if entry.version is None else entry.version,
+        entry.kind,
+        "" if entry.shape is None else ",".join(str(n) for n in entry.shape),
+        entry.dtype or "", entry.nbytes,
+    )
+
+
+def _row_to_entry(row):
+    """
+    Convert a row of the catalog dataset to a `CatalogEntry`
+    """
+    path, namespace, label, version, kind, shape, dtype, nbytes = (
+        _decode(value) for value in row
+    )
+    is_dataset = kind == "dataset"
+    return CatalogEntry(
+        path=path, namespace=namespace or None, label=label or None,
+        version=None if version == CATALOG_NO_VERSION else int(version),
+        kind=kind,
+        shape=tuple(
+            int(n) for n in shape.split(",") if n
+        ) if is_dataset else None,
+        dtype=dtype if is_dataset else None, nbytes=int(nbytes),
+    )
+
+
+def _get_parent(path):
+    """
+    Return the path of the group containing `path`
+    """
+    return posixpath.dirname(path) or "/"
+
+
+class Catalog:
+    """
+    In-memory copy of the catalog dataset of a file, which keeps the dataset
+    up to date as objects are written.
+
+    Parameters
+    ----------
+    h5py_dataset : ``h5py.Dataset``
+        the catalog dataset
+    """
+    def __init__(self, h5py_dataset):
+        self._h5py_dataset = h5py_dataset
+        self._entries = [_row_to_entry(row) for row in h5py_dataset[()]]
+        self._positions = {
+            entry.path: i for i, entry in enumerate(self._entries)
+        }
+        self._children = None
+
+    @classmethod
+    def create(cls, h5py_file):
+        """
+        Create an empty catalog dataset in `h5py_file`
+        """
+        return cls(h5py_file.create_dataset(
+            H5PRESERVE_CATALOG, shape=(0,), maxshape=(None,),
+            dtype=CATALOG_DTYPE, chunks=(CATALOG_CHUNK_ROWS,),
+        ))
+
+    def __contains__(self, path):
+        return path in self._positions
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path):
+        """
+        Return the entry for `path`, or None if it is not in the catalog
+        """
+        position = self._positions.get(path)
+        if position is None:
+            return None
+        return self._entries[position]
+
+    def children(self, path):
+        """
+        Return the entries of the members of the group at `path`, sorted by
+        name
+        """
+        return [
+            self._entries[self._positions[child]]
+            for child in sorted(self._get_children().get(path, ()))
+        ]
+
+    def _get_children(self):
+        """
+        Return the index of the members of each group, building it if needed
+        """
+        if self._children is None:
+            self._children = {}
+            for entry in self._entries:
+                self._add_child(entry.path)
+        return self._children
+
+    def _add_child(self, path):
+        """
+        Add `path` to the index of the members of each group
+        """
+        parent = _get_parent(path)
+        if parent != path:
+            self._children.setdefault(parent, set()).add(path)
+
+    def subtree(self, path):
+        """
+        Return the entries of all the objects within the group at `path`,
+        sorted by path
+        """
+        prefix = path.rstrip("/") + "/"
+        return sorted(
+            (
+                entry for entry in self._entries
+                if entry.path.startswith(prefix)
+            ), key=lambda entry: entry.path
+        )
+
+    def replace(self, paths, entries):
+        """
+        Replace the entries for each of `paths` and everything within them
+        with `entries`, writing the changes to the catalog dataset.
+
+        Entries for paths elsewhere in the file can also be included in
+        `entries`, which replace any existing entries for those paths.
+        """
+        new_entries = {entry.path: entry for entry in entries}
+        length = len(self._entries)
+        changed = self._remove([
+            path for path in self._find_within(paths)
+            if path not in new_entries
+        ])
+        start = len(self._entries)
+        changed.extend(self._extend(new_entries.values()))
+        if len(self._entries) != length:
+            self._h5py_dataset.resize(len(self._entries), axis=0)
+        if len(self._entries) > start:
+            self._h5py_dataset[start:] = self._get_rows(
+                self._entries[start:]
+            )
+        changed = sorted(
+            position for position in set(changed) if position < start
+        )
+        if changed:
+            self._h5py_dataset[changed] = self._get_rows(
+                self._entries[position] for position in changed
+            )
+
+    def _find_within(self, paths):
+        """
+        Return the paths of the entries which are one of `paths`, or are
+        within one of them
+        """
+        children = self._get_children()
+        found = set()
+        pending = list(paths)
+        while pending:
+            path = pending.pop()
+            if path in found:
+                continue
+            if path in self._positions:
+                found.add(path)
+            pending.extend(children.get(path, ()))
+        return found
+
+    def _remove(self, paths):
+        """
+        Remove the entries for `paths` in memory, filling the gaps with the
+        last entries, and returning the positions of the entries moved
+        """
+        moved = []
+        for position in sorted(
+            (self._positions.pop(path) for path in paths), reverse=True
+        ):
+            last = self._entries.pop()
+            if position < len(self._entries):
+                self._entries[position] = last
+                self._positions[last.path] = position
+                moved.append(position)
+        for path in paths:
+            self._children.get(_get_parent(path), set()).discard(path)
+        return moved
+
+    def _extend(self, entries):
+        """
+        Add or update `entries` in memory, returning the positions of the
+        existing entries which were changed
+        """
+        changed = []
+        for entry in entries:
+            position = self._positions.get(entry.path)
+            if position is None:
+                self._positions[entry.path] = len(self._entries)
+                self._entries.append(entry)
+                if self._children is not None:
+                    self._add_child(entry.path)
+            elif self._entries[position] != entry:
+                self._entries[position] = entry
+                changed.append(position)
+        return sorted(changed)
+
+    @staticmethod
+    def _get_rows(entries):
+        """
+        Convert `entries` to an array of rows of the catalog dataset
+        """
+        return nparray(
+            [_entry_to_row(entry) for entry in entries], dtype=CATALOG_DTYPE
+        )
+
+
+class CatalogMixin:
+    """
+    The parts of ``RegistryContainer`` which keep the catalogs of files up to
+    date, where ``_catalogs`` maps the ids of open files to their catalogs
+    """
+    # pylint: disable=too-few-public-methods
+    def _get_catalog(self, h5py_file):
+        """
+        Return the catalog of `h5py_file`, or None if it does not have one,
+        caching the result (including that there is no catalog) until the
+        file is closed, reopened or refreshed
+        """
+        try:
+            return self._catalogs[h5py_file.id]
+        except KeyError:
+            pass
+        catalog = None
+        h5py_obj = h5py_file.get(H5PRESERVE_CATALOG)
+        if isinstance(h5py_obj, BackendDataset):
+            if h5py_file.swmr_mode and h5py_file.mode == "r":
+                h5py_obj.refresh()
+            catalog = Catalog(h5py_obj)
+        self._catalogs[h5py_file.id] = catalog
+        return catalog
+
+    def _create_catalog(self, h5py_file):
+        """
+        Create the catalog of `h5py_file` from the current contents of the
+        file, if it does not already have one
+        """
+        catalog = self._get_catalog(h5py_file)
+        if catalog is not None:
+            return catalog
+        catalog = Catalog.create(h5py_file)
+        root = h5py_file["/"]
+        catalog.replace(["/"], [
+            entry for key in root if key != H5PRESERVE_CATALOG
+            for entry in iter_catalog_entries(root, key)
+        ])
+        self._catalogs[h5py_file.id] = catalog
+        return catalog
+
+    def _update_catalog(self, h5py_group, *keys):
+        """
+        Update the entries in the catalog of the file (if there is one) for
+        each of `keys` in `h5py_group` and everything within them
+        """
+        catalog = self._get_catalog(h5py_group.file)
+        if catalog is None or h5py_group.name is None:
+            return
+        paths = []
+        entries = {}
+        for key in keys:
+            path = posixpath.normpath(posixpath.join(h5py_group.name, key))
+            paths.append(path)
+            for entry in iter_catalog_entries(h5py_group, key):
+                entries[entry.path] = entry
+            # include any groups containing key created outside of h5preserve
+            parent = posixpath.dirname(path)
+            while parent != "/" and parent not in catalog and (
+                parent not in entries
+            ):
+                entries[parent] = get_catalog_entry(
+                    parent, h5py_group.file[parent]
+                )
+                parent = posixpath.dirname(parent)
+        catalog.replace(paths, entries.values())
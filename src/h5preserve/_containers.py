@@ -0,0 +1,390 @@
+# coding: utf-8
+"""
+Containers used to represent hdf5 groups and datasets (and links to them) when
+dumping and loading objects.
+"""
+from collections.abc import MutableMapping
+import posixpath
+
+from numpy import asarray, concatenate
+
+from ._utils import (
+    H5PRESERVE_ATTR_NAMESPACE, H5PRESERVE_ATTR_LABEL, H5PRESERVE_ATTR_VERSION,
+    H5PRESERVE_ATTR_ON_DEMAND, H5PRESERVE_ATTR_CONTENT_HASH,
+    H5PRESERVE_ATTR_APPENDABLE, H5PRESERVE_ATTR_STATISTICS,
+)
+
+ALLOWED_DATASET_KEYS = {
+    "attrs", "shape", "dtype", "data", "chunks", "maxshape", "fillvalue",
+    "compression", "compression_opts", "scaleoffset", "shuffle",
+    "fletcher32", "track_times",
+}
+INVALID_DATASET_OPTION = "{} is not a valid dataset option."
+NO_PATH = "No path defined for hard link."
+WRONG_ROW_SHAPE = "Cannot append rows of shape {} to dataset of shape {}."
+
+
+class ContainerBase(MutableMapping):
+    # pylint: disable=abstract-method,missing-docstring
+    # one attribute per h5preserve attribute stored alongside the object
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, attrs=None):
+        # pylint: disable=super-init-not-called
+        if attrs is None:
+            attrs = {}
+        self._namespace = attrs.pop(H5PRESERVE_ATTR_NAMESPACE, None)
+        self._label = attrs.pop(H5PRESERVE_ATTR_LABEL, None)
+        self._version = attrs.pop(H5PRESERVE_ATTR_VERSION, None)
+        self._on_demand = attrs.pop(H5PRESERVE_ATTR_ON_DEMAND, False)
+        self._content_hash = attrs.pop(H5PRESERVE_ATTR_CONTENT_HASH, None)
+        self._appendable = attrs.pop(H5PRESERVE_ATTR_APPENDABLE, False)
+        self._statistics = {
+            name: attrs.pop(name) for name in list(attrs)
+            if name.startswith(H5PRESERVE_ATTR_STATISTICS)
+        }
+        self.attrs = attrs
+
+
+class OnDemandBase(ContainerBase):
+    # pylint: disable=too-many-ancestors
+    # pylint: disable=abstract-method,missing-docstring
+    def __init__(self, attrs=None):
+        self._ref = None
+        super().__init__(attrs)
+        self._on_demand = True
+
+
+class GroupContainer(ContainerBase):
+    # pylint: disable=too-many-ancestors
+    """
+    Representation of an hdf5 group for use in h5preserve.
+
+    Parameters
+    ----------
+    attrs : Mapping
+        mapping containing the attributes of the group
+    **kwargs
+        datasets or subgroups to add to the group
+    """
+    def __init__(self, attrs=None, **kwargs):
+        super().__init__(attrs)
+        self._group_members = {}
+        self.update(kwargs)
+
+    def __getitem__(self, key):
+        return self._group_members[key]
+
+    def __setitem__(self, key, val):
+        self._group_members[key] = val
+
+    def __delitem__(self, key):
+        self._group_members.__delitem__(key)
+
+    def __iter__(self):
+        return iter(self._group_members)
+
+    def __len__(self):
+        return len(self._group_members)
+
+    def __repr__(self):
+        return "GroupContainer(attrs={attrs!r}, {group_items})".format(
+            attrs=self.attrs,
+            group_items=", ".join(
+                "{key}={val!r}".format(key=key, val=val)
+                for key, val in self._group_members.items()
+                if val is not None
+            )
+        )
+
+
+class OnDemandGroupContainer(GroupContainer, OnDemandBase):
+    # pylint: disable=too-many-ancestors
+    """
+    Subclass of `GroupContainer` which supports accessing group members on
+    demand, rather that loading immediately.
+    """
+    pass
+
+
+class DatasetContainer(ContainerBase):
+    # pylint: disable=too-many-ancestors
+    """
+    Representation of an hdf5 dataset for use in h5preserve.
+
+    Parameters
+    ----------
+    attrs : Mapping
+        mapping containing the attributes of the group
+    **kwargs
+        properties of the group, which get passed to create group
+    """
+    def __init__(self, attrs=None, **kwargs):
+        super().__init__(attrs)
+        self._dataset_members = {}
+        self.update(kwargs)
+
+    def __getitem__(self, key):
+        if key == "attrs":
+            return self.attrs
+        return self._dataset_members[key]
+
+    def __setitem__(self, key, val):
+        if key in ALLOWED_DATASET_KEYS:
+            self._dataset_members[key] = val
+        else:
+            raise TypeError(INVALID_DATASET_OPTION.format(key))
+
+    def __delitem__(self, key):
+        self._dataset_members.__delitem__(key)
+
+    def __iter__(self):
+        return iter(self._dataset_members)
+
+    def __len__(self):
+        return len(self._dataset_members)
+
+    def __repr__(self):
+        return "DatasetContainer(attrs={attrs!r}, {dataset})".format(
+            attrs=self.attrs,
+            dataset=", ".join(
+                "{key}={val!r}".format(key=key, val=val)
+                for key, val in self._dataset_members.items()
+                if val is not None
+            )
+        )
+
+
+class OnDemandDatasetContainer(DatasetContainer, OnDemandBase):
+    # pylint: disable=too-many-ancestors
+    """
+    Subclass of `DatasetContainer` which supports accessing dataset data on
+    demand, rather that loading immediately.
+    """
+    pass
+
+
+class AppendableDatasetContainer(DatasetContainer):
+    # pylint: disable=too-many-ancestors
+    """
+    Subclass of `DatasetContainer` which creates a dataset which can be
+    appended to along its first axis.
+
+    The dataset is created chunked and resizable, with a chunk size of about
+    64 KiB unless ``chunks`` is given. When loaded, ``data`` is an
+    `AppendableDataset`, which reads from the file on demand and supports
+    appending new rows.
+    """
+    def __init__(self, attrs=None, **kwargs):
+        super().__init__(attrs, **kwargs)
+        self._appendable = True
+
+
+class AppendableDataset:
+    """
+    Handle to a dataset created from an `AppendableDatasetContainer`,
+    supporting reading from and appending to the dataset.
+
+    Appended rows are buffered, and written to the file once a chunk's worth
+    of rows has been appended (or on ``flush``), so that the cost of appending
+    is proportional to the number of rows appended. When the file is being
+    written in SWMR mode, rows are written (and flushed) as they are appended,
+    so that readers see them. Buffered rows are written
+    when the file is closed via h5preserve, which keeps the handles to the
+    datasets in the file alive until then, and returns the same handle each
+    time a dataset is loaded.
+
+    Parameters
+    ----------
+    h5py_dataset : ``h5py.Dataset``
+        the dataset to wrap
+    registries : RegistryContainer, optional
+        the registries used to open the file, used to flush buffered rows when
+        the file is closed
+    """
+    def __init__(self, h5py_dataset, registries=None):
+        self._h5py_dataset = h5py_dataset
+        self._buffer = []
+        self._buffered_rows = 0
+        chunks = h5py_dataset.chunks
+        self._chunk_rows = chunks[0] if chunks else 1
+        self._registries = registries
+        if registries is not None:
+            # pylint: disable=protected-access
+            registries._add_appendable(self)
+
+    @property
+    def h5py_dataset(self):
+        """
+        h5py.Dataset: the instance of ``h5py.Dataset`` which
+        ``AppendableDataset`` wraps
+        """
+        return self._h5py_dataset
+
+    @property
+    def dtype(self):
+        """
+        numpy.dtype: the dtype of the dataset
+        """
+        return self._h5py_dataset.dtype
+
+    @property
+    def shape(self):
+        """
+        tuple: the shape of the dataset, including rows not yet written
+        """
+        shape = self._h5py_dataset.shape
+        return (shape[0] + self._buffered_rows,) + shape[1:]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        self.flush()
+        return self._h5py_dataset[index]
+
+    def __array__(self, dtype=None, copy=None):
+        # pylint: disable=unused-argument
+        data = self[()]
+        if dtype is not None:
+            return data.astype(dtype)
+        return data
+
+    def append(self, rows):
+        """
+        Append rows to the end of the dataset.
+
+        Parameters
+        ----------
+        rows : array_like
+            either a single row, or an array of rows
+        """
+        rows = asarray(rows, dtype=self.dtype)
+        row_shape = self._h5py_dataset.shape[1:]
+        if rows.shape == row_shape:
+            rows = rows[None, ...]
+        if rows.shape[1:] != row_shape:
+            raise ValueError(WRONG_ROW_SHAPE.format(
+                rows.shape, self._h5py_dataset.shape
+            ))
+        self._buffer.append(rows)
+        self._buffered_rows += len(rows)
+        swmr = self._h5py_dataset.file.swmr_mode
+        if swmr or self._buffered_rows >= self._chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Write any buffered rows to the file.
+        """
+        if not self._buffer:
+            return
+        rows = concatenate(self._buffer)
+        self._buffer = []
+        self._buffered_rows = 0
+        start = self._h5py_dataset.shape[0]
+        if H5PRESERVE_ATTR_CONTENT_HASH in self._h5py_dataset.attrs:
+            # the stored hash no longer matches the contents
+            del self._h5py_dataset.attrs[H5PRESERVE_ATTR_CONTENT_HASH]
+        self._h5py_dataset.resize(start + len(rows), axis=0)
+        self._h5py_dataset[start:] = rows
+        if self._registries is not None:
+            # pylint: disable=protected-access
+            self._registries._update_catalog(
+                self._h5py_dataset.parent,
+                posixpath.basename(self._h5py_dataset.name),
+            )
+            # pylint: enable=protected-access
+        if self._h5py_dataset.file.swmr_mode:
+            self._h5py_dataset.flush()
+
+    def refresh(self):
+        """
+        Update the dataset with rows written by other processes, when the file
+        is being read in SWMR mode.
+        """
+        self._h5py_dataset.refresh()
+
+    def __repr__(self):
+        return "AppendableDataset(h5py_dataset={dataset!r})".format(
+            dataset=self._h5py_dataset
+        )
+
+
+class DelayedContainer:
+    # pylint: disable=too-few-public-methods
+    """
+    Helper class for allowing delayed writing of containers to hdf5 files.
+    """
+    def __init__(self):
+        self._h5group = None
+        self._name = None
+        self._registries = None
+        self._written = False
+
+    def write_container(self, data):
+        """
+        Write `data` to hdf5 file with the associated located of the
+        `DelayedContainer`.
+        """
+        if self._h5group is not None:
+            self._registries.to_file(
+                self._h5group, self._name, self._registries.dump(data)
+            )
+        self._written = True
+
+    def _set_info(self, h5group, name, registries):
+        """
+        Set the info required for writing to the hdf5 file
+        """
+        self._h5group = h5group
+        self._name = name
+        self._registries = registries
+
+
+class HardLink:
+    # pylint: disable=too-few-public-methods
+    """
+    Represent a h5py hard link to be created via h5preserve.
+
+    Parameters
+    ----------
+    obj : string, h5py.Group or h5py.Dataset
+        the h5py object that the hard link points to, can either be an h5py
+        object, or a string with the absolute path of the object
+    """
+    def __init__(self, obj):
+        if isinstance(obj, str):
+            self._path = obj
+            self._h5py_obj = None
+        else:
+            self._h5py_obj = obj
+            self._path = None
+
+    @property
+    def h5py_obj(self):
+        """
+        h5py.Group or h5py.Dataset: the object which the hard link will point
+        to
+        """
+        return self._h5py_obj
+
+    @property
+    def path(self):
+        """
+        The path this object points to
+        """
+        return self._path
+
+    def _set_file(self, f):
+        """
+        set file associated with the hard link
+        """
+        if self._path is not None:
+            self._h5py_obj = f[self._path]
+        else:
+            raise RuntimeError(NO_PATH)
+
+    def __repr__(self):
+        if self._path is not None:
+            return "HardLink(path={path})".format(path=self.path)
+        return "HardLink(h5py_obj={obj})".format(obj=self.h5py_obj)
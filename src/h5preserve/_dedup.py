@@ -0,0 +1,268 @@
+# coding: utf-8
+"""
+Deduplication of the datasets written by ``RegistryContainer``, by linking to
+existing objects with the same contents, and the statistics stored on
+datasets as they are written.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import posixpath
+
+import h5py
+from numpy import ndarray
+
+from ._utils import (
+    H5PRESERVE_ATTR_CONTENT_HASH, get_payload, hash_payload, content_hash,
+    get_statistics, is_attr_equal,
+)
+from ._containers import (
+    OnDemandBase, GroupContainer, DatasetContainer,
+    AppendableDatasetContainer, HardLink,
+)
+from ._backend import BackendGroup, BackendDataset
+
+
+def _get_storage_size(h5py_dataset):
+    """
+    Return the storage size of a dataset
+    """
+    if isinstance(h5py_dataset, h5py.Dataset):
+        return h5py_dataset.id.get_storage_size()
+    return h5py_dataset.size * h5py_dataset.dtype.itemsize
+
+
+class DeduplicationMixin:
+    # pylint: disable=too-few-public-methods
+    """
+    Content hashing, deduplication and statistics for the writes of
+    ``RegistryContainer``.
+    """
+    def _configure_session(
+        self, session, vals, *, deduplicate, statistics, track_times,
+        external_base
+    ):
+        """
+        Set up a new write session for writing `vals`
+        """
+        session.track_times = track_times
+        session.external_base = external_base
+        if deduplicate is None:
+            deduplicate = self._deduplicate
+        session.deduplicate = deduplicate
+        session.hash_contents = deduplicate or external_base is not None
+        if statistics is None:
+            statistics = self._statistics
+        session.statistics = statistics
+        if deduplicate:
+            self._hash_payloads(vals, session)
+
+    def _hash_payloads(self, vals, session):
+        """
+        Hash the payloads of all the datasets in `vals` using a thread pool
+        """
+        payloads = []
+        items = list(vals)
+        while items:
+            item = items.pop()
+            if isinstance(item, OnDemandBase):
+                continue
+            if isinstance(item, GroupContainer):
+                items.extend(item.values())
+            elif isinstance(item, AppendableDatasetContainer):
+                continue
+            elif isinstance(item, (DatasetContainer, ndarray)):
+                data = get_payload(item)
+                if data is not None:
+                    payloads.append((item, data))
+        if len(payloads) < 2:
+            return
+        with ThreadPoolExecutor() as executor:
+            for item, data in payloads:
+                session.add_payload_digest(
+                    item, executor.submit(hash_payload, data)
+                )
+                self.dedup_stats.datasets_hashed += 1
+                self.dedup_stats.bytes_hashed += data.nbytes
+
+    def _link_existing(self, h5py_group, key, val):
+        """
+        Return what to write in place of `val`, which is a link to an
+        existing object if `val` is shared, identical to the object at the
+        same path in the external base file, or has the same contents as a
+        dataset already in the file, along with the content hash to record
+        on the dataset written (if any)
+        """
+        session = self._write_session
+        if self._link_shared:
+            h5py_obj = session.get_written(val)
+            if h5py_obj is not None:
+                val = HardLink(h5py_obj)
+        if session.external_base is not None:
+            link = self._get_external_link(h5py_group, key, val)
+            if link is not None:
+                val = link
+        digest = None
+        if session.hash_contents:
+            digest = self._get_content_hash(val)
+        if digest is not None and session.deduplicate:
+            h5py_obj = self._find_content(h5py_group.file, digest)
+            if h5py_obj is not None:
+                self.dedup_stats.datasets_linked += 1
+                self.dedup_stats.bytes_saved += _get_storage_size(h5py_obj)
+                return HardLink(h5py_obj), None
+        return val, digest
+
+    def _get_content_hash(self, val):
+        """
+        Return the content hash of `val` if it is a dataset which can be
+        content hashed, otherwise None. Appendable datasets are never content
+        hashed, as appending to them would change their contents under any
+        links to them.
+        """
+        if not isinstance(val, (DatasetContainer, ndarray)) or isinstance(
+            val, AppendableDatasetContainer
+        ):
+            return None
+        digest = self._write_session.get_payload_digest(val)
+        if digest is None:
+            data = get_payload(val)
+            if data is None:
+                return None
+            digest = hash_payload(data)
+            self._write_session.add_payload_digest(val, digest)
+            self.dedup_stats.datasets_hashed += 1
+            self.dedup_stats.bytes_hashed += data.nbytes
+        if isinstance(val, ndarray):
+            return content_hash(digest, None)
+        # pylint: disable=protected-access
+        return content_hash(digest, {
+            "attrs": val.attrs,
+            "namespace": val._namespace,
+            "label": val._label,
+            "version": val._version,
+            "on_demand": val._on_demand,
+            "options": {
+                name: option for name, option in val.items()
+                if name != "data"
+            },
+        })
+        # pylint: enable=protected-access
+
+    def _get_external_link(self, h5py_group, key, val):
+        """
+        Return an external link to the object at the same path as `key` in
+        the external base file of the current session if it is identical to
+        `val`, otherwise None
+        """
+        path = posixpath.join(h5py_group.name, key)
+        try:
+            h5py_obj = self._write_session.external_base.get(path)
+        except (KeyError, OSError):
+            # broken links
+            return None
+        if h5py_obj is None or not self._is_identical(h5py_obj, val):
+            return None
+        filename = os.path.relpath(
+            os.path.abspath(h5py_obj.file.filename),
+            os.path.dirname(os.path.abspath(h5py_group.file.filename)),
+        )
+        return h5py.ExternalLink(filename, h5py_obj.name)
+
+    def _is_identical(self, h5py_obj, val):
+        """
+        Return whether the existing group or dataset `h5py_obj` is identical
+        to `val`, based on the stored content hashes of datasets
+        """
+        if isinstance(val, AppendableDatasetContainer):
+            return False
+        if isinstance(val, (DatasetContainer, ndarray)):
+            if not isinstance(h5py_obj, BackendDataset):
+                return False
+            digest = h5py_obj.attrs.get(H5PRESERVE_ATTR_CONTENT_HASH)
+            return digest is not None and digest == self._get_content_hash(
+                val
+            )
+        if not isinstance(val, GroupContainer) or isinstance(
+            val, OnDemandBase
+        ) or not isinstance(h5py_obj, BackendGroup):
+            return False
+        return self._is_identical_group(h5py_obj, val)
+
+    def _is_identical_group(self, h5py_group, val):
+        """
+        Return whether the existing group `h5py_group` has the same
+        attributes and members as the group container `val`
+        """
+        attrs = dict(val.attrs)
+        attrs.update(self._get_h5preserve_metadata(val))
+        if set(h5py_group.attrs) != set(attrs) or set(h5py_group) != set(val):
+            return False
+        if not all(
+            is_attr_equal(h5py_group.attrs[name], attr)
+            for name, attr in attrs.items()
+        ):
+            return False
+        for name, item in val.items():
+            try:
+                member = h5py_group[name]
+            except (KeyError, OSError):
+                return False
+            if not self._is_identical(member, item):
+                return False
+        return True
+
+    def _get_content_index(self, h5py_file):
+        """
+        Return the mapping of content hashes to dataset paths for
+        `h5py_file`, building it from the file if needed
+        """
+        index = self._content_indices.get(h5py_file.id)
+        if index is None:
+            index = {}
+
+            def add_to_index(name, h5py_obj):
+                # pylint: disable=missing-docstring,unused-argument
+                if isinstance(h5py_obj, BackendDataset):
+                    digest = h5py_obj.attrs.get(H5PRESERVE_ATTR_CONTENT_HASH)
+                    if digest is not None:
+                        index.setdefault(digest, h5py_obj.name)
+
+            h5py_file.visititems(add_to_index)
+            self._content_indices[h5py_file.id] = index
+        return index
+
+    def _find_content(self, h5py_file, digest):
+        """
+        Return the dataset in `h5py_file` with content hash `digest`, or None
+        if there is no such dataset
+        """
+        index = self._get_content_index(h5py_file)
+        path = index.get(digest)
+        if path is None:
+            return None
+        h5py_obj = h5py_file.get(path)
+        if isinstance(h5py_obj, BackendDataset) and h5py_obj.attrs.get(
+            H5PRESERVE_ATTR_CONTENT_HASH
+        ) == digest:
+            return h5py_obj
+        del index[digest]
+        return None
+
+    def _add_content(self, h5py_obj, digest):
+        """
+        Record the content hash of a newly written dataset
+        """
+        h5py_obj.attrs[H5PRESERVE_ATTR_CONTENT_HASH] = digest
+        self._get_content_index(h5py_obj.file)[digest] = h5py_obj.name
+
+    def _add_statistics(self, h5py_dataset, val):
+        """
+        Store summary statistics of the data of `val` on `h5py_dataset`
+        """
+        data = get_payload(val)
+        if data is None:
+            return
+        chunks = None
+        if self._write_session.statistics == "chunks":
+            chunks = h5py_dataset.chunks
+        h5py_dataset.attrs.update(get_statistics(data, chunks))
@@ -0,0 +1,643 @@
+# coding: utf-8
+"""
+The directory-of-arrays storage backend, see
+``h5preserve.backends.DirectoryBackend``.
+"""
+from builtins import open as builtin_open
+from collections.abc import MutableMapping
+import json
+import os
+import posixpath
+from shutil import rmtree
+from uuid import uuid4
+
+import h5py
+from numpy import load
+
+from ._atomic import atomic_replace
+from ._backend import (
+    Backend, StoredGroup, BackendDataset, StoredFile, format, encode_value,
+    decode_value, to_storable, get_initial_data, get_new_shape,
+    grows_in_place, get_capacity, copy_resized, MAX_LINK_DEPTH, NAME_EXISTS,
+    NOT_FOUND, READ_ONLY, TOO_MANY_LINKS, NO_SUCH_FILE, FILE_EXISTS,
+    INVALID_MODE,
+)
+
+DIRECTORY_GROUP_META = ".group.json"
+DIRECTORY_DATASET = ".npy"
+DIRECTORY_DATASET_META = ".npy.json"
+DIRECTORY_LINK = ".link"
+
+NOT_A_DIRECTORY_FILE = "{} exists and was not created by DirectoryBackend."
+CROSS_FILE_LINK = "Cannot create hard link {} to an object in another file."
+
+
+def _read_json(path):
+    """
+    Read a JSON sidecar file
+    """
+    with builtin_open(path, encoding="utf-8") as sidecar:
+        return json.load(sidecar)
+
+
+def _write_atomic(path, write):
+    """
+    Call `write` with a temporary file, and then atomically replace `path`
+    with it, so that readers never see a partially written file
+    """
+    with atomic_replace(
+        path, tag=uuid4().hex, sync=False
+    ) as tmp_path, builtin_open(tmp_path, "wb") as tmp_file:
+        write(tmp_file)
+
+
+def _write_json(path, contents):
+    """
+    Atomically write a JSON sidecar file
+    """
+    _write_atomic(path, lambda sidecar: sidecar.write(
+        json.dumps(contents).encode("utf-8")
+    ))
+
+
+class DirectoryBackend(Backend):
+    """
+    Backend storing files as directories, where each group is a directory,
+    each dataset is a ``.npy`` file, and attributes and other metadata are
+    stored in JSON sidecar files.
+
+    Every file is written via a temporary file which is then renamed, so
+    separate processes can safely write to different groups of the same file
+    at once, and readers never see partially written datasets. Datasets are
+    read as read-only ``numpy.memmap`` arrays, so data is only read from
+    disk when it is used. Hard links are stored as references to the path of
+    the linked object (and so break if that is removed), and external links
+    can only refer to other directories written by this backend. Arrays of
+    python objects (other than strings) cannot be stored.
+    """
+    # pylint: disable=too-few-public-methods
+    def open(self, filename, *, mode, **kwargs):
+        """
+        Open a directory as a file, which takes no additional options
+        """
+        if kwargs:
+            raise TypeError("Unexpected options {}.".format(sorted(kwargs)))
+        path = os.fspath(filename)
+        exists = os.path.isfile(os.path.join(path, DIRECTORY_GROUP_META))
+        if mode in {"r", "r+"}:
+            if not exists:
+                raise FileNotFoundError(NO_SUCH_FILE.format(path))
+        elif mode in {"w-", "x"}:
+            if os.path.exists(path):
+                raise FileExistsError(FILE_EXISTS.format(path))
+        elif mode == "w":
+            if exists:
+                rmtree(path)
+            elif os.path.exists(path):
+                raise FileExistsError(NOT_A_DIRECTORY_FILE.format(path))
+        elif mode != "a":
+            raise ValueError(INVALID_MODE.format(mode))
+        if not exists:
+            os.makedirs(path, exist_ok=True)
+            _write_json(
+                os.path.join(path, DIRECTORY_GROUP_META), {"attrs": {}}
+            )
+        return DirectoryFile(path, mode="r" if mode == "r" else "r+")
+
+
+class DirectoryAttributes(MutableMapping):
+    """
+    Attributes of an object in a ``DirectoryBackend`` file, stored in the
+    JSON sidecar file of the object.
+    """
+    def __init__(self, obj):
+        self._obj = obj
+        self._meta_path = obj._meta_path  # pylint: disable=protected-access
+
+    def _read(self):
+        """
+        Read the sidecar file
+        """
+        return _read_json(self._meta_path)
+
+    def _write(self, meta):
+        """
+        Write the sidecar file
+        """
+        self._obj._check_writable()  # pylint: disable=protected-access
+        _write_json(self._meta_path, meta)
+
+    def __getitem__(self, name):
+        return decode_value(self._read()["attrs"][name])
+
+    def __setitem__(self, name, value):
+        self.update({name: value})
+
+    def __delitem__(self, name):
+        meta = self._read()
+        del meta["attrs"][name]
+        self._write(meta)
+
+    def __iter__(self):
+        return iter(list(self._read()["attrs"]))
+
+    def __len__(self):
+        return len(self._read()["attrs"])
+
+    def update(self, *args, **kwargs):
+        # pylint: disable=arguments-differ
+        values = dict(*args, **kwargs)
+        if not values:
+            return
+        meta = self._read()
+        for name, value in values.items():
+            meta["attrs"][name] = encode_value(value)
+        self._write(meta)
+
+    def __repr__(self):
+        return "<Attributes of {!r} ({} members)>".format(
+            self._obj.name, len(self)
+        )
+
+
+class _DirectoryObject:
+    """
+    Common parts of groups and datasets in ``DirectoryBackend`` files
+    """
+    def __init__(self, file, name):
+        self._file = file
+        self._name = name
+        parts = [part for part in name.split("/") if part]
+        self._path = os.path.join(file.filename, *parts)
+
+    @property
+    def name(self):
+        # pylint: disable=missing-docstring
+        return self._name
+
+    @property
+    def file(self):
+        # pylint: disable=missing-docstring
+        return self._file
+
+    @property
+    def attrs(self):
+        # pylint: disable=missing-docstring
+        return DirectoryAttributes(self)
+
+    def __eq__(self, other):
+        # pylint: disable=protected-access
+        return isinstance(other, _DirectoryObject) and (
+            other._path == self._path
+        ) and os.path.samefile(other._file.filename, self._file.filename)
+
+    def __hash__(self):
+        return hash(self._name)
+
+    def _check_writable(self):
+        """
+        Raise an error if the file is read-only
+        """
+        if self._file.mode == "r":
+            raise OSError(READ_ONLY.format(self._file.filename))
+
+
+def _get_kind(directory, name):
+    """
+    Return what the member `name` of the group stored in `directory` is
+    """
+    path = os.path.join(directory, name)
+    if os.path.isdir(path):
+        return "group"
+    if os.path.isfile(path + DIRECTORY_DATASET_META):
+        return "dataset"
+    if os.path.isfile(path + DIRECTORY_LINK):
+        return "link"
+    return None
+
+
+def _read_link(path):
+    """
+    Read a link file, returning the kind of link and the link object
+    """
+    link = _read_json(path + DIRECTORY_LINK)
+    if link["type"] == "external":
+        return "external", h5py.ExternalLink(link["filename"], link["path"])
+    return link["type"], h5py.SoftLink(link["path"])
+
+
+def _traverse_directory(file, path, depth=0):
+    """
+    Return the file, kind and absolute path of the object at the absolute
+    `path` in the ``DirectoryFile`` `file`, following any links
+    """
+    if depth > MAX_LINK_DEPTH:
+        raise KeyError(TOO_MANY_LINKS.format(path))
+    kind = "group"
+    current = "/"
+    directory = file.filename
+    for part in path.split("/"):
+        if not part:
+            continue
+        if kind != "group":
+            raise KeyError(NOT_FOUND.format(path))
+        kind = _get_kind(directory, part)
+        if kind is None:
+            raise KeyError(NOT_FOUND.format(path))
+        current = posixpath.join(current, part)
+        if kind == "link":
+            link_type, link = _read_link(os.path.join(directory, part))
+            if link_type == "external":
+                file = DirectoryFile(os.path.join(
+                    os.path.dirname(os.path.abspath(file.filename)),
+                    link.filename,
+                ), mode="r")
+                target = posixpath.join("/", link.path)
+            else:
+                target = posixpath.join(posixpath.dirname(current), link.path)
+            file, kind, current = _traverse_directory(
+                file, posixpath.normpath(target), depth + 1
+            )
+        directory = os.path.join(
+            file.filename, *[item for item in current.split("/") if item]
+        )
+    return file, kind, current
+
+
+class DirectoryGroup(_DirectoryObject, StoredGroup):
+    """
+    A group in a ``DirectoryBackend`` file
+    """
+    @property
+    def _meta_path(self):
+        """
+        The path of the sidecar file of the group
+        """
+        return os.path.join(self._path, DIRECTORY_GROUP_META)
+
+    def _get_parent(self, path, create=False):
+        """
+        Return the group containing the absolute `path` (following links),
+        and the name of `path` within it, creating intermediate groups if
+        `create`
+        """
+        parent_path, name = posixpath.split(path)
+        if not name:
+            raise ValueError(NAME_EXISTS.format(path))
+        try:
+            file, kind, parent_path = _traverse_directory(
+                self._file, parent_path
+            )
+        except KeyError:
+            if not create:
+                raise
+            self._file.create_group(parent_path)
+            file, kind, parent_path = _traverse_directory(
+                self._file, parent_path
+            )
+        if kind != "group":
+            raise KeyError(NOT_FOUND.format(parent_path))
+        return DirectoryGroup(file, parent_path), name
+
+    def _reserve(self, name):
+        """
+        Return the group which will contain the new member `name`, and the
+        name within that group, raising an error if `name` already exists
+        """
+        # pylint: disable=protected-access
+        self._check_writable()
+        path = self._get_path(name)
+        parent, base = self._get_parent(path, create=True)
+        if base.startswith(".") or _get_kind(parent._path, base) is not None:
+            raise ValueError(NAME_EXISTS.format(path))
+        return parent, base
+
+    def __getitem__(self, name):
+        file, kind, path = _traverse_directory(
+            self._file, self._get_path(name)
+        )
+        if kind == "group":
+            return DirectoryGroup(file, path)
+        return DirectoryDataset(file, path)
+
+    def __setitem__(self, name, obj):
+        if isinstance(obj, _DirectoryObject):
+            if obj.file != self._file:
+                raise ValueError(CROSS_FILE_LINK.format(name))
+            link = {"type": "hard", "path": obj.name}
+        elif isinstance(obj, h5py.SoftLink):
+            link = {"type": "soft", "path": obj.path}
+        elif isinstance(obj, h5py.ExternalLink):
+            link = {
+                "type": "external", "filename": obj.filename,
+                "path": obj.path,
+            }
+        else:
+            self.create_dataset(name, data=obj)
+            return
+        parent, base = self._reserve(name)
+        _write_json(os.path.join(parent._path, base + DIRECTORY_LINK), link)
+
+    def __delitem__(self, name):
+        self._check_writable()
+        parent, base = self._get_parent(self._get_path(name))
+        path = os.path.join(parent._path, base)
+        kind = _get_kind(parent._path, base)
+        if kind == "group":
+            rmtree(path)
+        elif kind == "dataset":
+            os.remove(path + DIRECTORY_DATASET_META)
+            if os.path.exists(path + DIRECTORY_DATASET):
+                os.remove(path + DIRECTORY_DATASET)
+        elif kind == "link":
+            os.remove(path + DIRECTORY_LINK)
+        else:
+            raise KeyError(NOT_FOUND.format(name))
+
+    def __iter__(self):
+        names = set()
+        for entry in os.listdir(self._path):
+            if entry.startswith("."):
+                continue
+            if entry.endswith(DIRECTORY_DATASET_META):
+                names.add(entry[:-len(DIRECTORY_DATASET_META)])
+            elif entry.endswith(DIRECTORY_LINK):
+                names.add(entry[:-len(DIRECTORY_LINK)])
+            elif os.path.isdir(os.path.join(self._path, entry)):
+                names.add(entry)
+        return iter(sorted(names))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def _get_link(self, parent, name):
+        # pylint: disable=protected-access
+        kind = _get_kind(parent._path, name)
+        if kind is None:
+            return None
+        if kind == "link":
+            link_type, link = _read_link(os.path.join(parent._path, name))
+            if link_type != "hard":
+                return link
+        return h5py.HardLink()
+
+    def create_group(self, name):
+        # pylint: disable=protected-access
+        parent, base = self._reserve(name)
+        path = os.path.join(parent._path, base)
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            raise ValueError(NAME_EXISTS.format(name)) from None
+        _write_json(os.path.join(path, DIRECTORY_GROUP_META), {"attrs": {}})
+        return DirectoryGroup(parent.file, posixpath.join(parent.name, base))
+
+    def create_dataset(
+        self, name, shape=None, dtype=None, data=None, **options
+    ):
+        # pylint: disable=protected-access
+        parent, base = self._reserve(name)
+        maxshape = options.pop("maxshape", None)
+        fillvalue = options.pop("fillvalue", None)
+        data = get_initial_data(shape, dtype, data, fillvalue)
+        path = os.path.join(parent._path, base)
+        meta = {
+            "attrs": {},
+            "fillvalue": encode_value(fillvalue),
+            "options": {
+                option: encode_value(value)
+                for option, value in options.items()
+            },
+        }
+        if isinstance(data, h5py.Empty):
+            meta["empty"] = format.dtype_to_descr(data.dtype)
+        else:
+            data = to_storable(data)
+            if maxshape is None:
+                maxshape = data.shape
+            meta["maxshape"] = list(maxshape)
+            _write_atomic(
+                path + DIRECTORY_DATASET,
+                lambda npy: format.write_array(npy, data, allow_pickle=False),
+            )
+        _write_json(path + DIRECTORY_DATASET_META, meta)
+        return DirectoryDataset(
+            parent.file, posixpath.join(parent.name, base)
+        )
+
+    def __repr__(self):
+        return "<Directory group {!r} ({} members)>".format(
+            self._name, len(self)
+        )
+
+
+def _get_directory_option(name):
+    """
+    Return a property for the dataset storage option `name`
+    """
+    def get_option(self):
+        # pylint: disable=protected-access
+        return decode_value(self._get_meta()["options"].get(name))
+
+    return property(get_option, doc="The {} option of the dataset".format(
+        name
+    ))
+
+
+class DirectoryDataset(_DirectoryObject, BackendDataset):
+    """
+    A dataset in a ``DirectoryBackend`` file, whose data is read as a
+    read-only ``numpy.memmap``.
+
+    The ``.npy`` file may hold spare rows past the end of the dataset, so that
+    growing it along the first axis does not rewrite the data every time, in
+    which case the length of the dataset is stored in the sidecar file. The
+    sidecar file and the shape and type of the data are only read once per
+    handle.
+    """
+    def __init__(self, file, name):
+        super().__init__(file, name)
+        self._meta = None
+        self._header = None
+
+    @property
+    def _meta_path(self):
+        """
+        The path of the sidecar file of the dataset
+        """
+        return self._path + DIRECTORY_DATASET_META
+
+    @property
+    def _data_path(self):
+        """
+        The path of the ``.npy`` file of the dataset
+        """
+        return self._path + DIRECTORY_DATASET
+
+    def _get_meta(self):
+        """
+        Return the contents of the sidecar file, which is read once
+        """
+        if self._meta is None:
+            self._meta = _read_json(self._meta_path)
+        return self._meta
+
+    def _set_length(self, length):
+        """
+        Store the length of the dataset along the first axis in the sidecar
+        file
+        """
+        meta = _read_json(self._meta_path)
+        meta["length"] = length
+        _write_json(self._meta_path, meta)
+        self._meta = meta
+        self._header = None
+
+    def _get_header(self):
+        """
+        Return the shape of the ``.npy`` file (including any spare rows) and
+        the type of the dataset, with a shape of None for empty datasets
+        """
+        if self._header is None:
+            data = self._load_all()
+            self._header = getattr(data, "shape", None), data.dtype
+        return self._header
+
+    def _load_all(self, mode="r"):
+        """
+        Return the data of the ``.npy`` file (including any spare rows) as a
+        memmap, or h5py.Empty
+        """
+        meta = self._get_meta()
+        if "empty" in meta:
+            return h5py.Empty(format.descr_to_dtype(meta["empty"]))
+        return load(self._data_path, mmap_mode=mode)
+
+    def _load(self, mode="r"):
+        """
+        Return the data of the dataset as a memmap, or h5py.Empty
+        """
+        data = self._load_all(mode)
+        length = self._get_meta().get("length")
+        if length is None:
+            return data
+        return data[:length]
+
+    @property
+    def shape(self):
+        # pylint: disable=missing-docstring
+        shape, _ = self._get_header()
+        length = self._get_meta().get("length")
+        if length is None:
+            return shape
+        return (length,) + shape[1:]
+
+    @property
+    def dtype(self):
+        # pylint: disable=missing-docstring
+        _, dtype = self._get_header()
+        return dtype
+
+    @property
+    def maxshape(self):
+        # pylint: disable=missing-docstring
+        maxshape = self._get_meta().get("maxshape")
+        if maxshape is None:
+            return None
+        return tuple(maxshape)
+
+    @property
+    def fillvalue(self):
+        # pylint: disable=missing-docstring
+        fillvalue = decode_value(self._get_meta()["fillvalue"])
+        if fillvalue is None:
+            return super().fillvalue
+        return self.dtype.type(fillvalue)
+
+    @property
+    def chunks(self):
+        # pylint: disable=missing-docstring
+        chunks = decode_value(self._get_meta()["options"].get("chunks"))
+        if chunks is True:
+            return self.shape
+        return chunks
+
+    compression = _get_directory_option("compression")
+    compression_opts = _get_directory_option("compression_opts")
+    scaleoffset = _get_directory_option("scaleoffset")
+    shuffle = _get_directory_option("shuffle")
+    fletcher32 = _get_directory_option("fletcher32")
+
+    def __getitem__(self, index):
+        data = self._load()
+        if isinstance(data, h5py.Empty):
+            if index == ():
+                return data
+            raise ValueError("Empty datasets cannot be sliced.")
+        return data[index]
+
+    def __setitem__(self, index, value):
+        self._check_writable()
+        data = self._load(mode="r+")
+        data[index] = value
+        data.flush()
+
+    def resize(self, size, axis=None):
+        self._check_writable()
+        old_shape = self.shape
+        shape = get_new_shape(
+            self._name, old_shape, self.maxshape, size, axis
+        )
+        capacity, _ = self._get_header()
+        if grows_in_place(old_shape, shape) and shape[0] <= capacity[0]:
+            if shape[0] < old_shape[0]:
+                # rows beyond the end must hold the fill value if the
+                # dataset grows again
+                data = self._load_all(mode="r+")
+                data[shape[0]:old_shape[0]] = self.fillvalue
+                data.flush()
+                del data
+            self._set_length(shape[0])
+            return
+        if grows_in_place(old_shape, shape):
+            new_data = copy_resized(self._load(), (
+                get_capacity(old_shape[0], shape[0]),
+            ) + shape[1:], self.fillvalue)
+            if "length" not in self._get_meta():
+                # readers must not see the spare rows before the length is
+                # stored
+                self._set_length(old_shape[0])
+        else:
+            new_data = copy_resized(self._load(), shape, self.fillvalue)
+        _write_atomic(
+            self._data_path,
+            lambda npy: format.write_array(npy, new_data, allow_pickle=False),
+        )
+        if new_data.shape == shape and "length" not in self._get_meta():
+            self._header = None
+        else:
+            self._set_length(shape[0])
+
+    def __repr__(self):
+        return "<Directory dataset {!r}: shape {}, type {!r}>".format(
+            self._name, self.shape, self.dtype.str
+        )
+
+
+class DirectoryFile(DirectoryGroup, StoredFile):
+    """
+    A file stored by a ``DirectoryBackend``
+    """
+    # pylint: disable=too-many-ancestors
+    def __init__(self, filename, mode):
+        self._filename = os.fspath(filename)
+        self._mode = mode
+        self._open = True
+        super().__init__(self, "/")
+
+    def __repr__(self):
+        if not self._open:
+            return "<Closed directory file>"
+        return "<Directory file {!r} (mode {})>".format(
+            self._filename, self._mode
+        )
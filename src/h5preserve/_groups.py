@@ -0,0 +1,844 @@
+# coding: utf-8
+"""
+The wrappers around h5py groups and files (or those of another storage
+backend) which dump and load objects as they are written and read.
+"""
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import os
+import posixpath
+from time import monotonic, sleep
+
+import h5py
+
+from ._utils import (
+    OnDemandWrapper, H5PRESERVE_BATCH, DatasetStatistics, IncrementalStats,
+    match_paths, open_member,
+)
+from ._containers import DelayedContainer
+from ._catalog import iter_catalog_entries, describe_group, match_attrs
+from ._backend import (
+    BackendGroup, BackendDataset, HDF5_BACKEND, get_image,
+)
+from ._memory import MemoryBackend
+
+CANNOT_REOPEN = "Only files opened read-only can be reopened."
+KEY_EXISTS = (
+    "{} already exists, open the file with overwrite=True to replace it."
+)
+NOT_A_GROUP = "{} is not a group."
+CANNOT_CONVERT_TO_BYTES = "Files stored by {} cannot be converted to bytes."
+
+
+class H5PreserveGroup(MutableMapping):
+    """
+    Thin wrapper around :class:`h5py.Group` to automatically use h5preserve
+    when accessing the group contents.
+
+    Parameters
+    ----------
+    h5py_group : ``h5py.Group``
+    registries : RegistryContainer
+        the collection of registries that you want to use to read from the hdf5
+        file
+    overwrite : bool
+        if True, assigning to an existing key overwrites the existing datasets
+        in place where their shape, dtype and storage options allow, rather
+        than raising an error
+    """
+    def __init__(self, h5py_group, registries, *, overwrite=False):
+        # pylint: disable=super-init-not-called
+        self._h5py_group = h5py_group
+        self.registries = registries
+        self._overwrite = overwrite
+
+    def _wrap_group(self, h5py_group):
+        """
+        Wrap a subgroup, keeping the same options as this group
+        """
+        return H5PreserveGroup(
+            h5py_group, self.registries, overwrite=self._overwrite
+        )
+
+    def __getitem__(self, key):
+        obj = self.registries.from_file(self._h5py_group[key])
+        if isinstance(obj, H5PreserveGroup):
+            return self._wrap_group(obj.h5py_group)
+        return self.registries.load(obj)
+
+    @property
+    def _batch(self):
+        """
+        The objects buffered by the batch in progress on the file containing
+        this group (see ``H5PreserveFile.batch``), or None
+        """
+        # pylint: disable=protected-access
+        return self.registries._batches.get(self._h5py_group.file.id)
+
+    def _get_path(self, key):
+        """
+        Return the path in the file of `key`
+        """
+        return posixpath.normpath(posixpath.join(self._h5py_group.name, key))
+
+    def __setitem__(self, key, val):
+        batch = self._batch
+        if batch is not None:
+            batch[self._get_path(key)] = (self.registries.dump(val), None)
+            return
+        if self._overwrite and key in self._h5py_group:
+            self.registries.update_file(
+                self._h5py_group, key, val, compare=False
+            )
+            return
+        self.registries.to_file(
+            self._h5py_group,
+            key,
+            self.registries.dump(val)
+        )
+
+    def __delitem__(self, key):
+        del self._h5py_group[key]
+        # pylint: disable=protected-access
+        self.registries._update_catalog(self._h5py_group, key)
+
+    def __iter__(self):
+        catalog = self._catalog
+        if catalog is None:
+            yield from self._h5py_group
+            return
+        for entry in catalog.children(self._h5py_group.name):
+            yield posixpath.basename(entry.path)
+
+    def __len__(self):
+        catalog = self._catalog
+        if catalog is None:
+            return len(self._h5py_group)
+        return len(catalog.children(self._h5py_group.name))
+
+    def __contains__(self, key):
+        catalog = self._catalog
+        if catalog is None:
+            return key in self._h5py_group
+        return posixpath.normpath(
+            posixpath.join(self._h5py_group.name, key)
+        ) in catalog
+
+    @property
+    def _catalog(self):
+        """
+        The catalog of the file containing this group, or None if the file
+        does not have one
+        """
+        # pylint: disable=protected-access
+        return self.registries._get_catalog(self._h5py_group.file)
+
+    def describe(self):
+        """
+        Describe the structure of everything within this group, without
+        reading any data.
+
+        Unlike ``list_objects``, this always reads from the file (using a
+        single traversal of the group via the low-level h5py API), and
+        includes the storage size and filters of each dataset. Objects with
+        multiple hard links are only included once. Only groups in HDF5 files
+        can be described, others raise a ``TypeError``.
+
+        Returns
+        -------
+        list of ObjectSummary
+        """
+        return describe_group(self._h5py_group)
+
+    def query(
+        self, *, recursive=False, namespace=None, label=None, version=None,
+        attrs=None, value_range=None
+    ):
+        """
+        Find the objects in this group matching the given h5preserve type
+        information and attributes, without loading them.
+
+        Objects are first filtered by namespace, label and version as in
+        ``list_objects`` (using the catalog of the file if it has one), then
+        the attributes of the remaining objects are read and checked against
+        `attrs`.
+
+        Parameters
+        ----------
+        recursive : bool
+            if True, include all the objects within subgroups
+        namespace, label, version : optional
+            only include objects with this h5preserve namespace, label or
+            version
+        attrs : Mapping, optional
+            mapping of attribute names to either the required value of the
+            attribute, or a function which is passed the value of the
+            attribute and returns whether the object should be included.
+            Objects without the attribute are not included.
+        value_range : tuple of (low, high), optional
+            exclude datasets whose stored statistics (see ``get_statistics``)
+            show they have no values between ``low`` and ``high``
+            (inclusive), where either bound can be None. Objects without
+            statistics are not excluded.
+
+        Returns
+        -------
+        dict of OnDemandWrapper
+            mapping of the path of each matching object (relative to this
+            group) to a wrapper which loads the object when called
+        """
+        group_name = self._h5py_group.name
+        results = {}
+        for entry in self.list_objects(
+            recursive=recursive, namespace=namespace, label=label,
+            version=version,
+        ):
+            key = posixpath.relpath(entry.path, group_name)
+            if attrs and not match_attrs(self._h5py_group, key, attrs):
+                continue
+            if value_range is not None and entry.kind == "dataset":
+                statistics = self.get_statistics(key)
+                if statistics is not None and not statistics.may_contain(
+                    *value_range
+                ):
+                    continue
+            results[key] = OnDemandWrapper(
+                lambda key=key: self[key]
+            )
+        return results
+
+    def load_paths(self, patterns):
+        """
+        Load the objects matching any of `patterns`.
+
+        Each pattern is a path relative to this group, where each component
+        of the path can contain glob-style wildcards (``*``, ``?`` and
+        ``[...]``), e.g. ``"runs/*/final_solution"``. Only the groups along
+        matching branches are opened, and only the matching objects are
+        loaded.
+
+        Parameters
+        ----------
+        patterns : string or list of strings
+            the patterns to match
+
+        Returns
+        -------
+        dict
+            mapping of the path of each matching object (relative to this
+            group) to the loaded object
+        """
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        results = {}
+        for pattern in patterns:
+            for path in match_paths(self._h5py_group, pattern):
+                if path not in results:
+                    results[path] = self[path]
+        return results
+
+    def get_statistics(self, key):
+        """
+        Return the summary statistics stored when the dataset ``key`` was
+        written (see ``RegistryContainer.to_file``), without reading the
+        dataset.
+
+        Parameters
+        ----------
+        key : string
+            the path of the dataset
+
+        Returns
+        -------
+        DatasetStatistics or None
+            the statistics of the dataset, or None if it has none
+        """
+        h5py_obj = self._h5py_group[key]
+        if not isinstance(h5py_obj, BackendDataset):
+            return None
+        return DatasetStatistics.from_h5py(h5py_obj)
+
+    def list_objects(
+        self, *, recursive=False, namespace=None, label=None, version=None,
+        kind=None
+    ):
+        """
+        List the objects in this group, without loading them.
+
+        If the file has a catalog (see ``H5PreserveFile.create_catalog``),
+        the listing is answered from the catalog, otherwise the attributes of
+        each object are read from the file.
+
+        Parameters
+        ----------
+        recursive : bool
+            if True, include all the objects within subgroups
+        namespace, label, version, kind : optional
+            only include objects with this h5preserve namespace, label or
+            version, or of this kind (``"group"`` or ``"dataset"``)
+
+        Returns
+        -------
+        list of CatalogEntry
+        """
+        catalog = self._catalog
+        if catalog is None:
+            entries = [
+                entry for key in self._h5py_group
+                for entry in iter_catalog_entries(
+                    self._h5py_group, key, recursive=recursive
+                )
+            ]
+        elif recursive:
+            entries = catalog.subtree(self._h5py_group.name)
+        else:
+            entries = catalog.children(self._h5py_group.name)
+        return [
+            entry for entry in entries
+            if (namespace is None or entry.namespace == namespace) and (
+                label is None or entry.label == label
+            ) and (
+                version is None or entry.version == version
+            ) and (
+                kind is None or entry.kind == kind
+            )
+        ]
+
+    def update(self, *args, **kwargs):
+        # pylint: disable=arguments-differ
+        """
+        Add many objects to this group in one batch.
+
+        Takes the same arguments as ``dict.update``. All the objects are
+        dumped first, then written via ``RegistryContainer.to_file_many``, so
+        objects shared between them are only written once. If the group was
+        opened with ``overwrite=True``, existing keys are overwritten one at a
+        time as with assignment. Within ``H5PreserveFile.batch``, the objects
+        are added to the batch instead.
+        """
+        items = dict(*args, **kwargs)
+        batch = self._batch
+        if self._overwrite and batch is None:
+            for key in [key for key in items if key in self._h5py_group]:
+                self[key] = items.pop(key)
+        registries = self.registries
+        # pylint: disable=protected-access
+        with registries._session():
+            dumped = {key: registries.dump(val) for key, val in items.items()}
+        # pylint: enable=protected-access
+        if batch is not None:
+            for key, val in dumped.items():
+                batch[self._get_path(key)] = (val, None)
+            return
+        registries.to_file_many(self._h5py_group, dumped)
+
+    def load_many(self, keys=None, *, workers=None):
+        """
+        Load many members of this group at once.
+
+        All the members are first read from the file in a single pass (each
+        member is opened once via the low-level h5py API, and its attributes
+        read once), then passed to their loaders, optionally in parallel.
+
+        Parameters
+        ----------
+        keys : iterable of strings, optional
+            the names of the members to load, defaults to all the members
+        workers : int, optional
+            if given, run the loaders in a thread pool with this many threads.
+            This helps when the loaders do substantial work which releases
+            the GIL (e.g. numpy operations); reading from the file is always
+            done serially.
+
+        Returns
+        -------
+        dict
+            mapping of keys to the loaded members
+        """
+        if keys is None:
+            keys = list(self)
+        h5py_group = self._h5py_group
+        from_file = self.registries.from_file
+        results = {}
+        to_load = {}
+        for key in keys:
+            obj = from_file(open_member(h5py_group, key))
+            if isinstance(obj, H5PreserveGroup):
+                results[key] = self._wrap_group(obj.h5py_group)
+            else:
+                results[key] = None
+                to_load[key] = obj
+        if workers is None:
+            for key, obj in to_load.items():
+                results[key] = self.registries.load(obj)
+        else:
+            with ThreadPoolExecutor(workers) as executor:
+                for key, loaded in zip(to_load, executor.map(
+                    self.registries.load, to_load.values()
+                )):
+                    results[key] = loaded
+        return results
+
+    def save_incremental(self, key, val):
+        """
+        Write ``val`` to ``key``, only rewriting the parts of ``val`` which
+        differ from what is already stored at ``key``.
+
+        See ``RegistryContainer.update_file`` for details. Within
+        ``H5PreserveFile.batch``, ``val`` is saved when the batch is written,
+        and the statistics returned are filled in then.
+
+        Parameters
+        ----------
+        key : string
+            the name for the object
+        val
+            the object to add
+
+        Returns
+        -------
+        IncrementalStats
+            statistics about what was written
+        """
+        batch = self._batch
+        if batch is not None:
+            stats = IncrementalStats()
+            batch[self._get_path(key)] = (val, stats)
+            return stats
+        return self.registries.update_file(self._h5py_group, key, val)
+
+    @property
+    def h5py_group(self):
+        """
+        h5py.Group: the instance of ``h5py.Group`` which ``H5PreserveGroup``
+        wraps
+        """
+        return self._h5py_group
+
+    def create_group(self, name):
+        """
+        Creates a new group in the associated hdf5 file
+
+        Parameters
+        ----------
+        name : string, or other identifier accepted by h5py
+            name of the new group
+
+        Returns
+        -------
+        H5PreserveGroup
+            The new group wrapped by H5PreserveGroup
+        """
+        new_group = self._h5py_group.create_group(name)
+        # pylint: disable=protected-access
+        self.registries._update_catalog(self._h5py_group, name)
+        return self._wrap_group(new_group)
+
+    def require_group(self, name):
+        """
+        Returns the group associated with ``name``, creating it if necessary.
+
+        Parameters
+        ----------
+        name : string, or other identifier accepted by h5py
+            name of the desired group
+
+        Returns
+        -------
+        H5PreserveGroup
+            The group wrapped by H5PreserveGroup
+        """
+        exists = name in self._h5py_group
+        group = self._h5py_group.require_group(name)
+        if not exists:
+            # pylint: disable=protected-access
+            self.registries._update_catalog(self._h5py_group, name)
+        return self._wrap_group(group)
+
+
+class H5PreserveFile(H5PreserveGroup):
+    # pylint: disable=too-many-ancestors
+    """
+    Thin wrapper around ``h5py.File`` to automatically use h5preserve when
+    accessing the file contents.
+
+    Acts like ``h5preserve.H5PreserveGroup``, but allows access to the
+    associated ``h5py.File`` instance via ``h5py_file``.
+
+    Parameters
+    ----------
+    h5py_file : a ``h5py.File``
+        the hdf5 file to wrap
+    registries : RegistryContainer
+        the collection of registries that you want to use to read from the hdf5
+        file
+    overwrite : bool
+        if True, assigning to an existing key overwrites the existing datasets
+        in place where possible, see ``H5PreserveGroup``
+    backend : ``h5preserve.backends.Backend``, optional
+        the storage backend used to open the file, used to reopen it (see
+        ``reopen``), by default the HDF5 backend
+    open_kwargs : dict, optional
+        the keyword arguments used to open the file, used to reopen it
+    """
+    def __init__(
+        self, h5py_file, registries, *, overwrite=False, backend=None,
+        open_kwargs=None,
+    ):
+        self._h5py_file = h5py_file
+        self._open_kwargs = dict(open_kwargs or {})
+        self._backend = HDF5_BACKEND if backend is None else backend
+        super().__init__(
+            h5py_group=self._h5py_file["/"],
+            registries=registries,
+            overwrite=overwrite,
+        )
+
+    def close(self):
+        # pylint: disable=missing-docstring
+        # pylint: disable=protected-access
+        self.registries._warn_delayed()
+        self.registries._forget_file(self._h5py_file)
+        self.registries._flush_appendable(self._h5py_file, forget=True)
+        # pylint: enable=protected-access
+        self._h5py_file.close()
+
+    def reopen(self):
+        """
+        Close and reopen a file which was opened read-only, so that changes
+        made to the file by other processes are seen.
+
+        Any groups, datasets or on-demand objects loaded from the file before
+        reopening it are no longer valid.
+        """
+        if self._h5py_file.mode != "r":
+            raise RuntimeError(CANNOT_REOPEN)
+        filename = self._h5py_file.filename
+        kwargs = dict(self._open_kwargs)
+        if isinstance(self._h5py_file, h5py.File):
+            kwargs.setdefault("libver", self._h5py_file.libver)
+        if self.swmr_mode:
+            kwargs["swmr"] = True
+        # pylint: disable=protected-access
+        self.registries._forget_file(self._h5py_file)
+        # pylint: enable=protected-access
+        self._h5py_file.close()
+        self._h5py_file = self._backend.open(filename, mode="r", **kwargs)
+        self._h5py_group = self._h5py_file["/"]
+
+    def tail(self, path="/", *, interval=1.0, timeout=None):
+        """
+        Watch a group for new members, yielding them as they are written.
+
+        The keys in the group when ``tail`` is called are skipped. The group is
+        then checked every ``interval`` seconds, and ``(key, loaded_object)``
+        is yielded for each new key. If the file is being read in SWMR mode,
+        it is refreshed (see ``refresh``) on each check, otherwise if it was
+        opened read-only it is reopened whenever its modification time
+        changes (see ``reopen``).
+
+        Parameters
+        ----------
+        path : string
+            the path of the group to watch
+        interval : float
+            how often to check for new keys, in seconds
+        timeout : float, optional
+            stop if no new keys have been seen for this many seconds, the
+            default is to never stop
+
+        Returns
+        -------
+        generator of (string, object)
+        """
+        seen = set(self._h5py_file[path])
+        return self._tail(path, seen, self._get_modified(), interval, timeout)
+
+    def _tail(self, path, seen, modified, interval, timeout):
+        """
+        Generator for `tail`
+        """
+        last_seen = monotonic()
+        while True:
+            if self.swmr_mode:
+                self.refresh()
+            elif self._h5py_file.mode == "r":
+                new_modified = self._get_modified()
+                if new_modified != modified:
+                    modified = new_modified
+                    self.reopen()
+            group = self._wrap_group(self._h5py_file[path])
+            new_keys = [key for key in group if key not in seen]
+            for key in new_keys:
+                seen.add(key)
+                yield key, group[key]
+            if new_keys:
+                last_seen = monotonic()
+            elif timeout is not None and monotonic() - last_seen >= timeout:
+                return
+            sleep(interval)
+
+    def _get_modified(self):
+        """
+        Return the modification time and size of the file on disk, or None if
+        it is not on disk
+        """
+        try:
+            stat = os.stat(self._h5py_file.filename)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager which buffers writes to the file (and groups within
+        it), writing them all in one pass when the context exits.
+
+        Objects are dumped when they are assigned (or added via ``update``),
+        and if the same key is written to multiple times, only the last
+        object is written. On exit, the objects are written in order of their
+        path via ``RegistryContainer.to_file_many``, without recording the
+        modification times of each object. They are first written to a hidden
+        staging group, and only moved into place (replacing any existing
+        objects at those keys, if the file was opened with
+        ``overwrite=True``) once all of them have been written, so if an
+        exception is raised, either within the context or while writing, none
+        of them are written. Objects assigned within the context cannot be
+        read back until it exits. A ``DelayedContainer`` assigned within the
+        context writes its contents directly to its final location.
+
+        Objects saved via ``save_incremental`` within the context are saved
+        in place once the other objects have been moved into place, and so
+        are not rolled back if saving them fails. In SWMR mode, where new
+        objects cannot be created, nothing is staged: existing datasets are
+        overwritten in place (the file being opened with ``overwrite=True``),
+        and the file is flushed only once.
+        """
+        batches = self.registries._batches  # pylint: disable=protected-access
+        file_id = self._h5py_file.id
+        if file_id in batches:
+            yield
+            return
+        batch = batches[file_id] = {}
+        try:
+            yield
+        finally:
+            del batches[file_id]
+        items = {}
+        incremental = {}
+        for path, (val, stats) in batch.items():
+            if stats is None:
+                items[path] = val
+            else:
+                incremental[path] = (val, stats)
+        if self.swmr_mode:
+            self._write_in_place(items)
+        else:
+            self._write_staged(items)
+        for path in sorted(incremental):
+            parent, name = posixpath.split(path)
+            val, stats = incremental[path]
+            self.registries.update_file(
+                self._h5py_file["/"].require_group(parent), name, val,
+                stats=stats,
+            )
+
+    def _write_in_place(self, items):
+        """
+        Write `items` (a mapping of paths to dumped objects) directly to the
+        file, overwriting existing objects in place if the file was opened
+        with ``overwrite=True``
+        """
+        new_items = {}
+        for path, val in items.items():
+            if self._overwrite and path in self._h5py_file:
+                parent, name = posixpath.split(path)
+                self.registries.update_file(
+                    self._h5py_file[parent], name, val, compare=False
+                )
+            else:
+                new_items[path.lstrip("/")] = val
+        self.registries.to_file_many(
+            self._h5py_file["/"], new_items, track_times=False
+        )
+
+    def _write_staged(self, items):
+        """
+        Write `items` (a mapping of paths to dumped objects) to a hidden
+        staging group, then move them into place once they have all been
+        written, so that either all or none of them are written.
+
+        ``DelayedContainer`` items are not staged, as their contents are
+        only written after the batch, so they are instead set up to write
+        to their final location once the other items have been moved.
+        """
+        root = self._h5py_file["/"]
+        delayed = {
+            path: val for path, val in items.items()
+            if isinstance(val, DelayedContainer)
+        }
+        for path in delayed:
+            self._check_batch_path(root, path)
+        items = {
+            path: val for path, val in items.items() if path not in delayed
+        }
+        if items:
+            self._move_staged(root, items)
+        for path in sorted(delayed):
+            parent, name = posixpath.split(path)
+            group = root.require_group(parent)
+            if name in group:
+                del group[name]
+            self.registries.to_file(group, name, delayed[path])
+
+    def _move_staged(self, root, items):
+        """
+        Write `items` to the staging group and move them into place
+        """
+        # objects within other items are moved along with them
+        paths = []
+        for path in sorted(items):
+            parent = posixpath.dirname(path)
+            while parent != "/" and parent not in items:
+                parent = posixpath.dirname(parent)
+            if parent == "/":
+                paths.append(path)
+        for path in paths:
+            self._check_batch_path(root, path)
+        staging = root.create_group(H5PRESERVE_BATCH)
+        try:
+            self.registries.to_file_many(staging, {
+                path.lstrip("/"): val for path, val in items.items()
+            }, track_times=False)
+            for path in paths:
+                parent, name = posixpath.split(path)
+                group = root.require_group(parent)
+                if name in group:
+                    del group[name]
+                group[name] = staging[path.lstrip("/")]
+        finally:
+            del root[H5PRESERVE_BATCH]
+            # pylint: disable=protected-access
+            self.registries._update_catalog(root, H5PRESERVE_BATCH, *(
+                path.lstrip("/") for path in paths
+            ))
+
+    def _check_batch_path(self, root, path):
+        """
+        Check that the object at `path` can be written by a batch, so that
+        nothing needs to be undone once the batch starts to be moved into
+        place
+        """
+        h5py_obj = root.get(path)
+        if h5py_obj is not None and not self._overwrite:
+            raise ValueError(KEY_EXISTS.format(path))
+        parent = posixpath.dirname(path)
+        while parent != "/":
+            h5py_obj = root.get(parent)
+            if h5py_obj is not None:
+                if not isinstance(h5py_obj, BackendGroup):
+                    raise TypeError(NOT_A_GROUP.format(parent))
+                break
+            parent = posixpath.dirname(parent)
+
+    def create_catalog(self):
+        """
+        Create a catalog of the objects in the file.
+
+        The catalog is a compact table stored in the file (as
+        ``_h5preserve_catalog``, which is hidden from iteration), with the
+        path, h5preserve namespace, label and version, and the kind, shape,
+        dtype and size of every object. Once a file has a catalog, it is kept
+        up to date by h5preserve as objects are written or deleted, and is
+        used to answer ``len``, iteration, ``in`` and ``list_objects`` without
+        visiting each object in the file. Objects written or deleted directly
+        via h5py are not recorded in the catalog.
+        """
+        # pylint: disable=protected-access
+        self.registries._create_catalog(self._h5py_file)
+
+    def flush(self):
+        """
+        Write any buffered data to the file, and flush the file to disk.
+        """
+        # pylint: disable=protected-access
+        self.registries._flush_appendable(self._h5py_file)
+        # pylint: enable=protected-access
+        self._h5py_file.flush()
+
+    def to_bytes(self):
+        """
+        Return the contents of the file as bytes, including any changes not
+        yet written to disk, which can be opened again with
+        ``h5preserve.open_bytes``. For HDF5 files, this is the HDF5 file
+        image, so a file created fully in memory (by passing
+        ``driver="core", backing_store=False`` to ``h5preserve.open``) never
+        touches the filesystem.
+
+        Only HDF5 files and files stored by a
+        ``h5preserve.backends.MemoryBackend`` can be converted to bytes.
+        """
+        self.flush()
+        if isinstance(self._h5py_file, h5py.File):
+            return get_image(self._h5py_file)
+        if isinstance(self._backend, MemoryBackend):
+            return self._backend.to_bytes(self._h5py_file.filename)
+        raise TypeError(CANNOT_CONVERT_TO_BYTES.format(
+            type(self._backend).__name__
+        ))
+
+    def start_swmr(self):
+        """
+        Start single-writer multiple-reader (SWMR) mode, allowing other
+        processes to read the file (opened via ``h5preserve.open`` with
+        ``swmr=True``) while it is being written.
+
+        All groups and datasets should be created before calling this, as
+        depending on the version of HDF5, new objects may not be able to be
+        created while in SWMR mode. Appending to appendable datasets and
+        overwriting existing datasets in place are supported. In SWMR mode,
+        appended rows are not buffered, and data is flushed after each write
+        so that readers see it.
+        """
+        self.flush()
+        self._h5py_file.swmr_mode = True
+
+    @property
+    def swmr_mode(self):
+        """
+        bool: whether the file is being written or read in SWMR mode
+        """
+        return self._h5py_file.swmr_mode
+
+    def refresh(self):
+        """
+        Update the appendable datasets loaded from this file with the rows
+        written since they were loaded or last refreshed, along with the
+        catalog of the file, when the file is being read in SWMR mode.
+
+        Only appendable datasets are refreshed: other objects which have
+        already been loaded are not updated, and as new objects cannot be
+        created by the writer while in SWMR mode, keys added to the file (by a
+        writer not in SWMR mode) are only seen after ``reopen``.
+        """
+        # pylint: disable=protected-access
+        for appendable in self.registries._get_appendable(self._h5py_file):
+            appendable.refresh()
+        self.registries._catalogs.pop(self._h5py_file.id, None)
+        # pylint: enable=protected-access
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    @property
+    def h5py_file(self):
+        """
+        h5py.File: the instance of ``h5py.File`` which ``H5PreserveFile`` wraps
+        """
+        return self._h5py_file
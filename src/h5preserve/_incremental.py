@@ -0,0 +1,289 @@
+# coding: utf-8
+"""
+Incremental writes by ``RegistryContainer``, which only rewrite the parts of
+an object which differ from what is already in the file.
+"""
+import posixpath
+import weakref
+
+import h5py
+from numpy import ndarray, ascontiguousarray
+
+from ._utils import (
+    H5PRESERVE_ATTR_CONTENT_HASH, IncrementalStats, UnchangedObject,
+    get_payload, is_attr_equal, on_demand_group_dumper_generator,
+)
+from ._containers import OnDemandBase, GroupContainer, DatasetContainer
+from ._backend import BackendGroup, BackendDataset
+
+OVERWRITABLE_DATASET_KEYS = {
+    "chunks", "maxshape", "fillvalue", "compression", "compression_opts",
+    "scaleoffset", "shuffle", "fletcher32",
+}
+
+
+def _is_shared(h5py_obj):
+    """
+    Return whether `h5py_obj` may have multiple hard links to it, which is
+    assumed to be the case for objects not stored in HDF5 files
+    """
+    if isinstance(h5py_obj, (h5py.Group, h5py.Dataset)):
+        return h5py.h5o.get_info(h5py_obj.id).rc > 1
+    return True
+
+
+class IncrementalMixin:
+    # pylint: disable=too-few-public-methods
+    """
+    Incremental writes and dirty tracking for ``RegistryContainer``.
+    """
+    def update_file(self, h5py_group, key, obj, *, compare=True, stats=None):
+        """
+        Dump native python object and write it to an hdf5 file, only
+        rewriting the parts which differ from what is already in the file.
+
+        Datasets are compared to those in the file via their content hashes,
+        and are overwritten in place where the shape, dtype and storage
+        options allow. Objects which have an ``_h5preserve_dirty`` attribute
+        which is False, and were last written to the same location by these
+        registries, are assumed to be unchanged since then, and are not
+        dumped; ``_h5preserve_dirty`` is set to False on all such objects once
+        they have been written.
+
+        Parameters
+        ----------
+        h5py_group : ``h5py.Group``
+            the group to add the object to
+        key : string
+            the name for the object
+        obj
+            the object to add
+        compare : bool
+            if False, nothing is compared with what is already in the file or
+            skipped due to dirty tracking, and existing datasets are always
+            overwritten (in place where possible)
+        stats : IncrementalStats, optional
+            if given, the statistics are added to `stats` rather than a new
+            instance
+
+        Returns
+        -------
+        IncrementalStats
+            statistics about what was written
+        """
+        if stats is None:
+            stats = IncrementalStats()
+        with self._session() as session:
+            session.hash_contents = compare
+            session.skip_clean = compare
+            session.statistics = self._statistics
+            val = self.dump(obj)
+            self._update_to_file(h5py_group, key, val, stats)
+            if compare:
+                self._mark_clean(session)
+        self._update_catalog(h5py_group, key)
+        return stats
+
+    def _mark_clean(self, session):
+        """
+        Mark the dirty tracked objects written in `session` as clean, and
+        record where each was written, as the dirty flag only says whether
+        the object has changed since it was written to that location
+        """
+        for obj, h5py_obj in session.mark_clean():
+            try:
+                ref = weakref.ref(obj)
+            except TypeError:
+                continue
+            self._clean_objects.setdefault(h5py_obj.file.id, {})[
+                h5py_obj.name
+            ] = ref
+
+    def _is_clean_at(self, obj, h5py_obj):
+        """
+        Return whether `obj` was last written to `h5py_obj`, and so is
+        unchanged from it if it is not dirty
+        """
+        paths = self._clean_objects.get(h5py_obj.file.id, {})
+        ref = paths.get(h5py_obj.name)
+        return ref is not None and ref() is obj
+
+    def _forget_clean(self, h5py_group, key):
+        """
+        Forget which object was written to `key` in `h5py_group`, as it is
+        about to be replaced
+        """
+        paths = self._clean_objects.get(h5py_group.file.id)
+        if paths:
+            paths.pop(posixpath.join(h5py_group.name, key), None)
+
+    def _dump_unchanged(self, val):
+        """
+        Dump an object which was skipped when dumping as it was unchanged
+        """
+        session = self._write_session
+        skip_clean = session.skip_clean
+        session.skip_clean = False
+        try:
+            return self.dump(val.obj)
+        finally:
+            session.skip_clean = skip_clean
+
+    def _update_to_file(self, h5py_group, key, val, stats):
+        """
+        Write h5preserve object to hdf5 file, reusing what is already in the
+        file where possible
+        """
+        session = self._write_session
+        link = h5py_group.get(key, getlink=True)
+        if not isinstance(link, h5py.HardLink):
+            if link is not None:
+                del h5py_group[key]
+            self.to_file(h5py_group, key, val)
+            stats.written += 1
+            return
+        existing = h5py_group[key]
+        if isinstance(val, UnchangedObject):
+            if self._is_clean_at(val.obj, existing):
+                session.add_written(val, existing)
+                stats.unchanged += 1
+                return
+            val = self._dump_unchanged(val)
+        self._forget_clean(h5py_group, key)
+        if self._link_shared and session.get_written(val) is not None:
+            if session.get_written(val) == existing:
+                stats.unchanged += 1
+                return
+        elif self._update_existing(existing, val, stats):
+            session.add_written(val, existing)
+            return
+        del h5py_group[key]
+        self.to_file(h5py_group, key, val)
+        stats.written += 1
+
+    def _update_existing(self, h5py_obj, val, stats):
+        """
+        Update an existing group or dataset in place to match `val`, returning
+        whether this was possible
+        """
+        # objects with multiple hard links can only be reused if unchanged
+        shared = _is_shared(h5py_obj)
+        if isinstance(val, GroupContainer) and isinstance(
+            h5py_obj, BackendGroup
+        ) and not shared:
+            self._update_group(h5py_obj, val, stats)
+            return True
+        if isinstance(val, (DatasetContainer, ndarray)) and isinstance(
+            h5py_obj, BackendDataset
+        ):
+            return self._update_dataset(h5py_obj, val, stats, shared)
+        return False
+
+    def _update_group(self, h5py_group, val, stats):
+        """
+        Update the attributes and members of an existing group to match
+        `val`, removing any members not in `val`
+        """
+        self._update_attrs(h5py_group, val)
+        if isinstance(val, OnDemandBase):
+            names = set()
+
+            def writer(h5py_group, key, item):
+                # pylint: disable=missing-docstring
+                names.add(key)
+                with self._session():
+                    self._update_to_file(h5py_group, key, item, stats)
+
+            # pylint: disable=protected-access
+            py_obj = val._ref()
+            py_obj._h5preserve_dump = on_demand_group_dumper_generator(
+                self, h5py_group, writer=writer
+            )
+            py_obj._h5preserve_update()
+            # pylint: enable=protected-access
+        else:
+            names = set(val)
+            for name, item in val.items():
+                self._update_to_file(h5py_group, name, item, stats)
+        for name in list(h5py_group):
+            if name not in names:
+                del h5py_group[name]
+
+    def _update_dataset(self, h5py_dataset, val, stats, shared):
+        """
+        Overwrite an existing dataset in place if its contents differ from
+        `val`, returning whether this was possible
+        """
+        if not self._write_session.hash_contents:
+            if shared or not self._overwrite_dataset(h5py_dataset, val):
+                return False
+            if H5PRESERVE_ATTR_CONTENT_HASH in h5py_dataset.attrs:
+                del h5py_dataset.attrs[H5PRESERVE_ATTR_CONTENT_HASH]
+            stats.updated += 1
+            return True
+        digest = self._get_content_hash(val)
+        if digest is None:
+            return False
+        if h5py_dataset.attrs.get(H5PRESERVE_ATTR_CONTENT_HASH) == digest:
+            stats.unchanged += 1
+            return True
+        if not shared and self._overwrite_dataset(h5py_dataset, val):
+            self._add_content(h5py_dataset, digest)
+            stats.updated += 1
+            return True
+        return False
+
+    def _overwrite_dataset(self, h5py_dataset, val):
+        """
+        Overwrite the contents of an existing dataset in place, returning
+        whether the existing dataset was compatible with `val`
+        """
+        data = get_payload(val)
+        if isinstance(val, ndarray):
+            options = {}
+        else:
+            options = val
+        if data is None:
+            return False
+        if h5py_dataset.shape != data.shape:
+            return False
+        if h5py_dataset.dtype != options.get("dtype", data.dtype):
+            return False
+        for name in OVERWRITABLE_DATASET_KEYS:
+            option = options.get(name)
+            if option is None:
+                continue
+            if name == "chunks" and option is True:
+                if h5py_dataset.chunks is None:
+                    return False
+            elif not is_attr_equal(getattr(h5py_dataset, name), option):
+                return False
+        if data.size:
+            h5py_dataset.write_direct(
+                ascontiguousarray(data, dtype=h5py_dataset.dtype)
+            )
+        self._update_attrs(h5py_dataset, val)
+        if self._write_session.statistics:
+            self._add_statistics(h5py_dataset, val)
+        return True
+
+    def _update_attrs(self, h5py_obj, val):
+        """
+        Update the attributes of an existing group or dataset to match `val`
+        """
+        if isinstance(val, ndarray):
+            new_attrs = {}
+        else:
+            self._check_attrs(val)
+            new_attrs = dict(val.attrs)
+            new_attrs.update(self._get_h5preserve_metadata(val))
+        for name in list(h5py_obj.attrs):
+            if name not in new_attrs and (
+                name != H5PRESERVE_ATTR_CONTENT_HASH
+            ):
+                del h5py_obj.attrs[name]
+        for name, attr in new_attrs.items():
+            if name not in h5py_obj.attrs or not is_attr_equal(
+                h5py_obj.attrs[name], attr
+            ):
+                h5py_obj.attrs[name] = attr
@@ -0,0 +1,650 @@
+# coding: utf-8
+"""
+The in-memory storage backend, see ``h5preserve.backends.MemoryBackend``.
+"""
+from collections.abc import MutableMapping
+import json
+from pickle import PickleBuffer
+import posixpath
+from struct import Struct
+
+import h5py
+from numpy import ndarray, frombuffer, ascontiguousarray
+
+from ._backend import (
+    Backend, StoredGroup, BackendDataset, StoredFile, format,
+    get_initial_data, get_new_shape, grows_in_place, get_capacity,
+    copy_resized, encode_value, decode_value, to_storable, NAME_EXISTS,
+    READ_ONLY, NOT_FOUND, NO_SUCH_FILE, FILE_EXISTS, INVALID_MODE,
+    TOO_MANY_LINKS, MAX_LINK_DEPTH,
+)
+
+MEMORY_IMAGE_MAGIC = b"H5PMEM\r\n"
+MEMORY_IMAGE_HEADER = Struct("<BQ")
+MEMORY_IMAGE_VERSION = 1
+
+CROSS_FILE_LINK = "Cannot create hard link {} to an object in another file."
+INVALID_IMAGE = "Data is not a serialized in-memory file."
+UNSUPPORTED_IMAGE_VERSION = "Unsupported serialized file version {}."
+MISSING_BUFFERS = "Not enough out-of-band buffers given."
+
+
+class MemoryBackend(Backend):
+    """
+    Backend storing files in memory as python dicts and numpy arrays, without
+    using HDF5 at all.
+
+    Files are identified by their name within each ``MemoryBackend``, and
+    exist for as long as the ``MemoryBackend`` does, so they can be closed
+    and reopened. Dataset storage options (such as compression) are recorded
+    but otherwise ignored, and data is copied when written and read, as with
+    HDF5 files.
+    """
+    def __init__(self):
+        self._files = {}
+
+    def open(self, filename, *, mode, **kwargs):
+        """
+        Open an in-memory file, which takes no additional options
+        """
+        if kwargs:
+            raise TypeError("Unexpected options {}.".format(sorted(kwargs)))
+        filename = str(filename)
+        exists = filename in self._files
+        if mode in {"r", "r+"}:
+            if not exists:
+                raise FileNotFoundError(NO_SUCH_FILE.format(filename))
+        elif mode in {"w-", "x"}:
+            if exists:
+                raise FileExistsError(FILE_EXISTS.format(filename))
+            self._files[filename] = _GroupNode()
+        elif mode == "w":
+            self._files[filename] = _GroupNode()
+        elif mode == "a":
+            self._files.setdefault(filename, _GroupNode())
+        else:
+            raise ValueError(INVALID_MODE.format(mode))
+        return MemoryFile(
+            self, filename, self._files[filename],
+            mode="r" if mode == "r" else "r+",
+        )
+
+    @property
+    def filenames(self):
+        """
+        The names of the files stored by the backend
+        """
+        return sorted(self._files)
+
+    def remove(self, filename):
+        """
+        Remove a file from the backend
+        """
+        del self._files[str(filename)]
+
+    def to_bytes(self, filename, *, buffer_callback=None):
+        """
+        Serialize a file to bytes, which can be read by ``from_bytes``.
+
+        As with pickle protocol 5, if `buffer_callback` is given, it is
+        called with a ``pickle.PickleBuffer`` of the data of each dataset, and
+        any buffer for which it returns a false value is not included in the
+        returned bytes (so it can be sent separately without being copied),
+        and must be passed to ``from_bytes`` via `buffers`.
+
+        Parameters
+        ----------
+        filename : string
+            the name of the file
+        buffer_callback : callable, optional
+            called with each buffer, see above
+
+        Returns
+        -------
+        bytes
+        """
+        return _pack_file(self._get_root(str(filename)), buffer_callback)
+
+    def from_bytes(self, filename, data, *, buffers=None):
+        """
+        Create a file from bytes written by ``to_bytes``. The data of the
+        datasets of the file refer to `data` and `buffers` rather than being
+        copied, so they are read-only if those are.
+
+        Parameters
+        ----------
+        filename : string
+            the name of the new file
+        data : bytes-like
+            the serialized file
+        buffers : iterable of bytes-like, optional
+            the buffers which were not included in `data`, in the order they
+            were passed to the `buffer_callback` of ``to_bytes``
+        """
+        filename = str(filename)
+        if filename in self._files:
+            raise FileExistsError(FILE_EXISTS.format(filename))
+        self._files[filename] = _unpack_file(data, buffers)
+
+    def _get_root(self, filename):
+        """
+        Return the root group of a file, for resolving external links
+        """
+        try:
+            return self._files[filename]
+        except KeyError:
+            raise KeyError(NO_SUCH_FILE.format(filename)) from None
+
+
+class MemoryAttributes(MutableMapping):
+    """
+    Attributes of an object in a ``MemoryBackend`` file. Arrays are copied
+    when they are stored.
+    """
+    def __init__(self):
+        self._attrs = {}
+
+    def __getitem__(self, name):
+        return self._attrs[name]
+
+    def __setitem__(self, name, value):
+        if isinstance(value, ndarray):
+            value = value.copy()
+        self._attrs[name] = value
+
+    def __delitem__(self, name):
+        del self._attrs[name]
+
+    def __iter__(self):
+        return iter(self._attrs)
+
+    def __len__(self):
+        return len(self._attrs)
+
+    def __repr__(self):
+        return "<Attributes of in-memory object ({} members)>".format(
+            len(self)
+        )
+
+
+class _GroupNode:
+    """
+    Storage of a group in a ``MemoryBackend`` file
+    """
+    # pylint: disable=too-few-public-methods
+    __slots__ = ("links", "attrs")
+
+    def __init__(self):
+        self.links = {}
+        self.attrs = MemoryAttributes()
+
+
+class _DatasetNode:
+    """
+    Storage of a dataset in a ``MemoryBackend`` file
+    """
+    # pylint: disable=too-few-public-methods
+    __slots__ = (
+        "data", "attrs", "maxshape", "fillvalue", "options", "borrowed",
+        "buffer",
+    )
+
+    def __init__(self, data, maxshape, fillvalue, options, borrowed=False):
+        self.data = data
+        self.attrs = MemoryAttributes()
+        self.maxshape = maxshape
+        self.fillvalue = fillvalue
+        self.options = options
+        # whether data refers to buffers given to MemoryBackend.from_bytes,
+        # and so is not copied when read
+        self.borrowed = borrowed
+        # the array whose leading rows data is a view of, with spare rows for
+        # growing along the first axis, or None if data has no spare rows
+        self.buffer = None
+
+
+class _MemoryObject:
+    """
+    Common parts of groups and datasets in ``MemoryBackend`` files
+    """
+    def __init__(self, file, node, name):
+        self._file = file
+        self._node = node
+        self._name = name
+
+    @property
+    def name(self):
+        # pylint: disable=missing-docstring
+        return self._name
+
+    @property
+    def file(self):
+        # pylint: disable=missing-docstring
+        return self._file
+
+    @property
+    def attrs(self):
+        # pylint: disable=missing-docstring
+        return self._node.attrs
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, _MemoryObject) and other._node is self._node
+        )
+
+    def __hash__(self):
+        return hash(id(self._node))
+
+    def _check_writable(self):
+        """
+        Raise an error if the file is read-only
+        """
+        if self._file.mode == "r":
+            raise OSError(READ_ONLY.format(self._file.filename))
+
+
+def _wrap(file, node, name):
+    """
+    Wrap a node of a ``MemoryBackend`` file
+    """
+    if isinstance(node, _GroupNode):
+        return MemoryGroup(file, node, name)
+    return MemoryDataset(file, node, name)
+
+
+def _traverse(file, path, depth=0):
+    """
+    Return the file, node and path of the object at the absolute `path` in the
+    ``MemoryFile`` `file`, following any links
+    """
+    # pylint: disable=protected-access
+    if depth > MAX_LINK_DEPTH:
+        raise KeyError(TOO_MANY_LINKS.format(path))
+    node = file._root
+    current = "/"
+    for part in path.split("/"):
+        if not part:
+            continue
+        link = None
+        if isinstance(node, _GroupNode):
+            link = node.links.get(part)
+        if link is None:
+            raise KeyError(NOT_FOUND.format(path))
+        current = posixpath.join(current, part)
+        if isinstance(link, h5py.SoftLink):
+            file, node, current = _traverse(file, posixpath.normpath(
+                posixpath.join(posixpath.dirname(current), link.path)
+            ), depth + 1)
+        elif isinstance(link, h5py.ExternalLink):
+            file = MemoryFile(
+                file._backend, link.filename,
+                file._backend._get_root(link.filename), mode="r",
+            )
+            file, node, current = _traverse(file, posixpath.normpath(
+                posixpath.join("/", link.path)
+            ), depth + 1)
+        else:
+            node = link
+    return file, node, current
+
+
+class MemoryGroup(_MemoryObject, StoredGroup):
+    """
+    A group in a ``MemoryBackend`` file
+    """
+    def _traverse(self, path):
+        """
+        Return the file, node and path of the object at the absolute `path`,
+        following any links
+        """
+        return _traverse(self._file, path)
+
+    def _get_parent(self, path, create=False):
+        """
+        Return the node of the group containing the absolute `path`, and the
+        name of `path` within it, creating intermediate groups if `create`
+        """
+        parent_path, name = posixpath.split(path)
+        if not name:
+            raise ValueError(NAME_EXISTS.format(path))
+        try:
+            _, parent, _ = self._traverse(parent_path)
+        except KeyError:
+            if not create:
+                raise
+            self._file.create_group(parent_path)
+            _, parent, _ = self._traverse(parent_path)
+        if not isinstance(parent, _GroupNode):
+            raise KeyError(NOT_FOUND.format(parent_path))
+        return parent, name
+
+    def _add_link(self, name, link):
+        """
+        Add `link` (a node or link object) at `name`
+        """
+        self._check_writable()
+        path = self._get_path(name)
+        parent, base = self._get_parent(path, create=True)
+        if base in parent.links:
+            raise ValueError(NAME_EXISTS.format(path))
+        parent.links[base] = link
+        return path
+
+    def __getitem__(self, name):
+        path = self._get_path(name)
+        return _wrap(*self._traverse(path))
+
+    def __setitem__(self, name, obj):
+        if isinstance(obj, _MemoryObject):
+            # pylint: disable=protected-access
+            self._add_link(name, obj._node)
+        elif isinstance(obj, (h5py.SoftLink, h5py.ExternalLink)):
+            self._add_link(name, obj)
+        else:
+            self.create_dataset(name, data=obj)
+
+    def __delitem__(self, name):
+        self._check_writable()
+        parent, base = self._get_parent(self._get_path(name))
+        try:
+            del parent.links[base]
+        except KeyError:
+            raise KeyError(NOT_FOUND.format(name)) from None
+
+    def __iter__(self):
+        return iter(sorted(self._node.links))
+
+    def __len__(self):
+        return len(self._node.links)
+
+    def _get_link(self, parent, name):
+        link = parent.links.get(name)
+        if link is None or isinstance(
+            link, (h5py.SoftLink, h5py.ExternalLink)
+        ):
+            return link
+        return h5py.HardLink()
+
+    def create_group(self, name):
+        node = _GroupNode()
+        path = self._add_link(name, node)
+        return MemoryGroup(self._file, node, path)
+
+    def create_dataset(
+        self, name, shape=None, dtype=None, data=None, **options
+    ):
+        maxshape = options.pop("maxshape", None)
+        fillvalue = options.pop("fillvalue", None)
+        data = get_initial_data(shape, dtype, data, fillvalue)
+        if maxshape is None:
+            maxshape = getattr(data, "shape", None)
+        else:
+            maxshape = tuple(maxshape)
+        node = _DatasetNode(data, maxshape, fillvalue, options)
+        path = self._add_link(name, node)
+        return MemoryDataset(self._file, node, path)
+
+    def __repr__(self):
+        return "<In-memory group {!r} ({} members)>".format(
+            self._name, len(self)
+        )
+
+
+def _get_option(name):
+    """
+    Return a property for the dataset storage option `name`
+    """
+    def get_option(self):
+        return self._node.options.get(name)  # pylint: disable=protected-access
+
+    return property(get_option, doc="The {} option of the dataset".format(
+        name
+    ))
+
+
+class MemoryDataset(_MemoryObject, BackendDataset):
+    """
+    A dataset in a ``MemoryBackend`` file
+    """
+    @property
+    def shape(self):
+        # pylint: disable=missing-docstring
+        return getattr(self._node.data, "shape", None)
+
+    @property
+    def dtype(self):
+        # pylint: disable=missing-docstring
+        return self._node.data.dtype
+
+    @property
+    def maxshape(self):
+        # pylint: disable=missing-docstring
+        return self._node.maxshape
+
+    @property
+    def fillvalue(self):
+        # pylint: disable=missing-docstring
+        if self._node.fillvalue is None:
+            return super().fillvalue
+        return self.dtype.type(self._node.fillvalue)
+
+    @property
+    def chunks(self):
+        # pylint: disable=missing-docstring
+        chunks = self._node.options.get("chunks")
+        if chunks is True:
+            return self.shape
+        return chunks
+
+    compression = _get_option("compression")
+    compression_opts = _get_option("compression_opts")
+    scaleoffset = _get_option("scaleoffset")
+    shuffle = _get_option("shuffle")
+    fletcher32 = _get_option("fletcher32")
+
+    def __getitem__(self, index):
+        data = self._node.data
+        if isinstance(data, h5py.Empty):
+            if index == ():
+                return data
+            raise ValueError("Empty datasets cannot be sliced.")
+        result = data[index]
+        if isinstance(result, ndarray) and not self._node.borrowed:
+            result = result.copy()
+        return result
+
+    def __setitem__(self, index, value):
+        self._check_writable()
+        self._node.data[index] = value
+
+    def resize(self, size, axis=None):
+        self._check_writable()
+        node = self._node
+        data = node.data
+        shape = get_new_shape(
+            self._name, data.shape, node.maxshape, size, axis
+        )
+        buffer = node.buffer
+        if not grows_in_place(data.shape, shape):
+            node.data = copy_resized(data, shape, self.fillvalue)
+            node.buffer = None
+        else:
+            if buffer is None or len(buffer) < shape[0]:
+                buffer = copy_resized(data, (
+                    get_capacity(len(data), shape[0]),
+                ) + shape[1:], self.fillvalue)
+            else:
+                # rows beyond the end must hold the fill value if the
+                # dataset grows again
+                buffer[shape[0]:len(data)] = self.fillvalue
+            node.data = buffer[:shape[0]]
+            node.buffer = buffer
+        node.borrowed = False
+
+    def __repr__(self):
+        return "<In-memory dataset {!r}: shape {}, type {!r}>".format(
+            self._name, self.shape, self.dtype.str
+        )
+
+
+class MemoryFile(MemoryGroup, StoredFile):
+    """
+    A file stored in a ``MemoryBackend``
+    """
+    # pylint: disable=too-many-ancestors
+    def __init__(self, backend, filename, root, mode):
+        super().__init__(self, root, "/")
+        self._backend = backend
+        self._filename = filename
+        self._root = root
+        self._mode = mode
+        self._open = True
+
+    def __repr__(self):
+        if not self._open:
+            return "<Closed in-memory file>"
+        return "<In-memory file {!r} (mode {})>".format(
+            self._filename, self._mode
+        )
+
+
+def _get_buffer(data):
+    """
+    Return a buffer of the bytes of the array `data`, without copying
+    """
+    return PickleBuffer(ascontiguousarray(data).reshape(-1).view("u1"))
+
+
+def _pack_node(node, indices, nodes, buffers):
+    """
+    Add the JSON description of `node` (and the nodes it links to) to
+    `nodes`, and the buffers of its data to `buffers`, returning its index
+    """
+    if id(node) in indices:
+        return indices[id(node)]
+    index = indices[id(node)] = len(nodes)
+    description = {"attrs": {
+        name: encode_value(value) for name, value in node.attrs.items()
+    }}
+    nodes.append(description)
+    if isinstance(node, _GroupNode):
+        links = description["group"] = {}
+        for name, link in node.links.items():
+            if isinstance(link, h5py.SoftLink):
+                links[name] = {"soft": link.path}
+            elif isinstance(link, h5py.ExternalLink):
+                links[name] = {"external": [link.filename, link.path]}
+            else:
+                links[name] = _pack_node(link, indices, nodes, buffers)
+        return index
+    dataset = description["dataset"] = {
+        "maxshape": node.maxshape, "fillvalue": encode_value(node.fillvalue),
+        "options": {
+            option: encode_value(value)
+            for option, value in node.options.items()
+        },
+    }
+    if isinstance(node.data, h5py.Empty):
+        dataset["empty"] = format.dtype_to_descr(node.data.dtype)
+    else:
+        data = to_storable(node.data)
+        dataset["dtype"] = format.dtype_to_descr(data.dtype)
+        dataset["shape"] = data.shape
+        dataset["buffer"] = len(buffers)
+        buffers.append(_get_buffer(data))
+    return index
+
+
+def _unpack_node(index, nodes, unpacked, buffers):
+    """
+    Return the node described by ``nodes[index]``, using the data in
+    `buffers`
+    """
+    if unpacked[index] is not None:
+        return unpacked[index]
+    description = nodes[index]
+    if "group" in description:
+        node = unpacked[index] = _GroupNode()
+        for name, link in description["group"].items():
+            if isinstance(link, int):
+                link = _unpack_node(link, nodes, unpacked, buffers)
+            elif "soft" in link:
+                link = h5py.SoftLink(link["soft"])
+            else:
+                link = h5py.ExternalLink(*link["external"])
+            node.links[name] = link
+    else:
+        dataset = description["dataset"]
+        if "empty" in dataset:
+            data = h5py.Empty(format.descr_to_dtype(dataset["empty"]))
+        else:
+            data = frombuffer(
+                buffers[dataset["buffer"]],
+                dtype=format.descr_to_dtype(dataset["dtype"]),
+            ).reshape(dataset["shape"])
+        maxshape = dataset["maxshape"]
+        node = unpacked[index] = _DatasetNode(
+            data, None if maxshape is None else tuple(maxshape),
+            decode_value(dataset["fillvalue"]), {
+                option: decode_value(value)
+                for option, value in dataset["options"].items()
+            }, borrowed=True,
+        )
+    node.attrs.update(
+        (name, decode_value(value))
+        for name, value in description["attrs"].items()
+    )
+    return node
+
+
+def _pack_file(root, buffer_callback=None):
+    """
+    Serialize the file with root node `root`, see ``MemoryBackend.to_bytes``
+    """
+    nodes = []
+    buffers = []
+    _pack_node(root, {}, nodes, buffers)
+    in_band = [
+        buffer_callback is None or bool(buffer_callback(buffer))
+        for buffer in buffers
+    ]
+    header = json.dumps({
+        "nodes": nodes, "in_band": in_band,
+        "sizes": [buffer.raw().nbytes for buffer in buffers],
+    }).encode("utf-8")
+    return b"".join([
+        MEMORY_IMAGE_MAGIC, MEMORY_IMAGE_HEADER.pack(
+            MEMORY_IMAGE_VERSION, len(header)
+        ), header,
+    ] + [
+        buffer.raw() for buffer, band in zip(buffers, in_band) if band
+    ])
+
+
+def _unpack_file(data, buffers=None):
+    """
+    Deserialize a file serialized by ``_pack_file``, returning its root node
+    """
+    data = memoryview(data).cast("B")
+    start = len(MEMORY_IMAGE_MAGIC)
+    end = start + MEMORY_IMAGE_HEADER.size
+    if data[:start] != MEMORY_IMAGE_MAGIC or len(data) < end:
+        raise ValueError(INVALID_IMAGE)
+    version, header_size = MEMORY_IMAGE_HEADER.unpack(data[start:end])
+    if version != MEMORY_IMAGE_VERSION:
+        raise ValueError(UNSUPPORTED_IMAGE_VERSION.format(version))
+    header = json.loads(bytes(data[end:end + header_size]).decode("utf-8"))
+    offset = end + header_size
+    out_of_band = iter(() if buffers is None else buffers)
+    node_buffers = []
+    for size, band in zip(header["sizes"], header["in_band"]):
+        if band:
+            node_buffers.append(data[offset:offset + size])
+            offset += size
+        else:
+            try:
+                node_buffers.append(memoryview(next(out_of_band)))
+            except StopIteration:
+                raise ValueError(MISSING_BUFFERS) from None
+    nodes = header["nodes"]
+    return _unpack_node(0, nodes, [None] * len(nodes), node_buffers)
@@ -0,0 +1,245 @@
+# coding: utf-8
+"""
+Opening files (or serialized in-memory files) wrapped with h5preserve, and
+loading members from many files in parallel.
+"""
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import chain, islice
+import os
+from warnings import warn
+
+import h5py
+
+from ._utils import (
+    H5PRESERVE_CATALOG, H5PY_FS_STRATEGY_SUPPORTED, H5PreserveWarning,
+)
+from ._backend import HDF5Backend, HDF5_BACKEND, open_image
+from ._memory import MemoryBackend, MEMORY_IMAGE_MAGIC
+from .backends import copy_tree
+from ._groups import H5PreserveFile
+
+FS_STRATEGY_NOT_SUPPORTED = (
+    "Free space strategies are not supported by this version of h5py."
+)
+SERIALIZED_FILENAME = "serialized"
+
+
+def open(
+    filename, registries, *, mode, overwrite=False, swmr=False,
+    catalog=False, backend=None, **kwargs
+):
+    """
+    Open a hdf5 file wrapped with h5preserve.
+
+    Parameters
+    ----------
+    filename : string, or other identifier accepted by ``h5py.File``
+    registries : RegistryContainer
+        the collection of registries that you want to use to read from the hdf5
+        file
+    overwrite : bool
+        if True, assigning to an existing key overwrites the existing datasets
+        in place where possible, see ``H5PreserveGroup``. When creating a new
+        file, this also defaults the file to using a persistent free-space
+        strategy (``fs_strategy="fsm"``, ``fs_persist=True``), so that space
+        freed by replaced objects is reused, even after the file is reopened.
+    swmr : bool
+        if True, open the file for single-writer multiple-reader (SWMR) use.
+        When reading (``mode="r"``), the file is opened in SWMR read mode, and
+        ``H5PreserveFile.refresh`` picks up data written since the file was
+        opened. When writing, the file is opened with the latest file format
+        needed for SWMR, and ``H5PreserveFile.start_swmr`` should be called
+        once all the objects in the file have been created.
+    catalog : bool
+        if True and the file is writable, create a catalog of the objects in
+        the file if it does not already have one, see
+        ``H5PreserveFile.create_catalog``. Files with a catalog always have it
+        kept up to date.
+    backend : ``h5preserve.backends.Backend``, optional
+        the storage backend used to open the file, by default the file is a
+        HDF5 file opened with h5py. The `overwrite` free-space strategy,
+        `swmr` and `catalog` options only apply to HDF5 files.
+    **kwargs
+        additional keyword arguments to pass to ``h5py.File`` (or the
+        ``open`` method of `backend`)
+    """
+    if backend is None:
+        backend = HDF5_BACKEND
+    hdf5 = isinstance(backend, HDF5Backend)
+    if hdf5 and overwrite and mode in {"w", "w-", "x"} and (
+        "fs_strategy" not in kwargs
+    ):
+        if H5PY_FS_STRATEGY_SUPPORTED:
+            kwargs["fs_strategy"] = "fsm"
+            kwargs.setdefault("fs_persist", True)
+        else:
+            warn(FS_STRATEGY_NOT_SUPPORTED, H5PreserveWarning)
+    if hdf5 and swmr:
+        kwargs.setdefault("libver", "latest")
+        if mode == "r":
+            kwargs["swmr"] = True
+    h5preserve_file = H5PreserveFile(
+        backend.open(filename, mode=mode, **kwargs), registries,
+        overwrite=overwrite, backend=backend, open_kwargs=kwargs,
+    )
+    if hdf5 and catalog and mode != "r":
+        h5preserve_file.create_catalog()
+    return h5preserve_file
+
+
+def open_bytes(data, registries, *, mode="r", overwrite=False):
+    """
+    Open a file from bytes returned by ``H5PreserveFile.to_bytes``, fully in
+    memory without touching the filesystem.
+
+    Parameters
+    ----------
+    data : bytes-like
+        the contents of the file
+    registries : RegistryContainer
+        the collection of registries that you want to use to read from the
+        file
+    mode : string
+        ``"r"`` to open the file read-only, or ``"r+"`` to allow changes,
+        which only affect the in-memory copy of the file (use
+        ``H5PreserveFile.to_bytes`` to get the modified contents)
+    overwrite : bool
+        see ``h5preserve.open``
+    """
+    if bytes(memoryview(data)[:len(MEMORY_IMAGE_MAGIC)]) == (
+        MEMORY_IMAGE_MAGIC
+    ):
+        backend = MemoryBackend()
+        backend.from_bytes(
+            SERIALIZED_FILENAME, data if mode == "r" else bytearray(data)
+        )
+        return open(
+            SERIALIZED_FILENAME, registries, mode=mode, overwrite=overwrite,
+            backend=backend,
+        )
+    return H5PreserveFile(
+        open_image(data, mode=mode), registries, overwrite=overwrite
+    )
+
+
+def _copy_members(path, keys, kwargs):
+    """
+    Copy the members `keys` (or all the members) of the HDF5 file at `path`
+    into an in-memory file, returning the backend holding it
+    """
+    backend = MemoryBackend()
+    with h5py.File(path, mode="r", **kwargs) as h5py_file, backend.open(
+        SERIALIZED_FILENAME, mode="x"
+    ) as memory_file:
+        if keys is None:
+            keys = [key for key in h5py_file if key != H5PRESERVE_CATALOG]
+        copy_tree(
+            h5py_file, memory_file,
+            members=[key for key in keys if key in h5py_file],
+        )
+    return backend
+
+
+def _read_members(path, keys, kwargs):
+    """
+    Copy the members `keys` (or all the members) of the HDF5 file at `path`
+    into an in-memory file, and return it serialized, see ``open_many``
+    """
+    return _copy_members(path, keys, kwargs).to_bytes(SERIALIZED_FILENAME)
+
+
+def _load_members(backend, registries, keys):
+    """
+    Load the members `keys` (or all the members) of the in-memory file
+    written by ``_copy_members``
+    """
+    memory_file = backend.open(SERIALIZED_FILENAME, mode="r")
+    # pylint: disable=protected-access
+    return {
+        key: registries._load_serialized(memory_file[key])
+        for key in (memory_file if keys is None else keys)
+        if key in memory_file
+    }
+
+
+def open_many(
+    paths, registries, *, keys=None, workers=None, max_in_flight=None,
+    **kwargs
+):
+    """
+    Load members from many files in parallel, yielding the results for each
+    file as soon as it has been read.
+
+    Each file is opened and read in a process pool, where the requested
+    members are copied into an in-memory file which is sent back (see
+    ``H5PreserveFile.to_bytes``) and loaded with `registries` in this
+    process, so the registries do not need to be picklable. At most
+    `max_in_flight` files are read ahead of the results consumed, which
+    bounds the memory used. With a single worker, or a single file, starting
+    and sending data to another process would only add overhead, so the
+    files are instead read one at a time in this process.
+
+    Parameters
+    ----------
+    paths : iterable of strings
+        the HDF5 files to read, which can be a generator
+    registries : RegistryContainer
+        the registries used to load the members
+    keys : iterable of strings, optional
+        the names (or paths) of the members to load from each file, defaults
+        to all the top-level members. Members missing from a file are
+        skipped.
+    workers : int, optional
+        the number of processes, defaulting to the number of CPUs
+    max_in_flight : int, optional
+        the most files being read, or read but not yet yielded, at once,
+        defaulting to twice `workers`
+    **kwargs
+        additional keyword arguments to pass to ``h5py.File``
+
+    Yields
+    ------
+    path, dict
+        each path (in the order the files finish being read), and a mapping
+        of keys to the loaded members
+    """
+    if keys is not None:
+        keys = list(keys)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+    paths = iter(paths)
+    first = list(islice(paths, 2))
+    paths = chain(first, paths)
+    if workers == 1 or len(first) < 2:
+        for path in paths:
+            yield path, _load_members(
+                _copy_members(os.fspath(path), keys, kwargs), registries,
+                keys,
+            )
+        return
+    pending = {}
+    with ProcessPoolExecutor(workers) as executor:
+
+        def submit(count):
+            for path in islice(paths, count):
+                pending[executor.submit(
+                    _read_members, os.fspath(path), keys, kwargs
+                )] = path
+
+        try:
+            submit(max_in_flight)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                results = [
+                    (pending.pop(future), future.result()) for future in done
+                ]
+                for path, data in results:
+                    backend = MemoryBackend()
+                    backend.from_bytes(SERIALIZED_FILENAME, data)
+                    yield path, _load_members(backend, registries, keys)
+                    submit(1)
+        finally:
+            for future in pending:
+                future.cancel()
@@ -6,19 +6,43 @@ Internal utilities for h5preserve
 :license: 3-clause BSD
 """
 from collections import namedtuple
-from collections.abc import Callable
+from collections.abc import Callable, Mapping
+from fnmatch import fnmatchcase
+from hashlib import blake2b
+from inspect import signature
+import posixpath
+from warnings import catch_warnings, simplefilter
 
-from numpy import ndarray, number as npnumber, bool_ as npbool
+from numpy import (
+    ndarray, number as npnumber, bool_ as npbool, asarray, ascontiguousarray,
+    array_equal, dtype as npdtype, prod,
+    count_nonzero, isnan, nanmin, nanmax, fmin, fmax, arange,
+)
 import h5py
 
+from .backends import BackendGroup, BackendDataset
+
 H5PRESERVE_ATTR_NAMESPACE = "_h5preserve_namespace"
 H5PRESERVE_ATTR_LABEL = "_h5preserve_label"
 H5PRESERVE_ATTR_VERSION = "_h5preserve_version"
 H5PRESERVE_ATTR_ON_DEMAND = "_h5preserve_on_demand"
+H5PRESERVE_ATTR_CONTENT_HASH = "_h5preserve_content_hash"
+H5PRESERVE_ATTR_APPENDABLE = "_h5preserve_appendable"
+H5PRESERVE_ATTR_STATISTICS = "_h5preserve_statistics_"
+H5PRESERVE_CATALOG = "_h5preserve_catalog"
+H5PRESERVE_BATCH = "_h5preserve_batch"
+
+CONTENT_HASH_SIZE = 16
+APPENDABLE_CHUNK_BYTES = 2 ** 16
+NOT_APPENDABLE = "Appendable datasets must have at least one dimension."
+
+STATISTICS_FIELDS = ("min", "max", "count", "nan_count")
+CHUNK_STATISTICS_FIELDS = ("chunk_min", "chunk_max")
+CHUNK_STATISTICS_MAX_CHUNKS = 4096
 
 EXTERNAL_DUMPED_TYPES = {
-    h5py.Group,
-    h5py.Dataset,
+    BackendGroup,
+    BackendDataset,
     h5py.SoftLink,
     h5py.ExternalLink,
     ndarray,
@@ -38,23 +62,49 @@ H5PY_ATTR_WRITABLE_TYPES = {
     bytes,
 }
 
+UNSHARED_TYPES = {
+    int,
+    float,
+    complex,
+    bool,
+    str,
+    bytes,
+    type(None),
+    npnumber,
+    npbool,
+}
+
+H5PY_FS_STRATEGY_SUPPORTED = (
+    "fs_strategy" in signature(h5py.File.__init__).parameters
+)
+
 DumperMap = namedtuple("DumperMap", "label func")
 
 
-def get_group_items(h5py_obj, attrs, registries, load_on_demand):
+def get_group_items(
+    h5py_obj, attrs, registries, load_on_demand, *, members=None, lazy=False
+):
     """
-    Return group items considering the use of on-demand support
+    Return group items considering the use of on-demand support, only
+    including those in `members` if it is not None, and returning all items
+    on demand if `lazy` is True
     """
-    if attrs.get(H5PRESERVE_ATTR_ON_DEMAND, False) and not load_on_demand:
+    if members is None:
+        names = list(h5py_obj)
+    else:
+        names = [name for name in members if name in h5py_obj]
+    if lazy or (
+        attrs.get(H5PRESERVE_ATTR_ON_DEMAND, False) and not load_on_demand
+    ):
         return {
             name: get_on_demand_group_item(h5py_obj, name, registries)
-            for name in h5py_obj
+            for name in names
         }
     return {
         # pylint: disable=protected-access
-        name: registries._h5py_to_h5preserve(item)
+        name: registries._h5py_to_h5preserve(h5py_obj[name])
         # pylint: enable=protected-access
-        for name, item in h5py_obj.items()
+        for name in names
     }
 
 
@@ -86,18 +136,21 @@ def get_dataset_data(h5py_obj, attrs, load_on_demand):
     return h5py_obj[()]
 
 
-def on_demand_group_dumper_generator(registry_container, h5py_group):
+def on_demand_group_dumper_generator(
+    registry_container, h5py_group, writer=None
+):
     """
     Generate the support function for on-demand dumping for the dumpable
     object.
     """
+    if writer is None:
+        writer = registry_container.to_file
+
     def on_demand_dumper(key, val):
         """
         Support function for on-demand dumping
         """
-        registry_container.to_file(
-            h5py_group, key, registry_container.dump(val)
-        )
+        writer(h5py_group, key, registry_container.dump(val))
         return get_on_demand_group_item(h5py_group, key, registry_container)
     return on_demand_dumper
 
@@ -145,6 +198,473 @@ def is_h5py_writable(obj):
     return False
 
 
+def is_attr_equal(attr, val):
+    """
+    Return if the existing hdf5 attr `attr` is the same as `val`
+    """
+    try:
+        return bool(array_equal(attr, val))
+    except (TypeError, ValueError):
+        return False
+
+
+def is_shareable(obj):
+    """
+    Return if `obj` can be shared between multiple locations when dumped.
+    """
+    if isinstance(obj, tuple(UNSHARED_TYPES)):
+        return False
+    return True
+
+
+def _reduce_chunks(ufunc, data, chunks):
+    """
+    Reduce each chunk of `data` (including partial chunks at the edges) to a
+    single value with `ufunc`, one axis at a time, so that `data` is not
+    copied
+    """
+    for axis, chunk in enumerate(chunks):
+        data = ufunc.reduceat(
+            data, arange(0, data.shape[axis], chunk), axis=axis
+        )
+    return data
+
+
+def get_statistics(data, chunks=None):
+    """
+    Return summary statistics of the numeric array `data` as a mapping of
+    attribute names to values, or an empty mapping if `data` is not numeric.
+
+    If `chunks` is given, the minimum and maximum of each chunk are also
+    included, as arrays with one element per chunk, unless there are more
+    than ``CHUNK_STATISTICS_MAX_CHUNKS`` chunks.
+    """
+    if data.dtype.kind not in "iuf" or not data.size:
+        return {}
+    statistics = {"count": data.size, "nan_count": 0}
+    if data.dtype.kind == "f":
+        statistics["nan_count"] = int(count_nonzero(isnan(data)))
+    with catch_warnings():
+        # all-nan data/chunks produce nan with a warning, which is fine
+        simplefilter("ignore", RuntimeWarning)
+        statistics["min"] = nanmin(data)
+        statistics["max"] = nanmax(data)
+        if chunks is not None and data.ndim:
+            grid = tuple(
+                -(-length // chunk)
+                for length, chunk in zip(data.shape, chunks)
+            )
+            if prod(grid) <= CHUNK_STATISTICS_MAX_CHUNKS:
+                statistics["chunk_min"] = _reduce_chunks(fmin, data, chunks)
+                statistics["chunk_max"] = _reduce_chunks(fmax, data, chunks)
+    return {
+        H5PRESERVE_ATTR_STATISTICS + name: value
+        for name, value in statistics.items()
+    }
+
+
+class DatasetStatistics(namedtuple(
+    "DatasetStatistics", "min max count nan_count chunks chunk_min chunk_max"
+)):
+    """
+    Summary statistics of a dataset, stored when it was written.
+
+    Attributes
+    ----------
+    min, max : number
+        the minimum and maximum of the non-nan values of the dataset (nan if
+        all the values are nan)
+    count : int
+        the number of values in the dataset
+    nan_count : int
+        the number of nan values in the dataset
+    chunks : tuple or None
+        the chunk shape of the dataset
+    chunk_min, chunk_max : numpy.ndarray or None
+        the minimum and maximum of each chunk, with one element per chunk
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_h5py(cls, h5py_dataset):
+        """
+        Return the statistics stored on `h5py_dataset`, or None if there are
+        none
+        """
+        attrs = h5py_dataset.attrs
+        values = {
+            name: attrs.get(H5PRESERVE_ATTR_STATISTICS + name)
+            for name in STATISTICS_FIELDS + CHUNK_STATISTICS_FIELDS
+        }
+        if values["min"] is None:
+            return None
+        return cls(chunks=h5py_dataset.chunks, **values)
+
+    def may_contain(self, low=None, high=None):
+        """
+        Return whether the dataset may contain values between `low` and
+        `high` (inclusive), where either bound can be None.
+        """
+        if low is not None and self.max < low:
+            return False
+        if high is not None and self.min > high:
+            return False
+        return True
+
+    def chunks_in_range(self, low=None, high=None):
+        """
+        Return the selections (tuples of slices) of the chunks of the dataset
+        which may contain values between `low` and `high` (inclusive). If
+        there are no per-chunk statistics, the whole dataset is returned as
+        the selection ``()`` unless it does not contain any such values.
+        """
+        if self.chunk_min is None:
+            return [()] if self.may_contain(low, high) else []
+        mask = ~isnan(self.chunk_min)  # false for all-nan chunks
+        if low is not None:
+            mask &= self.chunk_max >= low
+        if high is not None:
+            mask &= self.chunk_min <= high
+        return [
+            tuple(
+                slice(index * chunk, (index + 1) * chunk)
+                for index, chunk in zip(chunk_index, self.chunks)
+            ) for chunk_index in zip(*mask.nonzero())
+        ]
+
+
+class WriteSession:
+    # one attribute per write option, plus the objects seen so far
+    # pylint: disable=too-many-instance-attributes
+    """
+    State shared between the dump and write steps of a single write, used to
+    find objects which have already been dumped or written.
+    """
+    def __init__(self):
+        self._dumped = {}
+        self._written = {}
+        self._payload_digests = {}
+        self._dirty_tracked = {}
+        self.deduplicate = False
+        self.hash_contents = False
+        self.skip_clean = False
+        self.statistics = False
+        self.track_times = None
+        self.external_base = None
+
+    def get_dumped(self, obj):
+        """
+        Return the dumped representation of `obj` if it has already been
+        dumped, otherwise None.
+        """
+        try:
+            return self._dumped[id(obj)][1]
+        except KeyError:
+            return None
+
+    def add_dumped(self, obj, dumped_obj):
+        """
+        Record the dumped representation of `obj`.
+        """
+        # keep obj alive so that its id is not reused during the session
+        self._dumped[id(obj)] = (obj, dumped_obj)
+
+    def get_written(self, val):
+        """
+        Return the h5py object `val` was written to if it has already been
+        written, otherwise None.
+        """
+        try:
+            return self._written[id(val)][1]
+        except KeyError:
+            return None
+
+    def add_written(self, val, h5py_obj):
+        """
+        Record the h5py object which `val` was written to.
+        """
+        self._written[id(val)] = (val, h5py_obj)
+
+    def add_payload_digest(self, val, digest):
+        """
+        Record the digest (or a future for the digest) of the payload of
+        `val`.
+        """
+        self._payload_digests[id(val)] = (val, digest)
+
+    def get_payload_digest(self, val):
+        """
+        Return the digest of the payload of `val` if it has already been
+        computed, otherwise None.
+        """
+        try:
+            digest = self._payload_digests[id(val)][1]
+        except KeyError:
+            return None
+        if isinstance(digest, bytes):
+            return digest
+        return digest.result()
+
+    def add_dirty_tracked(self, obj, val):
+        """
+        Record that `obj`, which supports dirty tracking, has been dumped to
+        `val`.
+        """
+        self._dirty_tracked[id(obj)] = (obj, val)
+
+    def mark_clean(self):
+        """
+        Mark all dumped objects which support dirty tracking as clean,
+        returning a list of the objects which were written together with the
+        h5py object each was written to.
+        """
+        written = []
+        for obj, val in self._dirty_tracked.values():
+            obj._h5preserve_dirty = False  # pylint: disable=protected-access
+            h5py_obj = self.get_written(val)
+            if h5py_obj is not None:
+                written.append((obj, h5py_obj))
+        return written
+
+
+class UnchangedObject:
+    """
+    Placeholder for an object which has not changed since it was last
+    written, and so does not need to be dumped.
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, obj):
+        self.obj = obj
+
+
+def get_appendable_options(options):
+    """
+    Return the options to create a dataset which can be appended to along its
+    first axis.
+    """
+    options = dict(options)
+    if "data" in options:
+        data = asarray(options["data"])
+        shape, dtype = data.shape, data.dtype
+    else:
+        shape = tuple(options["shape"])
+        dtype = npdtype(options.get("dtype", "f4"))
+    if not shape:
+        raise ValueError(NOT_APPENDABLE)
+    row_shape = tuple(shape[1:])
+    options.setdefault("maxshape", (None,) + row_shape)
+    if options.get("chunks") in (None, True):
+        row_bytes = max(int(dtype.itemsize * prod(row_shape)), 1)
+        options["chunks"] = (
+            max(APPENDABLE_CHUNK_BYTES // row_bytes, 1),
+        ) + row_shape
+    return options
+
+
+def get_payload(val):
+    """
+    Return the array which would be written for `val` if it can be content
+    hashed, otherwise None.
+    """
+    if isinstance(val, ndarray):
+        data = val
+    elif isinstance(val, Mapping) and "data" in val:
+        data = val["data"]
+        if isinstance(data, (h5py.Empty, OnDemandWrapper)):
+            return None
+        data = asarray(data)
+    else:
+        return None
+    if data.dtype.hasobject:
+        return None
+    return data
+
+
+def hash_payload(data):
+    """
+    Return the digest of the contents of the array `data`.
+
+    This is the expensive part of content hashing, and releases the GIL for
+    large arrays so can be run in a thread pool.
+    """
+    payload_hash = blake2b(digest_size=CONTENT_HASH_SIZE)
+    payload_hash.update(data.dtype.str.encode("utf-8"))
+    payload_hash.update(repr(data.shape).encode("utf-8"))
+    payload_hash.update(memoryview(ascontiguousarray(data)).cast("B"))
+    return payload_hash.digest()
+
+
+def _update_hash(hasher, value):
+    """
+    Add a canonical encoding of `value` to `hasher`.
+    """
+    if isinstance(value, (ndarray, npnumber, npbool)):
+        hasher.update(b"a")
+        hasher.update(hash_payload(asarray(value)))
+    elif isinstance(value, Mapping):
+        hasher.update(b"m")
+        for key in sorted(value, key=str):
+            _update_hash(hasher, key)
+            _update_hash(hasher, value[key])
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b"l")
+        for item in value:
+            _update_hash(hasher, item)
+        hasher.update(b"e")
+    else:
+        hasher.update(b"v")
+        hasher.update(repr(value).encode("utf-8"))
+    hasher.update(b"|")
+
+
+def content_hash(payload_digest, metadata):
+    """
+    Combine the digest of a payload with the metadata written alongside it,
+    returning the content hash to be stored in the file.
+    """
+    combined_hash = blake2b(payload_digest, digest_size=CONTENT_HASH_SIZE)
+    _update_hash(combined_hash, metadata)
+    return combined_hash.hexdigest()
+
+
+class DeduplicationStats:
+    """
+    Statistics about content-hash deduplication of datasets.
+
+    Attributes
+    ----------
+    datasets_hashed : int
+        the number of datasets which were content hashed
+    bytes_hashed : int
+        the number of bytes of dataset payloads which were hashed
+    datasets_linked : int
+        the number of datasets written as hard links to an existing dataset
+    bytes_saved : int
+        the storage size of the datasets which did not need to be written
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Reset all the statistics to zero.
+        """
+        # pylint: disable=attribute-defined-outside-init
+        self.datasets_hashed = 0
+        self.bytes_hashed = 0
+        self.datasets_linked = 0
+        self.bytes_saved = 0
+
+    def __repr__(self):
+        return (
+            "DeduplicationStats(datasets_hashed={0.datasets_hashed}, "
+            "bytes_hashed={0.bytes_hashed}, "
+            "datasets_linked={0.datasets_linked}, "
+            "bytes_saved={0.bytes_saved})"
+        ).format(self)
+
+
+class IncrementalStats:
+    # pylint: disable=too-few-public-methods
+    """
+    Statistics about an incremental write.
+
+    Attributes
+    ----------
+    unchanged : int
+        the number of groups and datasets which did not need to be written
+    updated : int
+        the number of datasets which were overwritten in place
+    written : int
+        the number of groups and datasets which were newly written (including
+        those replaced as they could not be overwritten in place)
+    """
+    def __init__(self):
+        self.unchanged = 0
+        self.updated = 0
+        self.written = 0
+
+    def __repr__(self):
+        return (
+            "IncrementalStats(unchanged={0.unchanged}, "
+            "updated={0.updated}, written={0.written})"
+        ).format(self)
+
+
+def create_group(h5py_group, key, track_times=True):
+    """
+    Create the group `key` in `h5py_group`, optionally without recording its
+    modification times (only supported by the HDF5 backend)
+    """
+    if track_times or not isinstance(h5py_group, h5py.Group):
+        return h5py_group.create_group(key)
+    gcpl = h5py.h5p.create(h5py.h5p.GROUP_CREATE)
+    gcpl.set_obj_track_times(False)
+    lcpl = h5py.h5p.create(h5py.h5p.LINK_CREATE)
+    lcpl.set_create_intermediate_group(True)
+    return h5py.Group(h5py.h5g.create(
+        h5py_group.id, key.encode("utf-8"), lcpl=lcpl, gcpl=gcpl
+    ))
+
+
+def open_member(h5py_group, key):
+    """
+    Return the member `key` of `h5py_group`, opening it via the low-level
+    h5py API which avoids much of the overhead of ``h5py.Group.__getitem__``
+    """
+    if not isinstance(h5py_group, h5py.Group):
+        return h5py_group[key]
+    object_id = h5py.h5o.open(h5py_group.id, key.encode("utf-8"))
+    if isinstance(object_id, h5py.h5d.DatasetID):
+        return h5py.Dataset(object_id)
+    if isinstance(object_id, h5py.h5g.GroupID):
+        return h5py.Group(object_id)
+    return h5py_group[key]
+
+
+def _is_pattern(name):
+    """
+    Return whether the path component `name` contains glob characters
+    """
+    return any(char in name for char in "*?[")
+
+
+def match_paths(h5py_group, pattern):
+    """
+    Return the paths (relative to `h5py_group`) of the objects matching the
+    glob-style `pattern`, where each component of the pattern is matched
+    against the names of the members of the groups matched so far, so that
+    only groups on matching branches are opened.
+    """
+    components = [name for name in pattern.split("/") if name]
+    if not components:
+        return []
+    matches = [("", h5py_group)]
+    for i, component in enumerate(components):
+        last = i == len(components) - 1
+        new_matches = []
+        for path, group in matches:
+            if _is_pattern(component):
+                names = sorted(
+                    name for name in group if fnmatchcase(name, component)
+                )
+                if group.name == "/" and H5PRESERVE_CATALOG in names:
+                    names.remove(H5PRESERVE_CATALOG)
+            elif component in group:
+                names = [component]
+            else:
+                names = []
+            for name in names:
+                if last:
+                    new_matches.append((posixpath.join(path, name), None))
+                    continue
+                member = group.get(name)
+                if isinstance(member, BackendGroup):
+                    new_matches.append((posixpath.join(path, name), member))
+        matches = new_matches
+    return [path for path, _ in matches]
+
+
 class H5PreserveWarning(Warning):
     """
     Warning class for h5preserve
@@ -0,0 +1,128 @@
+# coding: utf-8
+"""
+Storage backends for h5preserve.
+
+h5preserve reads and writes through a small subset of the high-level h5py
+API, described by the abstract base classes ``BackendGroup``,
+``BackendDataset`` and ``BackendFile``. ``h5py.Group``, ``h5py.Dataset`` and
+``h5py.File`` are registered as implementations of these, so the default
+backend (``HDF5Backend``) is h5py itself, and other storage can be used by
+implementing these classes and a ``Backend`` which opens files.
+
+Links are described using the h5py link classes (``h5py.HardLink``,
+``h5py.SoftLink`` and ``h5py.ExternalLink``). Features which rely on HDF5
+itself, such as SWMR, catalogs, ``H5PreserveGroup.describe`` and
+deduplication statistics, are only available with the HDF5 backend.
+"""
+import h5py
+
+from ._backend import (
+    Backend, HDF5Backend, HDF5_BACKEND, BackendObject, BackendGroup,
+    BackendDataset, BackendFile, open_image, get_image,
+)
+from ._memory import MemoryBackend
+from ._directory import DirectoryBackend
+
+__all__ = [
+    "Backend", "HDF5Backend", "BackendObject", "BackendGroup",
+    "BackendDataset", "BackendFile", "HDF5_BACKEND", "MemoryBackend",
+    "DirectoryBackend", "copy_tree", "convert", "open_image", "get_image",
+]
+
+
+def _get_dataset_options(h5py_dataset):
+    """
+    Return the options needed to recreate `h5py_dataset`
+    """
+    options = {"data": h5py_dataset[()], "dtype": h5py_dataset.dtype}
+    if h5py_dataset.shape is not None and (
+        h5py_dataset.maxshape != h5py_dataset.shape
+    ):
+        options["maxshape"] = h5py_dataset.maxshape
+    if h5py_dataset.dtype.kind in "biufc":
+        options["fillvalue"] = h5py_dataset.fillvalue
+    for option in (
+        "chunks", "compression", "compression_opts", "scaleoffset",
+        "shuffle", "fletcher32",
+    ):
+        value = getattr(h5py_dataset, option)
+        if value:
+            options[option] = value
+    return options
+
+
+def copy_tree(source, destination, *, skip=(), members=None):
+    """
+    Copy the attributes and contents of the group `source` into the group
+    `destination`, which can be stored by a different backend.
+
+    Hard links within `source` are recreated in `destination`, and soft and
+    external links are copied unchanged.
+
+    Parameters
+    ----------
+    source, destination : ``BackendGroup``
+        the group to copy from, and the group to copy into
+    skip : iterable of strings
+        the names of members of `source` which are not copied
+    members : iterable of strings, optional
+        the names (or paths) of the members of `source` to copy, defaulting
+        to all of them
+    """
+    copied = {}
+    destination.attrs.update(source.attrs)
+    skip = set(skip)
+    pending = [(source, destination, [
+        name for name in (source if members is None else members)
+        if name not in skip
+    ])]
+    while pending:
+        source_group, destination_group, names = pending.pop(0)
+        for name in names:
+            link = source_group.get(name, getlink=True)
+            if isinstance(link, (h5py.SoftLink, h5py.ExternalLink)):
+                destination_group[name] = link
+                continue
+            obj = source_group[name]
+            if obj in copied:
+                destination_group[name] = destination.file[copied[obj]]
+                continue
+            if isinstance(obj, BackendGroup):
+                new_obj = destination_group.create_group(name)
+                pending.append((obj, new_obj, list(obj)))
+            else:
+                new_obj = destination_group.create_dataset(
+                    name, **_get_dataset_options(obj)
+                )
+            new_obj.attrs.update(obj.attrs)
+            copied[obj] = new_obj.name
+
+
+def convert(
+    source, destination, *, source_backend=None, destination_backend=None,
+    mode="x",
+):
+    """
+    Convert a file stored by one backend into one stored by another, such as
+    a HDF5 file (the default for both) into a ``DirectoryBackend`` directory.
+
+    Parameters
+    ----------
+    source, destination : string
+        the names of the files
+    source_backend, destination_backend : Backend, optional
+        the backends storing the files, defaulting to ``HDF5_BACKEND``
+    mode : string
+        the mode used to open `destination`
+    """
+    # pylint: disable=import-outside-toplevel
+    from ._utils import H5PRESERVE_CATALOG
+    source_backend = source_backend or HDF5_BACKEND
+    destination_backend = destination_backend or HDF5_BACKEND
+    with source_backend.open(source, mode="r") as source_file, (
+        destination_backend.open(destination, mode=mode)
+    ) as destination_file:
+        copy_tree(
+            source_file["/"], destination_file["/"],
+            skip=[H5PRESERVE_CATALOG],
+        )
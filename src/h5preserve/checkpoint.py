@@ -0,0 +1,353 @@
+# coding: utf-8
+"""
+Crash-safe checkpointing with h5preserve
+"""
+import os
+import posixpath
+import re
+
+import h5py
+
+from . import open as _open, IncrementalStats
+from ._atomic import fsync_path, atomic_replace
+
+__all__ = [
+    "fsync_path", "atomic_replace", "get_external_links",
+    "get_referenced_files", "consolidate", "CheckpointManager",
+]
+
+NO_CHECKPOINTS = "No checkpoints in {}."
+NO_CHECKPOINT = "No checkpoint for step {} in {}."
+INVALID_KEEP = "Number of checkpoints to keep must be at least 1, not {}."
+CHECKPOINT_EXISTS = "Checkpoint for step {} already exists in {}."
+
+
+def get_external_links(h5py_group):
+    """
+    Return a mapping of the paths of all external links within `h5py_group`
+    (not following any links) to the external links
+    """
+    links = {}
+    seen = set()
+    groups = [h5py_group]
+    while groups:
+        group = groups.pop()
+        for name in group:
+            path = posixpath.join(group.name, name)
+            link = group.get(name, getlink=True)
+            if isinstance(link, h5py.ExternalLink):
+                links[path] = link
+            elif isinstance(link, h5py.HardLink):
+                member = group.get(name)
+                if isinstance(member, h5py.Group):
+                    addr = h5py.h5o.get_info(member.id).addr
+                    if addr not in seen:
+                        seen.add(addr)
+                        groups.append(member)
+    return links
+
+
+def get_referenced_files(paths):
+    """
+    Return the absolute paths of the files in `paths`, and all the files they
+    (directly or indirectly) reference via external links
+    """
+    found = set()
+    pending = [os.path.abspath(path) for path in paths]
+    while pending:
+        path = pending.pop()
+        if path in found or not os.path.exists(path):
+            continue
+        found.add(path)
+        with h5py.File(path, mode="r") as h5py_file:
+            for link in get_external_links(h5py_file).values():
+                pending.append(os.path.abspath(os.path.join(
+                    os.path.dirname(path), link.filename
+                )))
+    return found
+
+
+def consolidate(path, output=None):
+    """
+    Write a self-contained copy of the file at `path`, where all objects
+    stored via external links (such as in delta checkpoints, see
+    ``CheckpointManager``) are copied into the file.
+
+    Parameters
+    ----------
+    path : string
+        the file to consolidate
+    output : string, optional
+        the path of the consolidated file. By default, the file at `path` is
+        atomically replaced with the consolidated file.
+    """
+    path = os.fspath(path)
+    with atomic_replace(
+        path if output is None else output, tag="consolidate"
+    ) as tmp_path:
+        with h5py.File(path, mode="r") as source, h5py.File(
+            tmp_path, mode="w"
+        ) as destination:
+            destination.attrs.update(source.attrs)
+            for name in source:
+                source.copy(
+                    source[name], destination, name=name,
+                    expand_external=True,
+                )
+
+
+class CheckpointManager:
+    # pylint: disable=too-many-instance-attributes
+    """
+    Manager of a rotating set of checkpoint files in a directory.
+
+    Each checkpoint is written to a temporary file in the same directory,
+    which is flushed to disk and then atomically renamed to its final name,
+    so a crash while writing a checkpoint never damages existing checkpoints.
+    Only the most recent `keep` checkpoints are kept.
+
+    Unless `copy_unchanged` is False, each top-level object also present in
+    the previous checkpoint is first copied from there (via
+    ``h5py.Group.copy``, which copies the stored, possibly compressed, data
+    directly), and then only the datasets whose content hashes differ are
+    rewritten, as with ``H5PreserveGroup.save_incremental``. As each
+    checkpoint is a new file, every object is still dumped, even if it is
+    marked as unchanged via ``_h5preserve_dirty``.
+
+    If `delta` is True, checkpoints after the first are instead written as
+    delta checkpoints, where each group or dataset which is identical to the
+    one in the previous checkpoint is stored as an ``h5py.ExternalLink`` to
+    the checkpoint that actually holds its data (see the `external_base`
+    option of ``RegistryContainer.to_file``). Checkpoints referenced by the
+    kept checkpoints are not removed when rotating, and ``consolidate`` can be
+    used to make a checkpoint self-contained again.
+
+    Parameters
+    ----------
+    directory : string
+        the directory containing the checkpoints, which is created if needed
+    registries : RegistryContainer
+        the registries used to write and read the checkpoints
+    prefix : string
+        the prefix of the names of the checkpoint files, which are named
+        ``<prefix>-<step>.h5``
+    keep : int
+        the number of checkpoints to keep
+    copy_unchanged : bool
+        whether to copy unchanged objects from the previous checkpoint
+    delta : bool
+        whether to write delta checkpoints
+    **kwargs
+        additional keyword arguments to pass to ``h5preserve.open`` when
+        writing checkpoints
+    """
+    def __init__(
+        self, directory, registries, *, prefix="checkpoint", keep=3,
+        copy_unchanged=True, delta=False, **kwargs
+    ):
+        if keep < 1:
+            raise ValueError(INVALID_KEEP.format(keep))
+        self._directory = os.fspath(directory)
+        self._registries = registries
+        self._prefix = prefix
+        self._keep = keep
+        self._copy_unchanged = copy_unchanged
+        self._delta = delta
+        self._open_kwargs = kwargs
+        self._pattern = re.compile(re.escape(prefix) + r"-(\d+)\.h5\Z")
+        os.makedirs(self._directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        """
+        The directory containing the checkpoints
+        """
+        return self._directory
+
+    @property
+    def steps(self):
+        """
+        The steps of the existing checkpoints, in increasing order
+        """
+        steps = []
+        for name in os.listdir(self._directory):
+            match = self._pattern.match(name)
+            if match is not None:
+                steps.append(int(match.group(1)))
+        return sorted(steps)
+
+    @property
+    def latest_step(self):
+        """
+        The step of the most recent checkpoint, or None if there are no
+        checkpoints
+        """
+        steps = self.steps
+        if not steps:
+            return None
+        return steps[-1]
+
+    def path(self, step):
+        """
+        Return the path of the checkpoint for `step`
+        """
+        return os.path.join(
+            self._directory, "{}-{}.h5".format(self._prefix, step)
+        )
+
+    def save(self, items, *, step=None):
+        """
+        Write a new checkpoint containing `items`.
+
+        Parameters
+        ----------
+        items : Mapping
+            mapping of the names (which can be paths) to the objects to store
+        step : int, optional
+            the step of the checkpoint, defaulting to one after the most
+            recent checkpoint (or 0 if there are none)
+
+        Returns
+        -------
+        IncrementalStats
+            statistics about what was written, where copied objects which
+            were not rewritten are counted as unchanged. For delta
+            checkpoints, the items which are stored as external links are
+            counted as unchanged and the remaining items as written.
+        """
+        previous = self.latest_step
+        if step is None:
+            step = 0 if previous is None else previous + 1
+        path = self.path(step)
+        if os.path.exists(path):
+            raise FileExistsError(CHECKPOINT_EXISTS.format(
+                step, self._directory
+            ))
+        stats = IncrementalStats()
+        with atomic_replace(path) as tmp_path, _open(
+            tmp_path, self._registries, mode="w", **self._open_kwargs
+        ) as f:
+            if self._delta and previous is not None:
+                self._write_delta(self.path(previous), f, items, stats)
+            else:
+                self._write_full(previous, f, items, stats)
+        self._rotate()
+        return stats
+
+    def _write_full(self, previous, h5preserve_file, items, stats):
+        """
+        Write `items` to `h5preserve_file` in full, copying objects from the
+        previous checkpoint where possible
+        """
+        if self._copy_unchanged and previous is not None:
+            self._copy_from(
+                self.path(previous), h5preserve_file.h5py_file, items
+            )
+        for key, val in items.items():
+            item_stats = self._registries.update_file(
+                h5preserve_file.h5py_group, key, val
+            )
+            stats.unchanged += item_stats.unchanged
+            stats.updated += item_stats.updated
+            stats.written += item_stats.written
+
+    def _write_delta(self, previous_path, h5preserve_file, items, stats):
+        """
+        Write `items` to `h5preserve_file` as a delta against the checkpoint
+        at `previous_path`
+        """
+        registries = self._registries
+        # pylint: disable=protected-access
+        with registries._session():
+            dumped = {key: registries.dump(val) for key, val in items.items()}
+        # pylint: enable=protected-access
+        with h5py.File(previous_path, mode="r") as base:
+            registries.to_file_many(
+                h5preserve_file.h5py_group, dumped, external_base=base
+            )
+        links = get_external_links(h5preserve_file.h5py_group)
+        linked = sum(
+            posixpath.join("/", key.strip("/")) in links for key in items
+        )
+        stats.unchanged += linked
+        stats.written += len(items) - linked
+
+    @staticmethod
+    def _copy_from(previous_path, h5py_file, items):
+        """
+        Copy the objects in `items` which are in the checkpoint at
+        `previous_path` into `h5py_file`
+        """
+        with h5py.File(previous_path, mode="r") as previous:
+            for key in items:
+                key = key.strip("/")
+                if key in previous:
+                    parent = posixpath.dirname(key)
+                    if parent:
+                        h5py_file.require_group(parent)
+                    previous.copy(previous[key], h5py_file, name=key)
+
+    def _rotate(self):
+        """
+        Remove all but the most recent checkpoints, and the checkpoints they
+        reference
+        """
+        steps = self.steps
+        kept = {
+            os.path.abspath(self.path(step)) for step in steps[-self._keep:]
+        }
+        if self._delta:
+            kept = get_referenced_files(kept)
+        for step in steps[:-self._keep]:
+            path = self.path(step)
+            if os.path.abspath(path) not in kept:
+                os.remove(path)
+
+    def consolidate(self, step=None):
+        """
+        Replace a (delta) checkpoint with a self-contained copy, see
+        ``consolidate``. Checkpoints which are no longer needed are then
+        removed.
+
+        Parameters
+        ----------
+        step : int, optional
+            the step of the checkpoint, defaulting to the most recent
+        """
+        consolidate(self._get_existing_path(step))
+        self._rotate()
+
+    def open(self, step=None):
+        """
+        Open a checkpoint for reading.
+
+        Parameters
+        ----------
+        step : int, optional
+            the step of the checkpoint, defaulting to the most recent
+
+        Returns
+        -------
+        H5PreserveFile
+        """
+        return _open(
+            self._get_existing_path(step), self._registries, mode="r"
+        )
+
+    def _get_existing_path(self, step):
+        """
+        Return the path of the existing checkpoint for `step`, defaulting to
+        the most recent
+        """
+        if step is None:
+            step = self.latest_step
+            if step is None:
+                raise FileNotFoundError(NO_CHECKPOINTS.format(
+                    self._directory
+                ))
+        path = self.path(step)
+        if not os.path.exists(path):
+            raise FileNotFoundError(NO_CHECKPOINT.format(
+                step, self._directory
+            ))
+        return path
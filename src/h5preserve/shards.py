@@ -0,0 +1,306 @@
+# coding: utf-8
+"""
+Writing objects split across multiple files (shards), and merging them into a
+single file via HDF5 virtual datasets
+"""
+import os
+import posixpath
+import re
+
+import h5py
+from numpy import array_equal
+
+from . import open as _open
+from ._utils import (
+    H5PRESERVE_ATTR_CONTENT_HASH, H5PRESERVE_ATTR_STATISTICS,
+    H5PRESERVE_CATALOG,
+)
+from ._atomic import atomic_replace
+
+NO_SHARDS = "No shards to merge."
+NOT_IN_ALL_SHARDS = "{} is not in all shards."
+MISMATCHED_TYPES = "{} has different types in different shards."
+MISMATCHED_SHAPES = (
+    "{} has shapes {} in different shards, which differ other than along "
+    "axis {}."
+)
+REPLICATED_DIFFERS = "{} is replicated but differs between shards."
+
+
+def _get_attrs(h5py_obj):
+    """
+    Return the attributes of `h5py_obj` which remain valid for the merged
+    object
+    """
+    return {
+        name: value for name, value in h5py_obj.attrs.items()
+        if name != H5PRESERVE_ATTR_CONTENT_HASH and (
+            not name.startswith(H5PRESERVE_ATTR_STATISTICS)
+        )
+    }
+
+
+def _get_merged_shape(name, datasets, axis):
+    """
+    Return the shape of the concatenation of `datasets` along `axis`
+    """
+    shapes = [dataset.shape for dataset in datasets]
+    first = list(shapes[0])
+    for shape in shapes[1:]:
+        other = list(shape)
+        if len(other) != len(first) or (
+            other[:axis] + other[axis + 1:] != first[:axis] + first[axis + 1:]
+        ):
+            raise ValueError(MISMATCHED_SHAPES.format(name, shapes, axis))
+    first[axis] = sum(shape[axis] for shape in shapes)
+    return tuple(first)
+
+
+def _create_virtual_dataset(h5py_group, name, datasets, paths, axis):
+    """
+    Create a virtual dataset in `h5py_group` which concatenates `datasets`
+    (stored in the files at `paths`) along `axis`
+    """
+    first = datasets[0]
+    if any(dataset.dtype != first.dtype for dataset in datasets):
+        raise ValueError(MISMATCHED_TYPES.format(first.name))
+    shape = _get_merged_shape(first.name, datasets, axis)
+    layout = h5py.VirtualLayout(shape=shape, dtype=first.dtype)
+    start = 0
+    for dataset, path in zip(datasets, paths):
+        length = dataset.shape[axis]
+        index = [slice(None)] * len(shape)
+        index[axis] = slice(start, start + length)
+        layout[tuple(index)] = h5py.VirtualSource(
+            path, dataset.name, shape=dataset.shape, dtype=dataset.dtype,
+        )
+        start += length
+    return h5py_group.create_virtual_dataset(
+        name, layout, fillvalue=first.fillvalue,
+    )
+
+
+def _is_replicated(name, replicated):
+    """
+    Return whether the dataset `name` is, or is in a group which is, in
+    `replicated`
+    """
+    return any(
+        name == path or name.startswith(path.rstrip("/") + "/")
+        for path in replicated
+    )
+
+
+def _copy_replicated(h5py_group, name, datasets):
+    """
+    Create a dataset in `h5py_group` holding the data of `datasets`, which
+    must be the same in every shard
+    """
+    first = datasets[0]
+    data = first[()]
+    for dataset in datasets[1:]:
+        if dataset.shape != first.shape or dataset.dtype != first.dtype or (
+            not array_equal(dataset[()], data)
+        ):
+            raise ValueError(REPLICATED_DIFFERS.format(first.name))
+    return h5py_group.create_dataset(name, data=data, dtype=first.dtype)
+
+
+def _merge_group(groups, paths, output_group, axis, merged, replicated):
+    """
+    Merge the members of `groups` (the same group in each shard) into
+    `output_group`
+    """
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    first = groups[0]
+    for name in first:
+        if first.name == "/" and name == H5PRESERVE_CATALOG:
+            continue
+        link = first.get(name, getlink=True)
+        if isinstance(link, (h5py.SoftLink, h5py.ExternalLink)):
+            output_group[name] = link
+            continue
+        try:
+            members = [group[name] for group in groups]
+        except KeyError:
+            raise KeyError(NOT_IN_ALL_SHARDS.format(
+                posixpath.join(first.name, name)
+            )) from None
+        addr = h5py.h5o.get_info(members[0].id).addr
+        if addr in merged:
+            output_group[name] = output_group.file[merged[addr]]
+            continue
+        if isinstance(members[0], h5py.Group):
+            new_obj = output_group.create_group(name)
+            _merge_group(members, paths, new_obj, axis, merged, replicated)
+        elif members[0].shape is None or members[0].ndim <= axis:
+            new_obj = output_group.create_dataset(
+                name, data=members[0][()], dtype=members[0].dtype,
+            )
+        elif _is_replicated(members[0].name, replicated):
+            new_obj = _copy_replicated(output_group, name, members)
+        else:
+            new_obj = _create_virtual_dataset(
+                output_group, name, members, paths, axis
+            )
+        new_obj.attrs.update(_get_attrs(members[0]))
+        merged[addr] = new_obj.name
+
+
+def merge_shards(paths, output, *, axis=0, replicated=()):
+    """
+    Merge files (shards) containing the same objects, where each shard holds
+    a slice of each array, into a single file where each array is a HDF5
+    virtual dataset concatenating the slices. Reading the merged file (for
+    example via ``RegistryContainer.from_file``) therefore loads each array as
+    if it were stored in a single dataset, while the data stays in the
+    shards.
+
+    Groups, attributes and datasets which cannot be concatenated (scalars,
+    and datasets with fewer than ``axis + 1`` dimensions) are taken from the
+    first shard, and all shards must contain the same objects. Datasets which
+    every shard holds a full copy of, such as coordinate grids, should be
+    listed in `replicated`, so that they are copied from the first shard
+    rather than concatenated (and must be the same in every shard). The
+    shards are referred to by their paths relative to the merged file, so the
+    merged file and the shards can be moved together.
+
+    Parameters
+    ----------
+    paths : list of strings
+        the shards, in the order they are concatenated
+    output : string
+        the path of the merged file, which is replaced if it exists
+    axis : int
+        the axis along which arrays are concatenated
+    replicated : iterable of strings
+        the paths of datasets (or groups of datasets) which are the same in
+        every shard, and are copied from the first shard rather than
+        concatenated
+    """
+    if not paths:
+        raise ValueError(NO_SHARDS)
+    output = os.fspath(output)
+    directory = os.path.dirname(os.path.abspath(output))
+    files = [h5py.File(path, mode="r") for path in paths]
+    try:
+        with atomic_replace(output, tag="merge") as tmp_path, h5py.File(
+            tmp_path, mode="w"
+        ) as merged:
+            merged.attrs.update(_get_attrs(files[0]))
+            _merge_group(
+                files, [
+                    os.path.relpath(os.path.abspath(path), directory)
+                    for path in paths
+                ], merged, axis, {}, [
+                    posixpath.join("/", path) for path in replicated
+                ],
+            )
+    finally:
+        for h5py_file in files:
+            h5py_file.close()
+
+
+class ShardedWriter:
+    """
+    Writer of a set of shards in a directory, for when independent processes
+    each produce a slice of the same arrays.
+
+    Each process opens its own shard via ``open`` and writes the same objects
+    to it as the other processes, containing its slice of the data. Once all
+    shards are written, ``merge`` builds a single file where each array is a
+    virtual dataset stitching together the slices from every shard (see
+    ``merge_shards``).
+
+    Parameters
+    ----------
+    directory : string
+        the directory containing the shards, which is created if needed
+    registries : RegistryContainer
+        the registries used to write the shards
+    prefix : string
+        the prefix of the names of the shard files, which are named
+        ``<prefix>-<index>.h5``
+    **kwargs
+        additional keyword arguments to pass to ``h5preserve.open`` when
+        writing shards
+    """
+    def __init__(self, directory, registries, *, prefix="shard", **kwargs):
+        self._directory = os.fspath(directory)
+        self._registries = registries
+        self._prefix = prefix
+        self._open_kwargs = kwargs
+        self._pattern = re.compile(re.escape(prefix) + r"-(\d+)\.h5\Z")
+        os.makedirs(self._directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        """
+        The directory containing the shards
+        """
+        return self._directory
+
+    @property
+    def indices(self):
+        """
+        The indices of the existing shards, in increasing order
+        """
+        indices = []
+        for name in os.listdir(self._directory):
+            match = self._pattern.match(name)
+            if match is not None:
+                indices.append(int(match.group(1)))
+        return sorted(indices)
+
+    def path(self, index):
+        """
+        Return the path of the shard with `index`
+        """
+        return os.path.join(
+            self._directory, "{}-{}.h5".format(self._prefix, index)
+        )
+
+    def open(self, index, *, mode="x"):
+        """
+        Open the shard with `index` for writing, which should only be done by
+        one process at a time.
+
+        Returns
+        -------
+        H5PreserveFile
+        """
+        return _open(
+            self.path(index), self._registries, mode=mode,
+            **self._open_kwargs
+        )
+
+    def merge(self, output=None, *, axis=0, replicated=()):
+        """
+        Merge all the shards, in order of their indices, see
+        ``merge_shards``.
+
+        Parameters
+        ----------
+        output : string, optional
+            the path of the merged file, defaulting to ``<prefix>.h5`` in the
+            directory of the shards
+        axis : int
+            the axis along which arrays are concatenated
+        replicated : iterable of strings
+            the paths of datasets (or groups of datasets) which are the same
+            in every shard, and are not concatenated
+
+        Returns
+        -------
+        string
+            the path of the merged file
+        """
+        if output is None:
+            output = os.path.join(
+                self._directory, "{}.h5".format(self._prefix)
+            )
+        merge_shards(
+            [self.path(index) for index in self.indices], output, axis=axis,
+            replicated=replicated,
+        )
+        return output
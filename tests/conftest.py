@@ -15,6 +15,7 @@ from h5preserve import (
     DatasetContainer, OnDemandGroupContainer, wrap_on_demand, OnDemandWrapper,
     OnDemandDatasetContainer, DelayedContainer,
 )
+from h5preserve.backends import MemoryBackend, DirectoryBackend
 from h5preserve.additional_registries import (
     none_python_registry, builtin_numbers_registry, builtin_text_registry,
 )
@@ -188,6 +189,10 @@ class Run:
 ###
 
 
+@pytest.fixture(params=[MemoryBackend, DirectoryBackend])
+def backend(request):
+    return request.param()
+
 @pytest.fixture
 def empty_registry():
     return Registry("empty registry")
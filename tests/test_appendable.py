@@ -0,0 +1,131 @@
+import gc
+
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer,
+    AppendableDatasetContainer, AppendableDataset,
+)
+
+
+class TestAppendable(object):
+    def test_create_empty(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_appendable.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["group"] = GroupContainer(
+                rows=AppendableDatasetContainer(shape=(0, 3), dtype=float)
+            )
+            dataset = f.h5py_group["group/rows"]
+            assert dataset.maxshape == (None, 3)
+            assert dataset.chunks == (2 ** 16 // 24, 3)
+
+    def test_scalar_not_appendable(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_appendable.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            with pytest.raises(ValueError):
+                f["group"] = GroupContainer(
+                    rows=AppendableDatasetContainer(data=1.0)
+                )
+
+    def test_append(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_appendable.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["group"] = GroupContainer(
+                rows=AppendableDatasetContainer(data=np.zeros((2, 3)))
+            )
+            rows = f["group"]["rows"]["data"]
+            assert isinstance(rows, AppendableDataset)
+            rows.append(np.ones(3))
+            rows.append(np.ones((2, 3)) * 2)
+            assert rows.shape == (5, 3)
+            assert f.h5py_group["group/rows"].shape == (2, 3)
+            assert (np.asarray(rows)[2:] == [[1] * 3, [2] * 3, [2] * 3]).all()
+            assert f.h5py_group["group/rows"].shape == (5, 3)
+
+    def test_wrong_row_shape(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_appendable.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["group"] = GroupContainer(
+                rows=AppendableDatasetContainer(shape=(0, 3), dtype=float)
+            )
+            rows = f["group"]["rows"]["data"]
+            with pytest.raises(ValueError):
+                rows.append(np.ones(4))
+
+    def test_flushed_by_chunk(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_appendable.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["group"] = GroupContainer(rows=AppendableDatasetContainer(
+                shape=(0,), dtype=float, chunks=(10,)
+            ))
+            rows = f["group"]["rows"]["data"]
+            for i in range(25):
+                rows.append(i)
+            assert f.h5py_group["group/rows"].shape == (20,)
+            assert len(rows) == 25
+
+    def test_flushed_on_close(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_appendable.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["group"] = GroupContainer(rows=AppendableDatasetContainer(
+                shape=(0,), dtype=float
+            ))
+            rows = f["group"]["rows"]["data"]
+            for i in range(5):
+                rows.append(i)
+
+        with hp_open(tmpfile, RegistryContainer(), mode='r') as f:
+            rows = f["group"]["rows"]["data"]
+            assert (rows[:] == np.arange(5)).all()
+
+    def test_append_through_temporary_handles(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_appendable.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["ts"] = GroupContainer(values=AppendableDatasetContainer(
+                shape=(0,), dtype=float
+            ))
+            for i in range(5):
+                f["ts"]["values"]["data"].append(i)
+            gc.collect()
+            assert len(f["ts"]["values"]["data"]) == 5
+
+        with hp_open(tmpfile, RegistryContainer(), mode='r') as f:
+            rows = f["ts"]["values"]["data"]
+            assert (rows[:] == np.arange(5)).all()
+
+    def test_not_deduplicated(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_appendable.h5"))
+        registries = RegistryContainer(deduplicate=True)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            for name in ["a", "b"]:
+                f[name] = GroupContainer(
+                    rows=AppendableDatasetContainer(data=np.zeros((2, 3)))
+                )
+            assert f.h5py_group["a/rows"] != f.h5py_group["b/rows"]
+            f["a"]["rows"]["data"].append(np.ones(3))
+            f["a"]["rows"]["data"].flush()
+            assert f.h5py_group["a/rows"].shape == (3, 3)
+            assert f.h5py_group["b/rows"].shape == (2, 3)
+
+    def test_stale_content_hash_removed(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_appendable.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["group"] = GroupContainer(
+                rows=AppendableDatasetContainer(data=np.zeros((2, 3)))
+            )
+        registries = RegistryContainer(deduplicate=True)
+        with hp_open(tmpfile, registries, mode='a') as f:
+            f["plain"] = np.zeros((2, 3))
+            # as written by an older version, which hashed appendables
+            f.h5py_group["group/rows"].attrs.update(
+                f.h5py_group["plain"].attrs
+            )
+            del f.h5py_group["plain"]
+            f["group"]["rows"]["data"].append(np.ones(3))
+        registries = RegistryContainer(deduplicate=True)
+        with hp_open(tmpfile, registries, mode='a') as f:
+            f["other"] = np.zeros((2, 3))
+            assert f.h5py_group["other"] != f.h5py_group["group/rows"]
+            assert f.h5py_group["other"].shape == (2, 3)
@@ -0,0 +1,52 @@
+import h5py
+import numpy as np
+
+from h5preserve import open as hp_open, RegistryContainer, GroupContainer
+from h5preserve.backends import (
+    HDF5Backend, BackendGroup, BackendDataset, BackendFile,
+)
+
+
+class RecordingBackend(HDF5Backend):
+    def __init__(self):
+        self.opened = []
+
+    def open(self, filename, *, mode, **kwargs):
+        self.opened.append((filename, mode, kwargs))
+        return super().open(filename, mode=mode, **kwargs)
+
+
+class TestHDF5Backend(object):
+    def test_h5py_registered(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_backends.h5"))
+        with h5py.File(tmpfile, mode="w") as f:
+            f["data"] = np.arange(3)
+            assert isinstance(f, BackendFile)
+            assert isinstance(f["/"], BackendGroup)
+            assert isinstance(f["data"], BackendDataset)
+            assert not isinstance(f["data"], BackendGroup)
+
+    def test_custom_backend(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_backends.h5"))
+        backend = RecordingBackend()
+        registries = RegistryContainer()
+        with hp_open(tmpfile, registries, mode='x', backend=backend) as f:
+            f["group"] = GroupContainer(data=np.arange(3))
+        with hp_open(tmpfile, registries, mode='r', backend=backend) as f:
+            assert all(f["group"].h5py_group["data"][()] == np.arange(3))
+            libver = f.h5py_file.libver
+            f.reopen()
+            assert "group" in f
+        assert [(mode, kwargs) for _, mode, kwargs in backend.opened] == [
+            ("x", {}), ("r", {}), ("r", {"libver": libver}),
+        ]
+
+    def test_hdf5_options(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_backends.h5"))
+        backend = RecordingBackend()
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', backend=backend,
+            swmr=True,
+        ):
+            pass
+        assert backend.opened[0][2]["libver"] == "latest"
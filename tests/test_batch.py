@@ -0,0 +1,164 @@
+import pytest
+
+import numpy as np
+import h5py
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer,
+    DatasetContainer, DelayedContainer,
+)
+
+
+class TestBatch(object):
+    def test_written_on_exit(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            with f.batch():
+                f["a"] = np.arange(3)
+                f["group/b"] = np.arange(4)
+                assert "a" not in f.h5py_group
+            assert all(f.h5py_group["a"][()] == np.arange(3))
+            assert all(f.h5py_group["group/b"][()] == np.arange(4))
+
+    def test_last_write_wins(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            with f.batch():
+                f["a"] = np.arange(3)
+                f["a"] = np.arange(5)
+            assert all(f.h5py_group["a"][()] == np.arange(5))
+
+    def test_subgroup(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            group = f.create_group("group")
+            with f.batch():
+                group["a"] = np.arange(3)
+                assert "a" not in group.h5py_group
+            assert all(group.h5py_group["a"][()] == np.arange(3))
+
+    def test_nested(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            with f.batch():
+                with f.batch():
+                    f["a"] = np.arange(3)
+                assert "a" not in f.h5py_group
+            assert "a" in f.h5py_group
+
+    def test_exception_discards(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            with pytest.raises(RuntimeError):
+                with f.batch():
+                    f["a"] = np.arange(3)
+                    raise RuntimeError
+            assert "a" not in f.h5py_group
+            f["a"] = np.arange(3)
+            assert "a" in f.h5py_group
+
+    def test_times_not_tracked(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            with f.batch():
+                f["group"] = GroupContainer(data=np.arange(3))
+                f["tracked"] = DatasetContainer(
+                    data=np.arange(3), track_times=True
+                )
+            for key in ["group", "group/data"]:
+                assert h5py.h5o.get_info(f.h5py_group[key].id).ctime == 0
+            assert h5py.h5o.get_info(f.h5py_group["tracked"].id).ctime != 0
+
+    def test_overwrite(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', overwrite=True
+        ) as f:
+            f["a"] = np.arange(3)
+            with f.batch():
+                f["a"] = np.arange(5)
+            assert all(f.h5py_group["a"][()] == np.arange(5))
+
+    def test_existing_without_overwrite(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["a"] = np.arange(3)
+            with pytest.raises((OSError, ValueError)):
+                with f.batch():
+                    f["a"] = np.arange(5)
+
+    def test_error_while_writing_writes_nothing(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["existing"] = np.arange(3)
+            with pytest.raises(TypeError):
+                with f.batch():
+                    f["a"] = np.arange(3)
+                    f["group/b"] = np.arange(3)
+                    f["z"] = DatasetContainer(
+                        data=np.arange(3), attrs={"bad": object()}
+                    )
+            assert list(f.h5py_group) == ["existing"]
+
+    def test_existing_key_writes_nothing(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["b"] = np.arange(3)
+            with pytest.raises(ValueError):
+                with f.batch():
+                    f["a"] = np.arange(3)
+                    f["b"] = np.arange(5)
+            assert list(f.h5py_group) == ["b"]
+            assert all(f.h5py_group["b"][()] == np.arange(3))
+
+    def test_catalog(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', catalog=True
+        ) as f:
+            with f.batch():
+                f["a"] = np.arange(3)
+                f["group/b"] = GroupContainer(c=np.arange(3))
+            assert [
+                entry.path for entry in f.list_objects(recursive=True)
+            ] == ["/a", "/group", "/group/b", "/group/b/c"]
+
+    def test_update(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            data = np.arange(3)
+            with f.batch():
+                f.update({"a": data, "b": data})
+                assert "a" not in f.h5py_group
+            assert f.h5py_group["a"] == f.h5py_group["b"]
+
+    def test_save_incremental(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f.save_incremental("group", GroupContainer(
+                a=np.arange(3), b=np.arange(3),
+            ))
+            with f.batch():
+                stats = f.save_incremental("group", GroupContainer(
+                    a=np.arange(3), b=np.arange(3) + 1,
+                ))
+                assert stats.updated == 0
+            assert stats.unchanged == 1
+            assert stats.updated == 1
+            assert all(f.h5py_group["group/b"][()] == np.arange(3) + 1)
+
+    def test_delayed(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_batch.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', overwrite=True
+        ) as f:
+            f["d"] = np.arange(2)
+            delayed = DelayedContainer()
+            with f.batch():
+                f["a"] = np.arange(3)
+                f["d"] = delayed
+            assert "d" not in f.h5py_group
+            assert "_h5preserve_batch" not in f.h5py_group
+            delayed.write_container(np.arange(4))
+            assert all(f.h5py_group["a"][()] == np.arange(3))
+            assert all(f.h5py_group["d"][()] == np.arange(4))
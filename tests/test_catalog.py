@@ -0,0 +1,186 @@
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer,
+    AppendableDatasetContainer, CatalogEntry,
+)
+
+
+class TestCatalog(object):
+    def test_hidden(self, tmpdir, experiment_registry, experiment_data):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x', catalog=True) as f:
+            f["first"] = experiment_data
+            assert "_h5preserve_catalog" in f.h5py_group
+            assert list(f) == ["first"]
+            assert len(f) == 1
+
+    def test_entries(self, tmpdir, experiment_registry, experiment_data):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x', catalog=True) as f:
+            f["first"] = experiment_data
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert f.list_objects() == [CatalogEntry(
+                path="/first", namespace="experiment", label="Experiment",
+                version=1, kind="dataset", shape=experiment_data.data.shape,
+                dtype=str(experiment_data.data.dtype),
+                nbytes=experiment_data.data.nbytes,
+            )]
+
+    def test_existing_contents(
+        self, tmpdir, experiment_registry, experiment_data
+    ):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["first"] = experiment_data
+            f["group"] = GroupContainer(data=np.arange(3))
+        with hp_open(tmpfile, registries, mode='a', catalog=True) as f:
+            assert [
+                entry.path for entry in f.list_objects(recursive=True)
+            ] == ["/first", "/group", "/group/data"]
+
+    def test_filters(self, tmpdir, experiment_registry, experiment_data):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x', catalog=True) as f:
+            f["first"] = experiment_data
+            f["group"] = GroupContainer(data=np.arange(3))
+            assert [
+                entry.path for entry in f.list_objects(label="Experiment")
+            ] == ["/first"]
+            assert [
+                entry.path for entry in f.list_objects(
+                    recursive=True, kind="dataset"
+                )
+            ] == ["/first", "/group/data"]
+
+    def test_same_without_catalog(
+        self, tmpdir, experiment_registry, experiment_data
+    ):
+        registries = RegistryContainer(experiment_registry)
+        listings = []
+        for catalog in (True, False):
+            tmpfile = str(tmpdir.join("test_catalog_{}.h5".format(catalog)))
+            with hp_open(
+                tmpfile, registries, mode='x', catalog=catalog
+            ) as f:
+                f["first"] = experiment_data
+                f.create_group("sub")["second"] = experiment_data
+                listings.append(f.list_objects(recursive=True))
+        assert listings[0] == listings[1]
+
+    def test_contains(self, tmpdir, experiment_registry, experiment_data):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x', catalog=True) as f:
+            f.require_group("a/b")["first"] = experiment_data
+            assert "a" in f
+            assert "a/b/first" in f
+            assert "first" in f["a"]["b"]
+            assert "missing" not in f
+
+    def test_delete(self, tmpdir, experiment_registry, experiment_data):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x', catalog=True) as f:
+            f["first"] = experiment_data
+            f["group"] = GroupContainer(data=np.arange(3))
+            del f["group"]
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert [
+                entry.path for entry in f.list_objects(recursive=True)
+            ] == ["/first"]
+            assert f.h5py_group["_h5preserve_catalog"].shape == (1,)
+
+    def test_many_deletes(self, tmpdir, experiment_registry, experiment_data):
+        registries = RegistryContainer(experiment_registry)
+        listings = []
+        for catalog in (True, False):
+            tmpfile = str(tmpdir.join("test_catalog_{}.h5".format(catalog)))
+            with hp_open(
+                tmpfile, registries, mode='x', catalog=catalog
+            ) as f:
+                for i in range(10):
+                    f["group{}".format(i)] = GroupContainer(
+                        a=np.arange(i), b=np.arange(i)
+                    )
+                f["first"] = experiment_data
+                for i in range(0, 10, 3):
+                    del f["group{}".format(i)]
+                del f["group4"]["a"]
+            with hp_open(tmpfile, registries, mode='r') as f:
+                listings.append(f.list_objects(recursive=True))
+        assert listings[0] == listings[1]
+        assert len(listings[0]) == 18
+
+    def test_children_kept_up_to_date(
+        self, tmpdir, experiment_registry, experiment_data
+    ):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x', catalog=True) as f:
+            f["group"] = GroupContainer(a=np.arange(3), b=np.arange(3))
+            assert list(f["group"]) == ["a", "b"]
+            f["group"]["c"] = experiment_data
+            del f["group"]["a"]
+            assert list(f["group"]) == ["b", "c"]
+            assert list(f) == ["group"]
+
+    def test_created_after_lookup(
+        self, tmpdir, experiment_registry, experiment_data
+    ):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["first"] = experiment_data
+            assert list(f) == ["first"]
+            f.create_catalog()
+            f["second"] = experiment_data
+            assert list(f) == ["first", "second"]
+            assert len(f.list_objects()) == 2
+
+    def test_overwrite(self, tmpdir, experiment_registry, experiment_data):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(
+            tmpfile, registries, mode='x', catalog=True, overwrite=True
+        ) as f:
+            f["group"] = GroupContainer(a=np.arange(3), b=np.arange(3))
+            f["group"] = GroupContainer(a=np.arange(5))
+            assert [
+                (entry.path, entry.shape)
+                for entry in f.list_objects(recursive=True)
+            ] == [("/group", None), ("/group/a", (5,))]
+
+    def test_appendable(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_catalog.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', catalog=True
+        ) as f:
+            f["values"] = AppendableDatasetContainer(shape=(0,), dtype=float)
+            values = f["values"]["data"]
+            values.append(np.arange(10.0))
+            f.flush()
+            assert f.list_objects()[0].shape == (10,)
+
+    def test_same_without_catalog_backend(
+        self, tmpdir, backend, experiment_registry, experiment_data
+    ):
+        registries = RegistryContainer(experiment_registry)
+        listings = []
+        for catalog in (True, False):
+            tmpfile = str(tmpdir.join("test_catalog_{}".format(catalog)))
+            with hp_open(
+                tmpfile, registries, mode='x', catalog=catalog,
+                backend=backend,
+            ) as f:
+                f["first"] = experiment_data
+                f.create_group("sub")["second"] = experiment_data
+                listings.append(f.list_objects(recursive=True))
+        assert [entry.path for entry in listings[0]] == [
+            "/first", "/sub", "/sub/second",
+        ]
+        assert listings[0] == listings[1]
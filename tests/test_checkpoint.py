@@ -0,0 +1,166 @@
+import os
+
+import pytest
+
+import numpy as np
+import h5py
+
+from h5preserve import RegistryContainer, GroupContainer, DatasetContainer
+from h5preserve.checkpoint import CheckpointManager, consolidate
+
+
+def make_state(step):
+    return GroupContainer(
+        weights=DatasetContainer(
+            data=np.arange(1000.0), compression="gzip",
+        ),
+        step=np.array([step]),
+    )
+
+
+class TestCheckpointManager(object):
+    def test_save_and_open(self, tmpdir):
+        manager = CheckpointManager(str(tmpdir), RegistryContainer())
+        manager.save({"state": make_state(0)})
+        assert manager.steps == [0]
+        with manager.open() as f:
+            assert f.h5py_group["state/step"][0] == 0
+
+    def test_steps_increment(self, tmpdir):
+        manager = CheckpointManager(str(tmpdir), RegistryContainer())
+        for i in range(3):
+            manager.save({"state": make_state(i)})
+        assert manager.steps == [0, 1, 2]
+        assert manager.latest_step == 2
+        with manager.open(1) as f:
+            assert f.h5py_group["state/step"][0] == 1
+
+    def test_rotation(self, tmpdir):
+        manager = CheckpointManager(str(tmpdir), RegistryContainer(), keep=2)
+        for i in range(5):
+            manager.save({"state": make_state(i)})
+        assert manager.steps == [3, 4]
+        assert sorted(os.listdir(str(tmpdir))) == [
+            "checkpoint-3.h5", "checkpoint-4.h5",
+        ]
+
+    def test_explicit_step(self, tmpdir):
+        manager = CheckpointManager(str(tmpdir), RegistryContainer())
+        manager.save({"state": make_state(0)}, step=100)
+        assert manager.path(100) == str(tmpdir.join("checkpoint-100.h5"))
+        with pytest.raises(FileExistsError):
+            manager.save({"state": make_state(0)}, step=100)
+
+    def test_unchanged_copied(self, tmpdir):
+        manager = CheckpointManager(str(tmpdir), RegistryContainer())
+        manager.save({"state": make_state(0)})
+        stats = manager.save({"state": make_state(1)})
+        assert stats.unchanged == 1
+        assert stats.updated == 1
+        assert stats.written == 0
+        with manager.open() as f:
+            assert f.h5py_group["state/weights"].compression == "gzip"
+            assert all(f.h5py_group["state/weights"][()] == np.arange(1000.0))
+            assert f.h5py_group["state/step"][0] == 1
+
+    def test_without_copy(self, tmpdir):
+        manager = CheckpointManager(
+            str(tmpdir), RegistryContainer(), copy_unchanged=False
+        )
+        manager.save({"state": make_state(0)})
+        stats = manager.save({"state": make_state(1)})
+        assert stats.written == 1
+
+    def test_failed_save(self, tmpdir):
+        manager = CheckpointManager(str(tmpdir), RegistryContainer())
+        manager.save({"state": make_state(0)})
+        with pytest.raises(TypeError):
+            manager.save({"state": make_state(1), "bad": object()})
+        assert os.listdir(str(tmpdir)) == ["checkpoint-0.h5"]
+        with manager.open() as f:
+            assert f.h5py_group["state/step"][0] == 0
+
+    def test_no_checkpoints(self, tmpdir):
+        manager = CheckpointManager(str(tmpdir), RegistryContainer())
+        assert manager.latest_step is None
+        with pytest.raises(FileNotFoundError):
+            manager.open()
+        with pytest.raises(FileNotFoundError):
+            manager.consolidate()
+
+    def test_invalid_keep(self, tmpdir):
+        with pytest.raises(ValueError):
+            CheckpointManager(str(tmpdir), RegistryContainer(), keep=0)
+
+
+class TestDeltaCheckpoints(object):
+    def make_manager(self, tmpdir, **kwargs):
+        return CheckpointManager(
+            str(tmpdir), RegistryContainer(), delta=True, **kwargs
+        )
+
+    def test_unchanged_linked(self, tmpdir):
+        manager = self.make_manager(tmpdir)
+        manager.save({"state": make_state(0)})
+        stats = manager.save({"state": make_state(1)})
+        assert stats.unchanged == 0
+        assert stats.written == 1
+        with manager.open() as f:
+            link = f.h5py_group["state"].get("weights", getlink=True)
+            assert isinstance(link, h5py.ExternalLink)
+            assert link.filename == "checkpoint-0.h5"
+            assert link.path == "/state/weights"
+            assert all(f.h5py_group["state/weights"][()] == np.arange(1000.0))
+            assert f.h5py_group["state/step"][0] == 1
+
+    def test_unchanged_subtree(self, tmpdir):
+        manager = self.make_manager(tmpdir)
+        manager.save({"state": make_state(0), "config": GroupContainer(
+            a=np.arange(3), b=np.arange(4),
+        )})
+        stats = manager.save({"state": make_state(1), "config": GroupContainer(
+            a=np.arange(3), b=np.arange(4),
+        )})
+        assert stats.unchanged == 1
+        assert stats.written == 1
+        with manager.open() as f:
+            link = f.h5py_group.get("config", getlink=True)
+            assert isinstance(link, h5py.ExternalLink)
+            assert link.path == "/config"
+
+    def test_chain_links_to_data(self, tmpdir):
+        manager = self.make_manager(tmpdir)
+        for i in range(3):
+            manager.save({"state": make_state(i)})
+        with manager.open() as f:
+            link = f.h5py_group["state"].get("weights", getlink=True)
+            assert link.filename == "checkpoint-0.h5"
+
+    def test_rotation_keeps_referenced(self, tmpdir):
+        manager = self.make_manager(tmpdir, keep=1)
+        for i in range(3):
+            manager.save({"state": make_state(i)})
+        assert manager.steps == [0, 2]
+
+    def test_consolidate(self, tmpdir):
+        manager = self.make_manager(tmpdir, keep=1)
+        for i in range(3):
+            manager.save({"state": make_state(i)})
+        manager.consolidate()
+        assert manager.steps == [2]
+        with manager.open() as f:
+            link = f.h5py_group["state"].get("weights", getlink=True)
+            assert isinstance(link, h5py.HardLink)
+            assert f.h5py_group["state/weights"].compression == "gzip"
+            assert all(f.h5py_group["state/weights"][()] == np.arange(1000.0))
+
+    def test_consolidate_to_output(self, tmpdir):
+        manager = self.make_manager(tmpdir)
+        manager.save({"state": make_state(0)})
+        manager.save({"state": make_state(1)})
+        output = str(tmpdir.join("full.h5"))
+        consolidate(manager.path(1), output)
+        os.remove(manager.path(0))
+        with h5py.File(output, mode="r") as f:
+            assert all(f["state/weights"][()] == np.arange(1000.0))
+            assert f["state/step"][0] == 1
@@ -0,0 +1,81 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer, DatasetContainer,
+    new_registry_list,
+)
+
+
+class TestDeduplicate(object):
+    def test_identical_arrays_linked(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_deduplicate.h5"))
+        registries = RegistryContainer(deduplicate=True)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["group"] = GroupContainer(
+                first=np.arange(1000.0), second=np.arange(1000.0),
+                third=np.ones(1000),
+            )
+            h5py_group = f.h5py_group["group"]
+            assert h5py_group["first"] == h5py_group["second"]
+            assert h5py_group["first"] != h5py_group["third"]
+        assert registries.dedup_stats.datasets_linked == 1
+        assert registries.dedup_stats.bytes_saved == 8000
+
+    def test_linked_across_writes(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_deduplicate.h5"))
+        registries = RegistryContainer(deduplicate=True)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["first"] = GroupContainer(grid=np.linspace(0, 1, 100))
+            f["second"] = GroupContainer(grid=np.linspace(0, 1, 100))
+            assert f.h5py_group["first/grid"] == f.h5py_group["second/grid"]
+
+        with hp_open(tmpfile, registries, mode='a') as f:
+            f["third"] = GroupContainer(grid=np.linspace(0, 1, 100))
+            assert f.h5py_group["first/grid"] == f.h5py_group["third/grid"]
+
+    def test_different_attrs_not_linked(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_deduplicate.h5"))
+        registries = RegistryContainer(deduplicate=True)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["group"] = GroupContainer(
+                first=DatasetContainer(data=np.arange(10), attrs={"a": 1}),
+                second=DatasetContainer(data=np.arange(10), attrs={"a": 2}),
+            )
+            h5py_group = f.h5py_group["group"]
+            assert h5py_group["first"] != h5py_group["second"]
+        assert registries.dedup_stats.datasets_linked == 0
+
+    def test_disabled_by_default(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_deduplicate.h5"))
+        registries = RegistryContainer()
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["group"] = GroupContainer(
+                first=np.arange(10), second=np.arange(10),
+            )
+            h5py_group = f.h5py_group["group"]
+            assert h5py_group["first"] != h5py_group["second"]
+
+    def test_to_file_option(self, h5py_file):
+        registries = RegistryContainer()
+        registries.to_file(
+            h5py_file, "group", registries.dump(GroupContainer(
+                first=np.arange(10), second=np.arange(10),
+            )), deduplicate=True
+        )
+        assert h5py_file["group/first"] == h5py_file["group/second"]
+        assert registries.dedup_stats.datasets_hashed == 2
+
+    def test_roundtrip(self, tmpdir, obj_registry):
+        tmpfile = str(tmpdir.join("test_deduplicate.h5"))
+        registries = RegistryContainer(
+            *obj_registry["registries"].registries, deduplicate=True
+        )
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["first"] = obj_registry["dumpable_object"]
+            f["second"] = obj_registry["dumpable_object"]
+
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert f["first"] == obj_registry["dumpable_object"]
+            assert f["second"] == obj_registry["dumpable_object"]
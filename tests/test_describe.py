@@ -0,0 +1,72 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer, DatasetContainer,
+    ObjectSummary,
+)
+
+
+class TestDescribe(object):
+    def test_h5preserve_object(
+        self, tmpdir, experiment_registry, experiment_data
+    ):
+        tmpfile = str(tmpdir.join("test_describe.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["first"] = experiment_data
+            data = experiment_data.data
+            assert f.describe() == [ObjectSummary(
+                path="/first", namespace="experiment", label="Experiment",
+                version=1, kind="dataset", shape=data.shape,
+                dtype=str(data.dtype), nbytes=data.nbytes,
+                storage_size=data.nbytes, filters=(), compression_ratio=1.0,
+            )]
+
+    def test_compression(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_describe.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["group"] = GroupContainer(data=DatasetContainer(
+                data=np.zeros(1000), compression="gzip", shuffle=True,
+            ))
+            group, dataset = f.describe()
+            assert group.path == "/group"
+            assert group.kind == "group"
+            assert dataset.path == "/group/data"
+            assert dataset.filters == ("shuffle", "deflate")
+            assert dataset.storage_size < dataset.nbytes
+            assert dataset.compression_ratio > 1
+
+    def test_subgroup(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_describe.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["group"] = GroupContainer(a=np.arange(3), b=np.arange(3))
+            f["other"] = np.arange(3)
+            assert [
+                summary.path for summary in f["group"].describe()
+            ] == ["/group/a", "/group/b"]
+
+    def test_hard_links_once(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_describe.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["a"] = np.arange(3)
+            f.h5py_group["b"] = f.h5py_group["a"]
+            assert [summary.path for summary in f.describe()] == ["/a"]
+
+    def test_catalog_hidden(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_describe.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', catalog=True
+        ) as f:
+            f["a"] = np.arange(3)
+            assert [summary.path for summary in f.describe()] == ["/a"]
+
+    def test_other_backend(self, tmpdir, backend):
+        tmpfile = str(tmpdir.join("test_describe"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', backend=backend
+        ) as f:
+            f["a"] = np.arange(3)
+            with pytest.raises(TypeError):
+                f.describe()
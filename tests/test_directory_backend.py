@@ -0,0 +1,234 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import numpy as np
+import h5py
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer, DatasetContainer,
+    AppendableDatasetContainer,
+)
+from h5preserve.backends import DirectoryBackend, convert
+
+
+class TestDirectoryBackend(object):
+    def test_modes(self, tmpdir):
+        backend = DirectoryBackend()
+        path = str(tmpdir.join("test"))
+        with pytest.raises(FileNotFoundError):
+            backend.open(path, mode="r")
+        backend.open(path, mode="x").close()
+        with pytest.raises(FileExistsError):
+            backend.open(path, mode="x")
+        with pytest.raises(ValueError):
+            backend.open(path, mode="q")
+        other = tmpdir.mkdir("other")
+        other.join("keep").write("")
+        with pytest.raises(FileExistsError):
+            backend.open(str(other), mode="w")
+        assert other.join("keep").exists()
+
+    def test_layout(self, tmpdir):
+        path = tmpdir.join("test")
+        with hp_open(
+            str(path), RegistryContainer(), mode='x',
+            backend=DirectoryBackend(),
+        ) as f:
+            f["group"] = GroupContainer(data=np.arange(3))
+        assert path.join("group").isdir()
+        assert all(np.load(str(path.join("group", "data.npy"))) == np.arange(3))
+
+    def test_memmap(self, tmpdir):
+        tmpfile = str(tmpdir.join("test"))
+        backend = DirectoryBackend()
+        registries = RegistryContainer()
+        with hp_open(tmpfile, registries, mode='x', backend=backend) as f:
+            f["data"] = np.arange(10)
+        with hp_open(tmpfile, registries, mode='r', backend=backend) as f:
+            data = f.h5py_group["data"][()]
+            assert isinstance(data, np.memmap)
+            assert not data.flags.writeable
+            assert all(data == np.arange(10))
+            assert all(f.h5py_group["data"][2:4] == [2, 3])
+
+    def test_read_only(self, tmpdir):
+        tmpfile = str(tmpdir.join("test"))
+        backend = DirectoryBackend()
+        registries = RegistryContainer()
+        with hp_open(tmpfile, registries, mode='x', backend=backend) as f:
+            f["data"] = np.arange(3)
+        with hp_open(tmpfile, registries, mode='r', backend=backend) as f:
+            with pytest.raises(OSError):
+                f["other"] = np.arange(3)
+            with pytest.raises(OSError):
+                f.h5py_group["data"].attrs["a"] = 1
+
+    def test_attrs(self, tmpdir):
+        tmpfile = str(tmpdir.join("test"))
+        backend = DirectoryBackend()
+        attrs = {
+            "int": 1, "float": 0.5, "str": "a", "bytes": b"b",
+            "bool": True, "array": np.arange(3.0), "scalar": np.int16(4),
+            "strings": np.array(["a", "bc"], dtype=object),
+            "empty": h5py.Empty("f8"),
+        }
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', backend=backend
+        ) as f:
+            f.h5py_group.attrs.update(attrs)
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='r', backend=backend
+        ) as f:
+            read = dict(f.h5py_group.attrs)
+        assert read["bytes"] == b"b"
+        assert read["scalar"] == 4 and read["scalar"].dtype == np.int16
+        assert list(read["strings"]) == ["a", "bc"]
+        assert read["empty"].dtype == np.dtype("f8")
+        assert all(read.pop("array") == attrs.pop("array"))
+        for name in ["int", "float", "str", "bool"]:
+            assert read[name] == attrs[name]
+
+    def test_objects_rejected(self, tmpdir):
+        with hp_open(
+            str(tmpdir.join("test")), RegistryContainer(), mode='x',
+            backend=DirectoryBackend(),
+        ) as f:
+            with pytest.raises(TypeError):
+                f.h5py_group.attrs["a"] = np.array([1, "a"], dtype=object)
+
+    def test_links(self, tmpdir):
+        backend = DirectoryBackend()
+        with hp_open(
+            str(tmpdir.join("base")), RegistryContainer(), mode='x',
+            backend=backend,
+        ) as f:
+            f["group"] = GroupContainer(data=np.arange(3))
+        with hp_open(
+            str(tmpdir.join("test")), RegistryContainer(), mode='x',
+            backend=backend,
+        ) as f:
+            f.h5py_group["soft"] = h5py.SoftLink("/external/data")
+            f.h5py_group["external"] = h5py.ExternalLink("base", "/group")
+            f["group"] = GroupContainer(data=np.arange(4))
+            f.h5py_group["hard"] = f.h5py_group["group/data"]
+            with pytest.raises(ValueError):
+                f.h5py_group["other"] = f.h5py_group["external/data"]
+            assert all(f.h5py_group["soft"][()] == np.arange(3))
+            assert isinstance(
+                f.h5py_group.get("soft", getlink=True), h5py.SoftLink
+            )
+            assert isinstance(
+                f.h5py_group.get("hard", getlink=True), h5py.HardLink
+            )
+            assert f.h5py_group["hard"] == f.h5py_group["group/data"]
+
+    def test_overwrite(self, tmpdir):
+        with hp_open(
+            str(tmpdir.join("test")), RegistryContainer(), mode='x',
+            backend=DirectoryBackend(), overwrite=True,
+        ) as f:
+            f["group"] = GroupContainer(a=np.arange(3), b=np.arange(4))
+            f["group"] = GroupContainer(a=np.arange(5))
+            assert list(f.h5py_group["group"]) == ["a"]
+            assert all(f.h5py_group["group/a"][()] == np.arange(5))
+
+    def test_appendable(self, tmpdir):
+        with hp_open(
+            str(tmpdir.join("test")), RegistryContainer(), mode='x',
+            backend=DirectoryBackend(),
+        ) as f:
+            f["values"] = AppendableDatasetContainer(shape=(0, 2), dtype=int)
+            values = f["values"]["data"]
+            values.append(np.arange(10).reshape(5, 2))
+            values.flush()
+            assert f.h5py_group["values"].shape == (5, 2)
+            assert (values[()] == np.arange(10).reshape(5, 2)).all()
+
+    def test_resize_spare_rows(self, tmpdir):
+        path = tmpdir.join("test")
+        f = DirectoryBackend().open(str(path), mode="x")
+        dataset = f.create_dataset(
+            "data", data=np.arange(8).reshape(4, 2), maxshape=(None, None),
+            fillvalue=-1,
+        )
+        dataset.resize(5, axis=0)
+        assert np.load(str(path.join("data.npy"))).shape == (8, 2)
+        dataset[4] = [8, 9]
+        written = path.join("data.npy").mtime()
+        dataset.resize(7, axis=0)
+        assert path.join("data.npy").mtime() == written
+        other = f["data"]
+        assert other.shape == (7, 2)
+        assert (other[()][:5] == np.arange(10).reshape(5, 2)).all()
+        assert (other[5:] == -1).all()
+        dataset.resize(1, axis=0)
+        dataset.resize(3, axis=0)
+        assert (f["data"][()] == [[0, 1], [-1, -1], [-1, -1]]).all()
+        dataset.resize(4, axis=1)
+        assert np.load(str(path.join("data.npy"))).shape == (3, 4)
+        assert f["data"].shape == (3, 4)
+
+    def test_metadata_read_once(self, tmpdir, monkeypatch):
+        path = tmpdir.join("test")
+        f = DirectoryBackend().open(str(path), mode="x")
+        dataset = f.create_dataset("data", data=np.arange(3))
+        assert dataset.shape == (3,)
+        assert dataset.dtype == np.arange(3).dtype
+        monkeypatch.setattr(
+            "h5preserve._directory.load", lambda *args, **kwargs: 1 / 0
+        )
+        monkeypatch.setattr(
+            "h5preserve._directory._read_json", lambda *args, **kwargs: 1 / 0
+        )
+        assert dataset.shape == (3,)
+        assert dataset.dtype == np.arange(3).dtype
+        assert dataset.maxshape == (3,)
+
+    def test_parallel_writes(self, tmpdir):
+        tmpfile = str(tmpdir.join("test"))
+        backend = DirectoryBackend()
+        registries = RegistryContainer()
+        with hp_open(tmpfile, registries, mode='x', backend=backend) as f:
+            for i in range(4):
+                f["part{}".format(i)] = GroupContainer()
+
+        def write(i):
+            with hp_open(
+                tmpfile, registries, mode='r+', backend=backend
+            ) as f:
+                f["part{}".format(i)]["data"] = np.arange(i + 1)
+
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(write, range(4)))
+        with hp_open(tmpfile, registries, mode='r', backend=backend) as f:
+            for i in range(4):
+                assert all(
+                    f.h5py_group["part{}/data".format(i)][()]
+                    == np.arange(i + 1)
+                )
+
+
+class TestConvert(object):
+    def test_hdf5_roundtrip(self, tmpdir, experiment_registry, experiment_data):
+        registries = RegistryContainer(experiment_registry)
+        hdf5_file = str(tmpdir.join("test.h5"))
+        directory = str(tmpdir.join("test"))
+        with hp_open(hdf5_file, registries, mode='x') as f:
+            f["group"] = GroupContainer(
+                a=experiment_data, b=experiment_data,
+                c=DatasetContainer(data=np.arange(6.0), compression="gzip"),
+            )
+        convert(hdf5_file, directory, destination_backend=DirectoryBackend())
+        with hp_open(
+            directory, registries, mode='r', backend=DirectoryBackend()
+        ) as f:
+            assert f["group"]["a"].time_started == experiment_data.time_started
+            assert f.h5py_group["group/a"] == f.h5py_group["group/b"]
+            assert f.h5py_group["group/c"].compression == "gzip"
+        converted = str(tmpdir.join("converted.h5"))
+        convert(directory, converted, source_backend=DirectoryBackend())
+        with hp_open(converted, registries, mode='r') as f:
+            assert all(f["group"]["a"].data == experiment_data.data)
+            assert f.h5py_group["group/c"].compression == "gzip"
+            assert f.h5py_group["group/a"] == f.h5py_group["group/b"]
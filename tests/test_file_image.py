@@ -0,0 +1,96 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, open_bytes, RegistryContainer, AppendableDatasetContainer,
+)
+from h5preserve.backends import MemoryBackend, DirectoryBackend
+
+
+class TestFileImage(object):
+    def test_in_memory_roundtrip(
+        self, tmpdir, experiment_registry, experiment_data
+    ):
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(
+            "test.h5", registries, mode='w', driver="core",
+            backing_store=False,
+        ) as f:
+            f["experiment"] = experiment_data
+            data = f.to_bytes()
+        assert tmpdir.listdir() == []
+        assert data.startswith(b"\x89HDF")
+        with open_bytes(data, registries) as f:
+            assert f["experiment"] == experiment_data
+
+    def test_matches_file(self, tmpdir):
+        tmpfile = tmpdir.join("test.h5")
+        with hp_open(str(tmpfile), RegistryContainer(), mode='x') as f:
+            f["data"] = np.arange(10)
+        with hp_open(str(tmpfile), RegistryContainer(), mode='r') as f:
+            assert f.to_bytes() == tmpfile.read_binary()
+        with open_bytes(tmpfile.read_binary(), RegistryContainer()) as f:
+            assert all(f.h5py_group["data"][()] == np.arange(10))
+
+    def test_read_only(self):
+        with hp_open(
+            "test.h5", RegistryContainer(), mode='w', driver="core",
+            backing_store=False,
+        ) as f:
+            data = f.to_bytes()
+        with open_bytes(data, RegistryContainer()) as f:
+            with pytest.raises((OSError, ValueError)):
+                f["data"] = np.arange(3)
+
+    def test_modify(self):
+        with hp_open(
+            "test.h5", RegistryContainer(), mode='w', driver="core",
+            backing_store=False,
+        ) as f:
+            f["a"] = np.arange(3)
+            data = f.to_bytes()
+        with open_bytes(data, RegistryContainer(), mode='r+') as f:
+            f["b"] = np.arange(4)
+            modified = f.to_bytes()
+        with open_bytes(data, RegistryContainer()) as f:
+            assert list(f) == ["a"]
+        with open_bytes(modified, RegistryContainer()) as f:
+            assert sorted(f) == ["a", "b"]
+
+    def test_appendable_flushed(self):
+        with hp_open(
+            "test.h5", RegistryContainer(), mode='w', driver="core",
+            backing_store=False,
+        ) as f:
+            f["values"] = AppendableDatasetContainer(shape=(0,), dtype=int)
+            values = f["values"]["data"]
+            values.append(np.arange(5))
+            data = f.to_bytes()
+        with open_bytes(data, RegistryContainer()) as f:
+            assert f.h5py_group["values"].shape == (5,)
+
+    def test_memory_backend(self, experiment_registry, experiment_data):
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(
+            "test", registries, mode='x', backend=MemoryBackend()
+        ) as f:
+            f["experiment"] = experiment_data
+            data = f.to_bytes()
+        with open_bytes(data, registries) as f:
+            assert f["experiment"] == experiment_data
+        with open_bytes(data, registries, mode='r+') as f:
+            f.h5py_group["experiment"][0] = -1
+            assert f["experiment"].data[0] == -1
+
+    def test_unsupported_backend(self, tmpdir):
+        with hp_open(
+            str(tmpdir.join("test")), RegistryContainer(), mode='x',
+            backend=DirectoryBackend(),
+        ) as f:
+            with pytest.raises(TypeError):
+                f.to_bytes()
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            open_bytes(b"", RegistryContainer(), mode='w')
@@ -0,0 +1,160 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, Registry, RegistryContainer, GroupContainer,
+    DatasetContainer, new_registry_list,
+)
+
+
+class Tracked:
+    def __init__(self, data):
+        self.data = data
+        self._h5preserve_dirty = True
+
+
+@pytest.fixture
+def tracked_registry():
+    registry = Registry("tracked")
+    registry.dump_count = 0
+
+    @registry.dumper(Tracked, "Tracked", version=1)
+    def _tracked_dump(tracked):
+        registry.dump_count += 1
+        return DatasetContainer(data=tracked.data)
+
+    @registry.loader("Tracked", version=1)
+    def _tracked_load(dataset):
+        return Tracked(dataset["data"])
+
+    return registry
+
+
+class TestSaveIncremental(object):
+    def test_new_key(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            stats = f.save_incremental("group", GroupContainer(
+                a=np.arange(10), b=np.ones(5),
+            ))
+            assert stats.written == 1
+            assert list(f.h5py_group["group"]) == ["a", "b"]
+
+    def test_unchanged(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f.save_incremental("group", GroupContainer(
+                a=np.arange(10), b=np.ones(5),
+            ))
+            stats = f.save_incremental("group", GroupContainer(
+                a=np.arange(10), b=np.ones(5),
+            ))
+            assert stats.unchanged == 2
+            assert stats.updated == 0
+            assert stats.written == 0
+
+    def test_changed_in_place(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f.save_incremental("group", GroupContainer(
+                a=np.arange(10), b=np.ones(5),
+            ))
+            dataset_id = f.h5py_group["group/b"].id
+            stats = f.save_incremental("group", GroupContainer(
+                a=np.arange(10), b=np.zeros(5),
+            ))
+            assert stats.unchanged == 1
+            assert stats.updated == 1
+            assert f.h5py_group["group/b"].id == dataset_id
+            assert all(f.h5py_group["group/b"][()] == np.zeros(5))
+
+    def test_changed_shape(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f.save_incremental("group", GroupContainer(a=np.arange(10)))
+            stats = f.save_incremental("group", GroupContainer(
+                a=np.arange(20)
+            ))
+            assert stats.written == 1
+            assert all(f.h5py_group["group/a"][()] == np.arange(20))
+
+    def test_removed_member(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f.save_incremental("group", GroupContainer(
+                a=np.arange(10), b=np.ones(5),
+            ))
+            f.save_incremental("group", GroupContainer(a=np.arange(10)))
+            assert list(f.h5py_group["group"]) == ["a"]
+
+    def test_changed_attrs(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f.save_incremental("data", DatasetContainer(
+                data=np.arange(10), attrs={"a": 1, "b": 2}
+            ))
+            stats = f.save_incremental("data", DatasetContainer(
+                data=np.arange(10), attrs={"a": 3}
+            ))
+            assert stats.updated == 1
+            attrs = f.h5py_group["data"].attrs
+            assert attrs["a"] == 3
+            assert "b" not in attrs
+
+    def test_dirty_tracking(self, tmpdir, tracked_registry):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        tracked = {"first": Tracked(np.arange(10))}
+        with hp_open(tmpfile, new_registry_list(tracked_registry), mode='x') as f:
+            group = f.create_group("group")
+            for key, val in tracked.items():
+                group.save_incremental(key, val)
+            assert not tracked["first"]._h5preserve_dirty
+            assert tracked_registry.dump_count == 1
+
+            stats = group.save_incremental("first", tracked["first"])
+            assert stats.unchanged == 1
+            assert tracked_registry.dump_count == 1
+
+            tracked["first"].data = np.arange(10) * 2
+            tracked["first"]._h5preserve_dirty = True
+            stats = group.save_incremental("first", tracked["first"])
+            assert stats.updated == 1
+            assert tracked_registry.dump_count == 2
+            assert all(group["first"].data == np.arange(10) * 2)
+
+    def test_dirty_tracking_other_location(self, tmpdir, tracked_registry):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        first = Tracked(np.arange(10))
+        second = Tracked(np.ones(10))
+        with hp_open(tmpfile, new_registry_list(tracked_registry), mode='x') as f:
+            f.save_incremental("a", first)
+            f.save_incremental("b", second)
+            stats = f.save_incremental("b", first)
+            assert stats.unchanged == 0
+            assert all(f["b"].data == np.arange(10))
+
+            f.save_incremental("a", second)
+            stats = f.save_incremental("a", first)
+            assert stats.unchanged == 0
+            assert all(f["a"].data == np.arange(10))
+
+    def test_dirty_tracking_replaced(self, tmpdir, tracked_registry):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        first = Tracked(np.arange(10))
+        registries = new_registry_list(tracked_registry)
+        with hp_open(tmpfile, registries, mode='x', overwrite=True) as f:
+            f.save_incremental("a", first)
+            f["a"] = np.ones(3)
+            f.save_incremental("a", first)
+            assert all(f["a"].data == np.arange(10))
+
+    def test_roundtrip(self, tmpdir, obj_registry):
+        tmpfile = str(tmpdir.join("test_incremental.h5"))
+        registries = obj_registry["registries"]
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f.save_incremental("first", obj_registry["dumpable_object"])
+            f.save_incremental("first", obj_registry["dumpable_object"])
+
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert f["first"] == obj_registry["dumpable_object"]
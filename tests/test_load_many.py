@@ -0,0 +1,64 @@
+from collections.abc import ItemsView
+
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer, H5PreserveGroup,
+)
+
+
+@pytest.fixture
+def experiments_file(tmpdir, experiment_registry, experiment_data):
+    experiment_cls = type(experiment_data)
+    tmpfile = str(tmpdir.join("test_load_many.h5"))
+    registries = RegistryContainer(experiment_registry)
+    with hp_open(tmpfile, registries, mode='x') as f:
+        for i in range(5):
+            f["exp{}".format(i)] = experiment_cls(np.arange(i + 1), i)
+        f.create_group("group")["nested"] = experiment_cls(np.arange(3), 10)
+    return tmpfile, registries
+
+
+class TestLoadMany(object):
+    def test_same_as_getitem(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            loaded = f.load_many()
+            assert list(loaded) == list(f)
+            for key, val in loaded.items():
+                if key == "group":
+                    assert isinstance(val, H5PreserveGroup)
+                else:
+                    assert val == f[key]
+
+    def test_keys(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            loaded = f.load_many(["exp3", "group/nested"])
+            assert list(loaded) == ["exp3", "group/nested"]
+            assert loaded["exp3"].time_started == 3
+            assert loaded["group/nested"].time_started == 10
+
+    def test_workers(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert f.load_many(workers=2) == f.load_many()
+
+    def test_items(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert isinstance(f["group"].items(), ItemsView)
+            items = dict(f["group"].items())
+            assert list(items) == ["nested"]
+            assert items["nested"].time_started == 10
+            assert [
+                val.time_started for val in f["group"].values()
+            ] == [10]
+
+    def test_missing(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            with pytest.raises(KeyError):
+                f.load_many(["missing"])
@@ -0,0 +1,79 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import open as hp_open, RegistryContainer, GroupContainer
+
+
+@pytest.fixture
+def runs_file(tmpdir, experiment_registry, experiment_data):
+    experiment_cls = type(experiment_data)
+    tmpfile = str(tmpdir.join("test_load_paths.h5"))
+    registries = RegistryContainer(experiment_registry)
+    with hp_open(tmpfile, registries, mode='x') as f:
+        runs = f.create_group("runs")
+        for i in range(3):
+            runs["run{}".format(i)] = GroupContainer(
+                final_solution=experiment_cls(np.arange(i + 1), i),
+                intermediate=experiment_cls(np.arange(10), -i),
+            )
+        f["config"] = experiment_cls(np.arange(2), 100)
+    return tmpfile, registries
+
+
+class TestLoadPaths(object):
+    def test_glob(self, runs_file):
+        tmpfile, registries = runs_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            results = f.load_paths(["runs/*/final_solution", "config"])
+            assert list(results) == [
+                "runs/run0/final_solution", "runs/run1/final_solution",
+                "runs/run2/final_solution", "config",
+            ]
+            assert results["runs/run2/final_solution"].time_started == 2
+            assert results["config"].time_started == 100
+
+    def test_single_pattern(self, runs_file):
+        tmpfile, registries = runs_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert list(f.load_paths("runs/run[12]/intermediate")) == [
+                "runs/run1/intermediate", "runs/run2/intermediate",
+            ]
+
+    def test_relative_to_group(self, runs_file):
+        tmpfile, registries = runs_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert list(f["runs"].load_paths("*/final_solution")) == [
+                "run0/final_solution", "run1/final_solution",
+                "run2/final_solution",
+            ]
+
+    def test_no_matches(self, runs_file):
+        tmpfile, registries = runs_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert f.load_paths(["missing/*", "config/*", ""]) == {}
+
+    def test_duplicates(self, runs_file):
+        tmpfile, registries = runs_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert list(f.load_paths(["config", "c*"])) == ["config"]
+
+
+def test_load_paths_backend(
+    tmpdir, backend, experiment_registry, experiment_data
+):
+    experiment_cls = type(experiment_data)
+    tmpfile = str(tmpdir.join("test_load_paths"))
+    registries = RegistryContainer(experiment_registry)
+    with hp_open(tmpfile, registries, mode='x', backend=backend) as f:
+        for i in range(3):
+            f["run{}".format(i)] = GroupContainer(
+                final_solution=experiment_cls(np.arange(i + 1), i),
+            )
+    with hp_open(tmpfile, registries, mode='r', backend=backend) as f:
+        results = f.load_paths("run*/final_solution")
+        assert list(results) == [
+            "run0/final_solution", "run1/final_solution",
+            "run2/final_solution",
+        ]
+        assert results["run2/final_solution"].time_started == 2
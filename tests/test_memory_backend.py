@@ -0,0 +1,190 @@
+import pytest
+
+import numpy as np
+import h5py
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer, DatasetContainer,
+    AppendableDatasetContainer,
+)
+from h5preserve.backends import MemoryBackend, BackendFile
+
+
+class TestMemoryBackend(object):
+    def test_modes(self):
+        backend = MemoryBackend()
+        with pytest.raises(FileNotFoundError):
+            backend.open("missing", mode="r")
+        backend.open("file", mode="x").close()
+        with pytest.raises(FileExistsError):
+            backend.open("file", mode="x")
+        assert backend.filenames == ["file"]
+        backend.remove("file")
+        assert backend.filenames == []
+        with pytest.raises(ValueError):
+            backend.open("file", mode="q")
+
+    def test_no_hdf5(self, tmpdir):
+        backend = MemoryBackend()
+        with hp_open(
+            "test", RegistryContainer(), mode='x', backend=backend
+        ) as f:
+            f["group"] = GroupContainer(data=np.arange(3))
+            assert isinstance(f.h5py_file, BackendFile)
+            assert not isinstance(f.h5py_file, h5py.File)
+        assert tmpdir.listdir() == []
+
+    def test_data_copied(self):
+        backend = MemoryBackend()
+        data = np.arange(3)
+        with hp_open(
+            "test", RegistryContainer(), mode='x', backend=backend
+        ) as f:
+            f["data"] = data
+            data[0] = 10
+            read = f.h5py_group["data"][()]
+            assert all(read == np.arange(3))
+            read[1] = 10
+            assert all(f.h5py_group["data"][()] == np.arange(3))
+
+    def test_read_only(self):
+        backend = MemoryBackend()
+        registries = RegistryContainer()
+        with hp_open("test", registries, mode='x', backend=backend) as f:
+            f["data"] = np.arange(3)
+        with hp_open("test", registries, mode='r', backend=backend) as f:
+            with pytest.raises(OSError):
+                f["other"] = np.arange(3)
+
+    def test_existing_name(self):
+        backend = MemoryBackend()
+        with hp_open(
+            "test", RegistryContainer(), mode='x', backend=backend
+        ) as f:
+            f["data"] = np.arange(3)
+            with pytest.raises(ValueError):
+                f["data"] = np.arange(3)
+
+    def test_shared(self, experiment_registry, experiment_data):
+        backend = MemoryBackend()
+        registries = RegistryContainer(experiment_registry)
+        with hp_open("test", registries, mode='x', backend=backend) as f:
+            f["group"] = GroupContainer(
+                a=experiment_data, b=experiment_data,
+            )
+            assert f.h5py_group["group/a"] == f.h5py_group["group/b"]
+            assert f["group"]["b"].time_started == (
+                experiment_data.time_started
+            )
+
+    def test_links(self):
+        backend = MemoryBackend()
+        with hp_open(
+            "base", RegistryContainer(), mode='x', backend=backend
+        ) as f:
+            f["group"] = GroupContainer(data=np.arange(3))
+        with hp_open(
+            "test", RegistryContainer(), mode='x', backend=backend
+        ) as f:
+            f.h5py_group["soft"] = h5py.SoftLink("/external/data")
+            f.h5py_group["external"] = h5py.ExternalLink("base", "/group")
+            assert all(f.h5py_group["soft"][()] == np.arange(3))
+            assert isinstance(
+                f.h5py_group.get("soft", getlink=True), h5py.SoftLink
+            )
+            assert isinstance(
+                f.h5py_group.get("external/data", getlink=True),
+                h5py.HardLink,
+            )
+
+    def test_overwrite(self):
+        backend = MemoryBackend()
+        with hp_open(
+            "test", RegistryContainer(), mode='x', backend=backend,
+            overwrite=True,
+        ) as f:
+            f["group"] = GroupContainer(a=np.arange(3), b=np.arange(4))
+            f["group"] = GroupContainer(a=np.arange(5))
+            assert list(f.h5py_group["group"]) == ["a"]
+            assert all(f.h5py_group["group/a"][()] == np.arange(5))
+
+    def test_save_incremental(self):
+        backend = MemoryBackend()
+        with hp_open(
+            "test", RegistryContainer(), mode='x', backend=backend
+        ) as f:
+            f.save_incremental("data", DatasetContainer(data=np.arange(3)))
+            stats = f.save_incremental(
+                "data", DatasetContainer(data=np.arange(3))
+            )
+            assert stats.unchanged == 1
+
+    def test_deduplicate(self):
+        backend = MemoryBackend()
+        with hp_open(
+            "test", RegistryContainer(deduplicate=True), mode='x',
+            backend=backend,
+        ) as f:
+            f["a"] = np.arange(10)
+            f["b"] = np.arange(10)
+            assert f.h5py_group["a"] == f.h5py_group["b"]
+
+    def test_appendable(self):
+        backend = MemoryBackend()
+        with hp_open(
+            "test", RegistryContainer(), mode='x', backend=backend
+        ) as f:
+            f["values"] = AppendableDatasetContainer(shape=(0, 2), dtype=int)
+            values = f["values"]["data"]
+            values.append(np.arange(10).reshape(5, 2))
+            values.flush()
+            assert f.h5py_group["values"].shape == (5, 2)
+            assert (values[()] == np.arange(10).reshape(5, 2)).all()
+
+    def test_resize_spare_rows(self):
+        backend = MemoryBackend()
+        f = backend.open("test", mode="x")
+        dataset = f.create_dataset(
+            "data", data=np.arange(4), maxshape=(None,), fillvalue=-1,
+        )
+        dataset.resize(5, axis=0)
+        buffer = dataset._node.buffer
+        assert len(buffer) == 8
+        dataset[4] = 4
+        dataset.resize(7, axis=0)
+        assert dataset._node.buffer is buffer
+        assert list(dataset[()]) == [0, 1, 2, 3, 4, -1, -1]
+        dataset.resize(2, axis=0)
+        dataset.resize(6, axis=0)
+        assert dataset._node.buffer is buffer
+        assert list(dataset[()]) == [0, 1, -1, -1, -1, -1]
+        backend.from_bytes("copy", backend.to_bytes("test"))
+        assert list(backend.open("copy", mode="r")["data"][()]) == (
+            [0, 1, -1, -1, -1, -1]
+        )
+
+    def test_group_listing(self, experiment_registry, experiment_data):
+        backend = MemoryBackend()
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(
+            "test", registries, mode='x', backend=backend, catalog=True
+        ) as f:
+            f["runs"] = GroupContainer(
+                a=GroupContainer(result=experiment_data),
+                b=GroupContainer(result=experiment_data, extra=np.arange(3)),
+            )
+            runs = f["runs"]
+            assert [entry.path for entry in runs.list_objects()] == [
+                "/runs/a", "/runs/b",
+            ]
+            assert [
+                entry.path for entry in runs.list_objects(
+                    recursive=True, kind="dataset"
+                )
+            ] == ["/runs/a/result", "/runs/b/extra", "/runs/b/result"]
+            assert sorted(runs.query(recursive=True, label="Experiment")) == [
+                "a/result", "b/result",
+            ]
+            assert list(runs.load_paths("*/result")) == [
+                "a/result", "b/result",
+            ]
@@ -0,0 +1,91 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, open_many, RegistryContainer, GroupContainer,
+    H5PreserveGroup,
+)
+
+
+@pytest.fixture
+def run_files(tmpdir, experiment_registry, experiment_data):
+    experiment_cls = type(experiment_data)
+    registries = RegistryContainer(experiment_registry)
+    paths = []
+    for i in range(6):
+        paths.append(str(tmpdir.join("run{}.h5".format(i))))
+        with hp_open(paths[-1], registries, mode='x', catalog=True) as f:
+            f["experiment"] = experiment_cls(np.arange(i + 1), i)
+            f["group"] = GroupContainer(data=np.arange(3))
+            if i % 2:
+                f["extra"] = np.arange(i)
+    return paths, registries
+
+
+class TestOpenMany(object):
+    def test_all_members(self, run_files):
+        paths, registries = run_files
+        results = dict(open_many(paths, registries, workers=2))
+        assert sorted(results) == sorted(paths)
+        for i, path in enumerate(paths):
+            experiment = results[path]["experiment"]
+            assert experiment.time_started == i
+            assert all(experiment.data == np.arange(i + 1))
+            assert isinstance(results[path]["group"], H5PreserveGroup)
+            assert ("extra" in results[path]) == bool(i % 2)
+
+    def test_keys(self, run_files):
+        paths, registries = run_files
+        for path, results in open_many(
+            paths, registries, keys=["experiment", "group/data", "missing"],
+            workers=2,
+        ):
+            assert sorted(results) == ["experiment", "group/data"]
+            assert all(results["group/data"] == np.arange(3))
+
+    def test_bounded(self, run_files):
+        paths, registries = run_files
+        consumed = []
+
+        def iter_paths():
+            for path in paths:
+                consumed.append(path)
+                yield path
+
+        for i, _ in enumerate(open_many(
+            iter_paths(), registries, keys=["experiment"], workers=1,
+            max_in_flight=2,
+        )):
+            assert len(consumed) <= i + 2
+        assert len(consumed) == len(paths)
+
+    @pytest.mark.parametrize("workers, count", [(1, 6), (2, 1)])
+    def test_serial(self, run_files, monkeypatch, workers, count):
+        paths, registries = run_files
+        monkeypatch.setattr("h5preserve._open.ProcessPoolExecutor", None)
+        results = dict(open_many(
+            paths[:count], registries, keys=["experiment", "group"],
+            workers=workers,
+        ))
+        assert sorted(results) == sorted(paths[:count])
+        for i, path in enumerate(paths[:count]):
+            assert results[path]["experiment"].time_started == i
+            assert all(
+                results[path]["group"].h5py_group["data"][()] == np.arange(3)
+            )
+
+    def test_stop_early(self, run_files):
+        paths, registries = run_files
+        results = open_many(paths, registries, workers=2)
+        path, _ = next(results)
+        assert path in paths
+        results.close()
+
+    def test_error(self, run_files, tmpdir):
+        paths, registries = run_files
+        with pytest.raises(OSError):
+            list(open_many(
+                paths + [str(tmpdir.join("missing.h5"))], registries,
+                workers=2,
+            ))
@@ -0,0 +1,69 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer, DatasetContainer,
+    new_registry_list,
+)
+
+
+class TestOverwrite(object):
+    def test_existing_key_without_overwrite(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_overwrite.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["data"] = np.arange(10)
+            with pytest.raises(OSError):
+                f["data"] = np.arange(10)
+
+    def test_in_place(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_overwrite.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', overwrite=True
+        ) as f:
+            f["group"] = GroupContainer(data=np.arange(10))
+            dataset_id = f.h5py_group["group/data"].id
+            f["group"] = GroupContainer(data=np.arange(10) * 2)
+            assert f.h5py_group["group/data"].id == dataset_id
+            assert all(f.h5py_group["group/data"][()] == np.arange(10) * 2)
+
+    def test_scalar_in_place(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_overwrite.h5"))
+        with hp_open(
+            tmpfile, new_registry_list(), mode='x', overwrite=True
+        ) as f:
+            f["number"] = 1.0
+            f["number"] = 2.0
+            assert f["number"] == 2.0
+
+    def test_incompatible_replaced(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_overwrite.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', overwrite=True
+        ) as f:
+            f["group"] = GroupContainer(data=np.arange(10))
+            f["group"] = GroupContainer(data=DatasetContainer(
+                data=np.arange(10), compression="gzip",
+            ))
+            assert f.h5py_group["group/data"].compression == "gzip"
+            f["group"] = GroupContainer(data=np.arange(20.0))
+            assert all(f.h5py_group["group/data"][()] == np.arange(20.0))
+
+    def test_subgroup_keeps_overwrite(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_overwrite.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', overwrite=True
+        ) as f:
+            f.create_group("group")
+            group = f["group"]
+            group["data"] = np.arange(10)
+            group["data"] = np.arange(10) * 2
+            assert all(group.h5py_group["data"][()] == np.arange(10) * 2)
+
+    def test_free_space_strategy(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_overwrite.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', overwrite=True
+        ) as f:
+            fcpl = f.h5py_file.id.get_create_plist()
+            assert fcpl.get_file_space_strategy()[1]
@@ -0,0 +1,76 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, Registry, RegistryContainer, GroupContainer,
+    OnDemandWrapper,
+)
+
+
+class Record:
+    def __init__(self, **fields):
+        self.fields = fields
+
+
+def make_registry(**loader_options):
+    registry = Registry("record")
+
+    @registry.dumper(Record, "Record", version=1)
+    def _record_dump(record):
+        return GroupContainer(**record.fields)
+
+    @registry.loader("Record", version=1, **loader_options)
+    def _record_load(group):
+        return Record(**group)
+
+    return registry
+
+
+@pytest.fixture
+def record_file(tmpdir):
+    tmpfile = str(tmpdir.join("test_projection.h5"))
+    with hp_open(tmpfile, RegistryContainer(make_registry()), mode='x') as f:
+        f["record"] = Record(
+            a=np.arange(3), b=np.arange(4),
+            c=GroupContainer(d=np.arange(5)),
+        )
+    return tmpfile
+
+
+class TestProjection(object):
+    def test_all_members_by_default(self, record_file):
+        registry = make_registry()
+        with hp_open(record_file, RegistryContainer(registry), mode='r') as f:
+            record = f["record"]
+        assert sorted(record.fields) == ["a", "b", "c"]
+
+    def test_members(self, record_file):
+        registry = make_registry(members=["a", "c"])
+        with hp_open(record_file, RegistryContainer(registry), mode='r') as f:
+            record = f["record"]
+        assert sorted(record.fields) == ["a", "c"]
+        assert all(record.fields["a"]["data"] == np.arange(3))
+
+    def test_missing_member(self, record_file):
+        registry = make_registry(members=["a", "missing"])
+        with hp_open(record_file, RegistryContainer(registry), mode='r') as f:
+            record = f["record"]
+        assert sorted(record.fields) == ["a"]
+
+    def test_lazy(self, record_file):
+        registry = make_registry(lazy=True)
+        with hp_open(record_file, RegistryContainer(registry), mode='r') as f:
+            record = f["record"]
+            assert all(
+                isinstance(field, OnDemandWrapper)
+                for field in record.fields.values()
+            )
+            assert all(record.fields["b"]()["data"] == np.arange(4))
+
+    def test_lazy_members(self, record_file):
+        registry = make_registry(members=["b"], lazy=True)
+        with hp_open(record_file, RegistryContainer(registry), mode='r') as f:
+            record = f["record"]
+            assert list(record.fields) == ["b"]
+            assert all(record.fields["b"]()["data"] == np.arange(4))
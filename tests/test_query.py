@@ -0,0 +1,87 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import open as hp_open, RegistryContainer, GroupContainer
+
+
+@pytest.fixture(params=[True, False], ids=["catalog", "no catalog"])
+def experiments_file(request, tmpdir, experiment_registry, experiment_data):
+    experiment_cls = type(experiment_data)
+    tmpfile = str(tmpdir.join("test_query.h5"))
+    registries = RegistryContainer(experiment_registry)
+    with hp_open(
+        tmpfile, registries, mode='x', catalog=request.param
+    ) as f:
+        for i in range(10):
+            f["exp{}".format(i)] = experiment_cls(np.arange(i + 1), i)
+        f["group"] = GroupContainer(
+            nested=experiment_cls(np.arange(3), 20), data=np.arange(3),
+        )
+    return tmpfile, registries
+
+
+class TestQuery(object):
+    def test_label(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert sorted(f.query(label="Experiment")) == [
+                "exp{}".format(i) for i in range(10)
+            ]
+
+    def test_recursive(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            results = f.query(recursive=True, label="Experiment")
+            assert len(results) == 11
+            assert "group/nested" in results
+
+    def test_attr_predicate(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            results = f.query(
+                recursive=True, attrs={"time started": lambda t: t > 7}
+            )
+            assert sorted(results) == ["exp8", "exp9", "group/nested"]
+
+    def test_attr_value(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert list(f.query(attrs={"time started": 3})) == ["exp3"]
+
+    def test_missing_attr(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            assert f.query(attrs={"missing": 3}) == {}
+
+    def test_lazy_load(self, experiments_file):
+        tmpfile, registries = experiments_file
+        with hp_open(tmpfile, registries, mode='r') as f:
+            results = f.query(attrs={"time started": 3})
+            experiment = results["exp3"]()
+            assert experiment.time_started == 3
+            assert all(experiment.data == np.arange(4))
+
+
+@pytest.mark.parametrize(
+    "catalog", [True, False], ids=["catalog", "no catalog"]
+)
+def test_query_backend(
+    tmpdir, backend, catalog, experiment_registry, experiment_data
+):
+    experiment_cls = type(experiment_data)
+    tmpfile = str(tmpdir.join("test_query"))
+    registries = RegistryContainer(experiment_registry)
+    with hp_open(
+        tmpfile, registries, mode='x', catalog=catalog, backend=backend
+    ) as f:
+        for i in range(3):
+            f["exp{}".format(i)] = experiment_cls(np.arange(i + 1), i)
+        f["group"] = GroupContainer(nested=experiment_cls(np.arange(3), 20))
+    with hp_open(tmpfile, registries, mode='r', backend=backend) as f:
+        assert sorted(f.query(label="Experiment")) == ["exp0", "exp1", "exp2"]
+        results = f.query(
+            recursive=True, attrs={"time started": lambda t: t > 1}
+        )
+        assert sorted(results) == ["exp2", "group/nested"]
+        assert results["group/nested"]().time_started == 20
@@ -121,3 +121,28 @@ if hasattr(h5py, "Empty"):
         ) as f:
             roundtripped = f["first"]
             assert roundtripped == obj_registry_with_none["dumpable_object"]
+
+def roundtrip_with_backend(tmpdir, backend, obj_registry):
+    tmpfile = str(tmpdir.join("test_roundtrip"))
+    with hp_open(
+        tmpfile, registries=obj_registry["registries"], mode='x',
+        backend=backend,
+    ) as f:
+        f["first"] = obj_registry["dumpable_object"]
+
+    with hp_open(
+        tmpfile, registries=obj_registry["registries"], mode='r',
+        backend=backend,
+    ) as f:
+        roundtripped = f["first"]
+        assert roundtripped == obj_registry["dumpable_object"]
+
+@pytest.mark.roundtrip
+def test_roundtrip_backend(tmpdir, backend, obj_registry):
+    roundtrip_with_backend(tmpdir, backend, obj_registry)
+
+@pytest.mark.roundtrip
+def test_roundtrip_backend_with_defaults(
+    tmpdir, backend, obj_registry_with_defaults
+):
+    roundtrip_with_backend(tmpdir, backend, obj_registry_with_defaults)
@@ -0,0 +1,87 @@
+import pickle
+
+import pytest
+
+import numpy as np
+
+from h5preserve import RegistryContainer, GroupContainer, H5PreserveGroup
+from h5preserve.additional_registries import (
+    builtin_numbers_registry, builtin_text_registry, none_python_registry,
+)
+
+
+class TestSerialize(object):
+    def test_roundtrip(self, experiment_registry, experiment_data):
+        registries = RegistryContainer(experiment_registry)
+        data = registries.dumps(experiment_data)
+        assert isinstance(data, bytes)
+        loaded = registries.loads(data)
+        assert loaded.time_started == experiment_data.time_started
+        assert all(loaded.data == experiment_data.data)
+
+    def test_builtins(self):
+        registries = RegistryContainer(
+            builtin_numbers_registry, builtin_text_registry,
+            none_python_registry,
+        )
+        for obj in [1, 2.5, "text", None]:
+            assert registries.loads(registries.dumps(obj)) == obj
+
+    def test_plain_array(self):
+        registries = RegistryContainer()
+        loaded = registries.loads(registries.dumps(np.arange(5)))
+        assert isinstance(loaded, np.ndarray)
+        assert all(loaded == np.arange(5))
+
+    def test_plain_group(self):
+        registries = RegistryContainer()
+        loaded = registries.loads(registries.dumps(GroupContainer(
+            a=np.arange(3), b=GroupContainer(c=np.arange(4)),
+        )))
+        assert isinstance(loaded, H5PreserveGroup)
+        assert sorted(loaded) == ["a", "b"]
+        assert all(loaded.h5py_group["b/c"][()] == np.arange(4))
+
+    def test_shared(self, experiment_registry, experiment_data):
+        registries = RegistryContainer(experiment_registry)
+        loaded = registries.loads(registries.dumps(GroupContainer(
+            a=experiment_data, b=experiment_data,
+        )))
+        assert loaded.h5py_group["a"] == loaded.h5py_group["b"]
+
+    def test_out_of_band(self, experiment_registry, experiment_data):
+        registries = RegistryContainer(experiment_registry)
+        buffers = []
+        data = registries.dumps(
+            experiment_data, buffer_callback=buffers.append
+        )
+        assert len(buffers) == 1
+        assert isinstance(buffers[0], pickle.PickleBuffer)
+        assert len(data) < len(registries.dumps(experiment_data))
+        loaded = registries.loads(data, buffers=buffers)
+        assert all(loaded.data == experiment_data.data)
+        assert np.shares_memory(loaded.data, experiment_data.data) is False
+
+    def test_out_of_band_not_copied(self):
+        registries = RegistryContainer()
+        buffers = []
+        data = registries.dumps(np.arange(5), buffer_callback=buffers.append)
+        received = bytearray(buffers[0].raw())
+        loaded = registries.loads(data, buffers=[received])
+        received[:8] = np.int64(10).tobytes()
+        assert loaded[0] == 10
+
+    def test_in_band_read_only(self):
+        registries = RegistryContainer()
+        loaded = registries.loads(registries.dumps(np.arange(5)))
+        assert not loaded.flags.writeable
+
+    def test_missing_buffers(self):
+        registries = RegistryContainer()
+        data = registries.dumps(np.arange(5), buffer_callback=lambda b: False)
+        with pytest.raises(ValueError):
+            registries.loads(data)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            RegistryContainer().loads(b"not serialized")
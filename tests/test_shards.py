@@ -0,0 +1,145 @@
+from concurrent.futures import ProcessPoolExecutor
+import shutil
+
+import pytest
+
+import numpy as np
+import h5py
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer, DatasetContainer,
+)
+from h5preserve.shards import ShardedWriter, merge_shards
+
+
+def write_shard(directory, index):
+    writer = ShardedWriter(directory, RegistryContainer())
+    with writer.open(index) as f:
+        f["group"] = GroupContainer(
+            values=np.arange(5) + 5 * index,
+            table=np.full((2, 3), index),
+        )
+
+
+class TestShards(object):
+    def test_merge(self, tmpdir, experiment_registry, experiment_data):
+        registries = RegistryContainer(experiment_registry)
+        experiment_cls = type(experiment_data)
+        writer = ShardedWriter(str(tmpdir), registries)
+        for i in range(3):
+            with writer.open(i) as f:
+                f["experiment"] = experiment_cls(
+                    experiment_data.data[10 * i:10 * (i + 1)],
+                    experiment_data.time_started,
+                )
+        assert writer.indices == [0, 1, 2]
+        merged = writer.merge()
+        with hp_open(merged, registries, mode='r') as f:
+            assert f.h5py_group["experiment"].is_virtual
+            experiment = f["experiment"]
+            assert experiment.time_started == experiment_data.time_started
+            assert all(experiment.data == experiment_data.data[:30])
+
+    def test_processes(self, tmpdir):
+        directory = str(tmpdir.join("shards"))
+        with ProcessPoolExecutor(2) as executor:
+            list(executor.map(write_shard, [directory] * 4, range(4)))
+        merged = ShardedWriter(directory, RegistryContainer()).merge()
+        with hp_open(merged, RegistryContainer(), mode='r') as f:
+            assert all(
+                f.h5py_group["group/values"][()] == np.arange(20)
+            )
+            assert f.h5py_group["group/table"].shape == (8, 3)
+
+    def test_axis(self, tmpdir):
+        paths = []
+        for i in range(2):
+            paths.append(str(tmpdir.join("shard-{}.h5".format(i))))
+            with hp_open(paths[-1], RegistryContainer(), mode='x') as f:
+                f["data"] = np.full((2, 3), i)
+        merge_shards(paths, str(tmpdir.join("merged.h5")), axis=1)
+        with h5py.File(str(tmpdir.join("merged.h5")), mode="r") as f:
+            assert f["data"].shape == (2, 6)
+            assert (f["data"][:, 3:] == 1).all()
+
+    def test_scalars_and_shared(self, tmpdir, experiment_registry):
+        registries = RegistryContainer(experiment_registry)
+        writer = ShardedWriter(str(tmpdir), registries)
+        for i in range(2):
+            with writer.open(i) as f:
+                data = DatasetContainer(data=np.arange(3))
+                f["group"] = GroupContainer(
+                    a=data, b=data, scalar=np.float64(1.5),
+                )
+        with hp_open(writer.merge(), registries, mode='r') as f:
+            group = f.h5py_group["group"]
+            assert group["a"] == group["b"]
+            assert group["scalar"][()] == 1.5
+            assert all(group["a"][()] == [0, 1, 2, 0, 1, 2])
+
+    def test_no_stale_hashes(self, tmpdir):
+        registries = RegistryContainer(deduplicate=True, statistics=True)
+        writer = ShardedWriter(str(tmpdir), registries)
+        for i in range(2):
+            with writer.open(i) as f:
+                f["data"] = np.arange(3) + i
+        with h5py.File(writer.merge(), mode="r") as f:
+            assert not any(
+                name.startswith("_h5preserve") for name in f["data"].attrs
+            )
+
+    def test_relocatable(self, tmpdir):
+        directory = tmpdir.join("shards")
+        writer = ShardedWriter(str(directory), RegistryContainer())
+        for i in range(2):
+            with writer.open(i) as f:
+                f["data"] = np.arange(3) + i
+        writer.merge()
+        shutil.move(str(directory), str(tmpdir.join("moved")))
+        with h5py.File(str(tmpdir.join("moved", "shard.h5")), "r") as f:
+            assert all(f["data"][()] == [0, 1, 2, 1, 2, 3])
+
+    def test_replicated(self, tmpdir):
+        writer = ShardedWriter(str(tmpdir), RegistryContainer())
+        for i in range(3):
+            with writer.open(i) as f:
+                f["grid"] = GroupContainer(x=np.arange(3), y=np.arange(2))
+                f["values"] = np.full((2, 3), i)
+        with h5py.File(writer.merge(replicated=["grid"]), mode="r") as f:
+            assert not f["grid/x"].is_virtual
+            assert all(f["grid/x"][()] == np.arange(3))
+            assert all(f["grid/y"][()] == np.arange(2))
+            assert f["values"].shape == (6, 3)
+        with h5py.File(writer.merge(replicated=["/grid/x"]), mode="r") as f:
+            assert f["grid/x"].shape == (3,)
+            assert f["grid/y"].shape == (6,)
+
+    def test_replicated_differs(self, tmpdir):
+        writer = ShardedWriter(str(tmpdir), RegistryContainer())
+        for i in range(2):
+            with writer.open(i) as f:
+                f["grid"] = np.arange(3) + i
+        with pytest.raises(ValueError):
+            writer.merge(replicated=["grid"])
+
+    def test_mismatched_shapes(self, tmpdir):
+        writer = ShardedWriter(str(tmpdir), RegistryContainer())
+        for i in range(2):
+            with writer.open(i) as f:
+                f["data"] = np.zeros((2, i + 1))
+        with pytest.raises(ValueError):
+            writer.merge()
+        assert tmpdir.listdir(lambda path: "merge" in path.basename) == []
+
+    def test_missing_object(self, tmpdir):
+        writer = ShardedWriter(str(tmpdir), RegistryContainer())
+        with writer.open(0) as f:
+            f["data"] = np.arange(3)
+        with writer.open(1) as f:
+            f["other"] = np.arange(3)
+        with pytest.raises(KeyError):
+            writer.merge()
+
+    def test_no_shards(self, tmpdir):
+        with pytest.raises(ValueError):
+            ShardedWriter(str(tmpdir), RegistryContainer()).merge()
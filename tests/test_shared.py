@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import pytest
+
+import numpy as np
+import h5py
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer, new_registry_list
+)
+
+
+@pytest.fixture
+def shared_experiment_registry(experiment_registry):
+    @experiment_registry.dumper(dict, "pair", version=1)
+    def _pair_dump(pair):
+        return GroupContainer(**pair)
+
+    @experiment_registry.loader("pair", version=1)
+    def _pair_load(group):
+        return dict(group)
+
+    return experiment_registry
+
+
+class TestLinkShared(object):
+    def test_shared_object_is_hard_linked(
+        self, tmpdir, shared_experiment_registry, experiment_data
+    ):
+        experiment = experiment_data
+        tmpfile = str(tmpdir.join("test_shared.h5"))
+        registries = RegistryContainer(shared_experiment_registry)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["pair"] = {"first": experiment, "second": experiment}
+            h5py_group = f.h5py_group["pair"]
+            assert h5py_group["first"] == h5py_group["second"]
+
+        with hp_open(tmpfile, registries, mode='r') as f:
+            pair = f["pair"]
+            assert pair["first"] == experiment
+            assert pair["second"] == experiment
+
+    def test_shared_array_is_hard_linked(self, tmpdir):
+        data = np.random.rand(10)
+        tmpfile = str(tmpdir.join("test_shared.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["pair"] = GroupContainer(first=data, second=data)
+            h5py_group = f.h5py_group["pair"]
+            assert h5py_group["first"] == h5py_group["second"]
+
+    def test_link_shared_disabled(
+        self, tmpdir, shared_experiment_registry, experiment_data
+    ):
+        experiment = experiment_data
+        tmpfile = str(tmpdir.join("test_shared.h5"))
+        registries = RegistryContainer(
+            shared_experiment_registry, link_shared=False
+        )
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["pair"] = {"first": experiment, "second": experiment}
+            h5py_group = f.h5py_group["pair"]
+            assert h5py_group["first"] != h5py_group["second"]
+
+    def test_equal_builtins_not_linked(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_shared.h5"))
+        with hp_open(tmpfile, new_registry_list(), mode='x') as f:
+            f["pair"] = GroupContainer(first=1, second=1)
+            h5py_group = f.h5py_group["pair"]
+            assert h5py_group["first"] != h5py_group["second"]
+
+    def test_link_shared_kept_on_add(self):
+        registries = RegistryContainer(link_shared=False) + RegistryContainer()
+        assert not registries._link_shared
+
+    def test_threads_do_not_share_session(self, tmpdir, experiment_registry):
+        barrier = threading.Barrier(2, timeout=10)
+
+        @experiment_registry.dumper(dict, "pair", version=1)
+        def _pair_dump(pair):
+            barrier.wait()
+            return GroupContainer(**pair)
+
+        registries = RegistryContainer(experiment_registry)
+        data = np.arange(10)
+
+        def write(index):
+            tmpfile = str(tmpdir.join("test_shared{}.h5".format(index)))
+            with hp_open(tmpfile, registries, mode='x') as f:
+                f["pair"] = {"first": data, "second": data}
+            return tmpfile
+
+        with ThreadPoolExecutor(2) as executor:
+            paths = list(executor.map(write, range(2)))
+        for path in paths:
+            with h5py.File(path, mode='r') as f:
+                assert f["pair"]["first"] == f["pair"]["second"]
+                assert all(f["pair"]["first"][()] == data)
@@ -0,0 +1,96 @@
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, Registry, RegistryContainer, GroupContainer,
+    DatasetContainer,
+)
+
+
+class TestStatistics(object):
+    def test_not_stored_by_default(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_statistics.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["data"] = np.arange(10)
+            assert f.get_statistics("data") is None
+
+    def test_stored(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_statistics.h5"))
+        data = np.array([3.0, np.nan, -1.0, 7.0])
+        with hp_open(
+            tmpfile, RegistryContainer(statistics=True), mode='x'
+        ) as f:
+            f["data"] = data
+            statistics = f.get_statistics("data")
+            assert statistics.min == -1.0
+            assert statistics.max == 7.0
+            assert statistics.count == 4
+            assert statistics.nan_count == 1
+            assert statistics.chunk_min is None
+
+    def test_nested(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_statistics.h5"))
+        registries = RegistryContainer()
+        with hp_open(tmpfile, registries, mode='x') as f:
+            registries.to_file(f.h5py_group, "group", GroupContainer(
+                a=np.arange(10), b=DatasetContainer(data=np.ones(3)),
+            ), statistics=True)
+            assert f["group"].get_statistics("a").max == 9
+            assert f["group"].get_statistics("b").min == 1
+
+    def test_non_numeric(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_statistics.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(statistics=True), mode='x'
+        ) as f:
+            f["data"] = np.array([b"a", b"b"])
+            assert f.get_statistics("data") is None
+
+    def test_hidden_from_attrs(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_statistics.h5"))
+        registry = Registry("attrs")
+
+        @registry.loader("Attrs", version=None)
+        def _attrs_load(dataset):
+            return dataset["attrs"]
+
+        registries = RegistryContainer(registry, statistics=True)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["data"] = DatasetContainer(data=np.arange(3), attrs={
+                "_h5preserve_namespace": "attrs",
+                "_h5preserve_label": "Attrs", "a": 1,
+            })
+            assert f["data"] == {"a": 1}
+
+    def test_chunks(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_statistics.h5"))
+        registries = RegistryContainer(statistics="chunks")
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f["data"] = DatasetContainer(
+                data=np.arange(50.0).reshape(10, 5), chunks=(4, 5),
+            )
+            statistics = f.get_statistics("data")
+            assert all(statistics.chunk_min == [[0], [20], [40]])
+            assert all(statistics.chunk_max == [[19], [39], [49]])
+            assert statistics.chunks_in_range(22, 30) == [
+                (slice(4, 8), slice(0, 5)),
+            ]
+            assert statistics.chunks_in_range(high=-1) == []
+
+    def test_overwrite_updates(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_statistics.h5"))
+        registries = RegistryContainer(statistics=True)
+        with hp_open(tmpfile, registries, mode='x', overwrite=True) as f:
+            f["data"] = np.arange(10)
+            f["data"] = np.arange(10, 20)
+            assert f.get_statistics("data").min == 10
+
+    def test_query_value_range(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_statistics.h5"))
+        registries = RegistryContainer(statistics=True)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            for i in range(5):
+                f["data{}".format(i)] = np.arange(10) + 10 * i
+            assert sorted(f.query(value_range=(15, 25))) == [
+                "data1", "data2",
+            ]
+            assert sorted(f.query(value_range=(None, 5))) == ["data0"]
@@ -0,0 +1,44 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import (
+    open as hp_open, RegistryContainer, GroupContainer,
+    AppendableDatasetContainer,
+)
+
+
+class TestSWMR(object):
+    def test_start_swmr(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_swmr.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x', swmr=True) as f:
+            assert not f.swmr_mode
+            f.start_swmr()
+            assert f.swmr_mode
+
+    def test_reader_refresh(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_swmr.h5"))
+        writer = hp_open(tmpfile, RegistryContainer(), mode='x', swmr=True)
+        writer["run"] = GroupContainer(rows=AppendableDatasetContainer(
+            shape=(0, 2), dtype=float
+        ))
+        rows = writer["run"]["rows"]["data"]
+        writer.start_swmr()
+
+        reader = hp_open(tmpfile, RegistryContainer(), mode='r', swmr=True)
+        assert reader.swmr_mode
+        read_rows = reader["run"]["rows"]["data"]
+        assert len(read_rows) == 0
+
+        rows.append(np.ones((3, 2)))
+        writer.flush()
+        reader.refresh()
+        assert len(read_rows) == 3
+        assert (read_rows[:] == np.ones((3, 2))).all()
+
+        rows.append(np.zeros(2))
+        reader.refresh()
+        assert len(read_rows) == 4
+
+        reader.close()
+        writer.close()
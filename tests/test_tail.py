@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from h5preserve import (
+    open as hp_open, new_registry_list, GroupContainer,
+    AppendableDatasetContainer,
+)
+
+WRITE_KEY = """
+from h5preserve import open as hp_open, new_registry_list
+with hp_open({filename!r}, new_registry_list(), mode='a', locking=False) as f:
+    f[{key!r}] = {val!r}
+"""
+
+
+def write_key(filename, key, val):
+    subprocess.run(
+        [sys.executable, "-c", WRITE_KEY.format(
+            filename=filename, key=key, val=val
+        )], check=True
+    )
+
+
+class TestTail(object):
+    def test_tail(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_tail.h5"))
+        with hp_open(tmpfile, new_registry_list(), mode='x') as f:
+            f["existing"] = 1
+
+        with hp_open(
+            tmpfile, new_registry_list(), mode='r', locking=False
+        ) as f:
+            tail = f.tail(interval=0.01, timeout=0.5)
+            write_key(tmpfile, "first", 2)
+            assert next(tail) == ("first", 2)
+            write_key(tmpfile, "second", 3.0)
+            assert next(tail) == ("second", 3.0)
+            assert list(tail) == []
+
+    def test_timeout(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_tail.h5"))
+        with hp_open(tmpfile, new_registry_list(), mode='x') as f:
+            f["existing"] = 1
+            assert list(f.tail(interval=0.01, timeout=0.05)) == []
+
+    def test_reopen_read_only(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_tail.h5"))
+        with hp_open(tmpfile, new_registry_list(), mode='x') as f:
+            with pytest.raises(RuntimeError):
+                f.reopen()
+
+    def test_swmr_refreshed_not_reopened(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_tail.h5"))
+        writer = hp_open(tmpfile, new_registry_list(), mode='x', swmr=True)
+        writer["run"] = GroupContainer(rows=AppendableDatasetContainer(
+            shape=(0,), dtype=float
+        ))
+        rows = writer["run"]["rows"]["data"]
+        writer.start_swmr()
+
+        reader = hp_open(tmpfile, new_registry_list(), mode='r', swmr=True)
+        h5py_file = reader.h5py_file
+        read_rows = reader["run"]["rows"]["data"]
+        tail = reader.tail(interval=0.01, timeout=0.05)
+        rows.append(1.0)
+        os.utime(tmpfile, ns=(0, 0))
+        assert list(tail) == []
+        assert reader.h5py_file is h5py_file
+        assert len(read_rows) == 1
+
+        reader.close()
+        writer.close()
@@ -0,0 +1,66 @@
+import pytest
+
+import numpy as np
+
+from h5preserve import open as hp_open, RegistryContainer, GroupContainer
+
+
+class TestUpdate(object):
+    def test_update(self, tmpdir, experiment_registry, experiment_data):
+        experiment_cls = type(experiment_data)
+        tmpfile = str(tmpdir.join("test_update.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f.update({
+                "exp{}".format(i): experiment_cls(np.arange(i + 1), i)
+                for i in range(5)
+            }, other=experiment_cls(np.arange(2), 10))
+            assert sorted(f) == [
+                "exp0", "exp1", "exp2", "exp3", "exp4", "other",
+            ]
+            assert f["exp3"].time_started == 3
+            assert f["other"].time_started == 10
+
+    def test_nested_keys(self, tmpdir, experiment_registry, experiment_data):
+        tmpfile = str(tmpdir.join("test_update.h5"))
+        registries = RegistryContainer(experiment_registry)
+        with hp_open(tmpfile, registries, mode='x') as f:
+            f.update({
+                "a/b/first": experiment_data, "a/second": experiment_data,
+            })
+            assert list(f["a"]) == ["b", "second"]
+            assert f["a"]["b"]["first"] == experiment_data
+
+    def test_shared_between_items(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_update.h5"))
+        data = np.arange(10)
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f.update(a=GroupContainer(data=data), b=GroupContainer(data=data))
+            assert f.h5py_group["a/data"] == f.h5py_group["b/data"]
+
+    def test_existing_key(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_update.h5"))
+        with hp_open(tmpfile, RegistryContainer(), mode='x') as f:
+            f["a"] = np.arange(3)
+            with pytest.raises(OSError):
+                f.update(a=np.arange(3))
+
+    def test_overwrite(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_update.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', overwrite=True
+        ) as f:
+            f["a"] = np.arange(3)
+            f.update(a=np.arange(3, 6), b=np.arange(2))
+            assert all(f.h5py_group["a"][()] == np.arange(3, 6))
+            assert all(f.h5py_group["b"][()] == np.arange(2))
+
+    def test_catalog(self, tmpdir):
+        tmpfile = str(tmpdir.join("test_update.h5"))
+        with hp_open(
+            tmpfile, RegistryContainer(), mode='x', catalog=True
+        ) as f:
+            f.update({"a": np.arange(3), "g/b": np.arange(2)})
+            assert [
+                entry.path for entry in f.list_objects(recursive=True)
+            ] == ["/a", "/g", "/g/b"]